@@ -1,17 +1,28 @@
-from pikepdf import Pdf, AttachedFileSpec, Name, Dictionary, Array
-
+import argparse
 from pathlib import Path
 
-origin_pdf_file_name = 'output.pdf'
-
-pdf = Pdf.open(origin_pdf_file_name)
-
-xml_file_name = 'test_data/sample_music.musicxml'
-
-filespec = AttachedFileSpec.from_filepath(pdf, Path(xml_file_name))
-
-pdf.attachments[xml_file_name] = filespec
-
-dest_pdf_file_name = 'output2.pdf'
-
-pdf.save(dest_pdf_file_name)
\ No newline at end of file
+from pdf_attachments import attach_files
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Attach a file (e.g. the MusicXML score) to a PDF",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  python add_attachment.py output.pdf test_data/sample_music.musicxml -o output2.pdf
+  python add_attachment.py output.pdf music.xml            # updates output.pdf in place
+        """
+    )
+    parser.add_argument("pdf", help="PDF to attach to")
+    parser.add_argument("file", help="File to attach")
+    parser.add_argument("-o", "--output", help="Output PDF (default: update the input PDF in place)")
+    parser.add_argument("-n", "--name", help="Attachment name (default: the file's path as given)")
+
+    args = parser.parse_args()
+
+    try:
+        attach_files(args.pdf, {args.name or args.file: Path(args.file)}, args.output)
+    except Exception as e:
+        print(f"Error: {e}")
+        exit(1)
+    print(f"Attached {args.file} to {args.output or args.pdf}")
@@ -0,0 +1,191 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+from pathlib import Path
+from typing import Callable, Dict, Optional
+
+# Bump when the layout of cached artifacts changes so old entries are ignored
+CACHE_FORMAT = 1
+
+DEFAULT_MAX_BYTES = 1 << 30
+HASH_BLOCK = 1 << 20
+
+
+def hash_file(path, algorithm: str = "sha256") -> str:
+    """Hex digest of a file's contents, read HASH_BLOCK bytes at a time."""
+    h = hashlib.new(algorithm)
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_BLOCK), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+class ArtifactCache:
+    """
+    Content-addressed store of generated artifacts (MusicXML, .ly, PDF,
+    MIDI) on disk.
+
+    Entries are keyed by a hash of the stage, the input bytes and every
+    parameter that affects the output. Files are written to a temporary
+    name and renamed into place, so concurrent workers never see partial
+    entries. Reading an entry refreshes its modification time; when the
+    cache grows past max_bytes the least recently used entries are removed.
+    """
+
+    def __init__(self, root, max_bytes: int = DEFAULT_MAX_BYTES):
+        if max_bytes <= 0:
+            raise ValueError(f"max_bytes must be > 0 (got {max_bytes})")
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self.counters = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+
+    # -----------------------------
+    # Keys and lookups
+    # -----------------------------
+    @staticmethod
+    def key(stage: str, data=b"", **params) -> str:
+        """
+        Cache key of `stage` applied to `data` (bytes-like) with `params`
+        (JSON-serializable encoder options, tool versions, ...).
+        """
+        h = hashlib.sha256()
+        h.update(json.dumps({"format": CACHE_FORMAT, "stage": stage, "params": params},
+                            sort_keys=True, default=str).encode("utf-8"))
+        h.update(b"\0")
+        h.update(data)
+        return h.hexdigest()
+
+    def path(self, key: str, suffix: str) -> Path:
+        return self.root / key[:2] / (key + suffix)
+
+    def get(self, key: str, suffix: str) -> Optional[Path]:
+        """Path of the cached artifact, or None on a miss."""
+        path = self.path(key, suffix)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            self._count("misses")
+            return None
+        self._count("hits")
+        return path
+
+    def put(self, key: str, suffix: str, source) -> Path:
+        """
+        Store `source` (bytes or the path of a finished file) under `key`
+        and return the cached path.
+        """
+        path = self.path(key, suffix)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=".", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                if isinstance(source, (bytes, bytearray, memoryview)):
+                    f.write(source)
+                else:
+                    with open(source, "rb") as src:
+                        shutil.copyfileobj(src, f)
+            os.replace(tmp, path)
+        except BaseException:
+            try:
+                os.unlink(tmp)
+            except FileNotFoundError:
+                pass
+            raise
+        self._count("stores")
+        self.evict()
+        return path
+
+    def materialize(self, key: str, suffix: str, dest, build: Callable[[Path], None]) -> bool:
+        """
+        Copy the artifact cached under `key` to `dest`, or run build(dest)
+        and cache what it wrote. Returns True on a cache hit.
+        """
+        cached = self.get(key, suffix)
+        if cached is not None:
+            try:
+                shutil.copyfile(cached, dest)
+                return True
+            except FileNotFoundError:
+                # Evicted by another worker between the lookup and the copy
+                pass
+        build(Path(dest))
+        self.put(key, suffix, dest)
+        return False
+
+    # -----------------------------
+    # Eviction and statistics
+    # -----------------------------
+    def _entries(self):
+        for shard in os.scandir(self.root):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                if entry.is_file() and not entry.name.startswith("."):
+                    yield entry
+
+    def evict(self) -> int:
+        """Remove least recently used entries until the cache fits max_bytes; return how many."""
+        entries = []
+        total = 0
+        for entry in self._entries():
+            try:
+                st = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime, st.st_size, entry.path))
+            total += st.st_size
+        removed = 0
+        if total > self.max_bytes:
+            for _, size, path in sorted(entries):
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    continue
+                total -= size
+                removed += 1
+                if total <= self.max_bytes:
+                    break
+        if removed:
+            self._count("evictions", removed)
+        return removed
+
+    def _count(self, name: str, n: int = 1) -> None:
+        with self._lock:
+            self.counters[name] += n
+
+    def stats(self) -> Dict[str, float]:
+        """Hit/miss counters of this instance plus the current size of the cache."""
+        entries = 0
+        size = 0
+        for entry in self._entries():
+            try:
+                size += entry.stat().st_size
+            except FileNotFoundError:
+                continue
+            entries += 1
+        with self._lock:
+            stats = dict(self.counters)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        stats["entries"] = entries
+        stats["bytes"] = size
+        return stats
+
+    def clear(self) -> None:
+        """Remove every entry."""
+        for entry in list(self._entries()):
+            try:
+                os.unlink(entry.path)
+            except FileNotFoundError:
+                pass
+
+
+def format_stats(stats: Dict[str, float]) -> str:
+    return (f"{stats['hits']} hits, {stats['misses']} misses ({stats['hit_rate']:.0%}), "
+            f"{stats['stores']} stored, {stats['evictions']} evicted, "
+            f"{stats['entries']} entries / {stats['bytes'] / 1e6:.1f} MB")
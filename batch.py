@@ -0,0 +1,299 @@
+import argparse
+import glob
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from bytes_to_musical_xml import map_input, write_musicxml
+from encoding_schemes import DEFAULT_SCHEME, SCHEMES
+from musical_xml_to_bytes import musicxml_to_file
+from mxl_container import MXL_SUFFIX, open_score_writer
+from payload_compression import available_codecs
+
+# Suffix appended to encoded files and stripped again when decoding, so
+# data.json → data.json.musicxml → data.json (data.json.mxl with --mxl)
+ENCODED_SUFFIX = ".musicxml"
+# Files picked up from directories when decoding
+SCORE_SUFFIXES = (".musicxml", ".xml", MXL_SUFFIX)
+# Suffix for decoded files whose name has none of SCORE_SUFFIXES
+DECODED_SUFFIX = ".bin"
+
+# (input path, output path, options) → (input bytes, output bytes, error)
+Task = Tuple[str, str, Dict]
+Result = Tuple[int, int, Optional[str]]
+
+
+# -----------------------------
+# Inputs and outputs
+# -----------------------------
+def _glob_root(pattern: str) -> Path:
+    """Leading directories of a glob pattern that contain no wildcard."""
+    root = []
+    for part in Path(pattern).parts[:-1]:
+        if glob.has_magic(part):
+            break
+        root.append(part)
+    return Path(*root) if root else Path(".")
+
+
+def read_manifest(path: str) -> List[str]:
+    """
+    Inputs listed in a manifest file: one path, directory or glob per line;
+    blank lines and lines starting with # are ignored. Relative entries are
+    relative to the manifest's directory.
+    """
+    base = Path(path).parent
+    entries = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith("#"):
+                entries.append(line if os.path.isabs(line) else str(base / line))
+    return entries
+
+
+def collect_inputs(sources: Iterable[str], suffixes: Optional[Tuple[str, ...]] = None) -> List[Tuple[Path, Path]]:
+    """
+    Expand files, directories (recursively) and glob patterns into
+    (path, relative path) pairs. The relative path is taken from the
+    directory given, or the fixed part of the glob, and is mirrored in
+    the output tree. Directories only contribute files with one of
+    `suffixes` (all files if None). Each file is listed once.
+    """
+    found: Dict[Path, Path] = {}
+    for source in sources:
+        if os.path.isdir(source):
+            root = Path(source)
+            for dirpath, _, filenames in os.walk(root):
+                for name in sorted(filenames):
+                    if suffixes is None or name.lower().endswith(suffixes):
+                        path = Path(dirpath) / name
+                        found.setdefault(path.resolve(), path.relative_to(root))
+        elif glob.has_magic(source):
+            root = _glob_root(source)
+            matches = [Path(p) for p in sorted(glob.glob(source, recursive=True)) if os.path.isfile(p)]
+            if not matches:
+                raise FileNotFoundError(f"No files match '{source}'")
+            for path in matches:
+                found.setdefault(path.resolve(), path.relative_to(root))
+        elif os.path.isfile(source):
+            path = Path(source)
+            found.setdefault(path.resolve(), Path(path.name))
+        else:
+            raise FileNotFoundError(f"No such file or directory: '{source}'")
+    return [(path, rel) for path, rel in found.items()]
+
+
+def output_path(kind: str, rel: Path, output_dir: Path, mxl: bool = False) -> Path:
+    """Where the result for the input at `rel` goes in `output_dir`."""
+    if kind == "encode":
+        return output_dir / rel.parent / (rel.name + (MXL_SUFFIX if mxl else ENCODED_SUFFIX))
+    for suffix in SCORE_SUFFIXES:
+        if rel.name.lower().endswith(suffix) and len(rel.name) > len(suffix):
+            return output_dir / rel.parent / rel.name[:-len(suffix)]
+    return output_dir / rel.parent / (rel.name + DECODED_SUFFIX)
+
+
+def plan_outputs(kind: str, inputs: List[Tuple[Path, Path]], output_dir: Path,
+                 mxl: bool = False) -> List[Tuple[Path, Path]]:
+    """
+    (input, output) pair of every (path, relative path) in `inputs`, as
+    output_path places them. Raises ValueError if two inputs would be
+    written to the same output, e.g. a/data.json and b/data.json given as
+    two directories, or x.musicxml and x.xml when decoding.
+    """
+    owners: Dict[str, Path] = {}
+    plan = []
+    for path, rel in inputs:
+        dst = output_path(kind, rel, output_dir, mxl)
+        key = os.path.normcase(os.path.abspath(dst))
+        if key in owners:
+            raise ValueError(f"{owners[key]} and {path} would both be written to {dst}")
+        owners[key] = path
+        plan.append((path, dst))
+    return plan
+
+
+def is_up_to_date(src: Path, dst: Path) -> bool:
+    """True if `dst` exists and is not older than `src`."""
+    try:
+        return dst.stat().st_mtime >= src.stat().st_mtime
+    except FileNotFoundError:
+        return False
+
+
+# -----------------------------
+# Jobs
+# -----------------------------
+def _write_atomically(dst: str, write) -> int:
+    """Run write(tmp_path) and move the result into place; a failed job leaves no output."""
+    os.makedirs(os.path.dirname(dst) or ".", exist_ok=True)
+    tmp = f"{dst}.{os.getpid()}.tmp"
+    try:
+        write(tmp)
+        os.replace(tmp, dst)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+    return os.path.getsize(dst)
+
+
+def _encode_file(task: Task) -> Result:
+    src, dst, options = task
+    mxl = dst.lower().endswith(MXL_SUFFIX)
+    try:
+        def write(tmp):
+            with map_input(src) as data, open_score_writer(tmp, mxl) as out:
+                write_musicxml(data, out, measure_numbers=True, **options)
+        size = _write_atomically(dst, write)
+        return os.path.getsize(src), size, None
+    except Exception as e:
+        return 0, 0, f"{type(e).__name__}: {e}"
+
+
+def _decode_file(task: Task) -> Result:
+    src, dst, options = task
+    try:
+        def write(tmp):
+            with open(tmp, "wb") as out:
+                musicxml_to_file(src, out, **options)
+        size = _write_atomically(dst, write)
+        return os.path.getsize(src), size, None
+    except Exception as e:
+        return 0, 0, f"{type(e).__name__}: {e}"
+
+
+JOBS = {"encode": _encode_file, "decode": _decode_file}
+
+
+def process_files(kind: str, tasks: List[Task], jobs: int = 1) -> List[Result]:
+    """
+    Run the `kind` job ("encode" or "decode") for every task, in a pool of
+    `jobs` worker processes. Small files are handed out in chunks so the
+    pool is not dominated by per-task overhead. Results come back in the
+    order of `tasks`; failures are reported, not raised.
+    """
+    job = JOBS[kind]
+    if jobs <= 1 or len(tasks) <= 1:
+        return [job(task) for task in tasks]
+    chunksize = max(1, min(64, len(tasks) // (jobs * 8)))
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        return list(pool.map(job, tasks, chunksize=chunksize))
+
+
+def run_batch(kind: str, sources: List[str], output_dir: str, jobs: int = 1, force: bool = False,
+              manifest: Optional[str] = None, mxl: bool = False, **options) -> Dict:
+    """
+    Encode or decode every input under `sources` (and `manifest`) into
+    `output_dir`, mirroring the input tree. Raises ValueError, before
+    anything is written, if two inputs map to the same output (see
+    plan_outputs). Inputs whose output is newer than the input are skipped
+    unless `force`. With `mxl`, encoded scores
+    are written as compressed .mxl containers.
+
+    Returns a summary: counts of processed/skipped/failed files, bytes read
+    and written, elapsed seconds and the failures as (path, error) pairs.
+    """
+    start = time.perf_counter()
+    sources = list(sources) + (read_manifest(manifest) if manifest else [])
+    if not sources:
+        raise ValueError("No inputs given")
+    inputs = collect_inputs(sources, None if kind == "encode" else SCORE_SUFFIXES)
+    # Every output is known, and checked for clashes, before any is written
+    plan = plan_outputs(kind, inputs, Path(output_dir), mxl)
+
+    tasks: List[Task] = []
+    skipped = 0
+    for path, dst in plan:
+        if not force and is_up_to_date(path, dst):
+            skipped += 1
+            continue
+        tasks.append((str(path), str(dst), options))
+
+    results = process_files(kind, tasks, jobs)
+    failures = [(task[0], error) for task, (_, _, error) in zip(tasks, results) if error]
+    return {
+        "kind": kind,
+        "total": len(inputs),
+        "processed": len(tasks) - len(failures),
+        "skipped": skipped,
+        "failed": len(failures),
+        "bytes_in": sum(r[0] for r in results),
+        "bytes_out": sum(r[1] for r in results),
+        "seconds": time.perf_counter() - start,
+        "failures": failures,
+    }
+
+
+def format_summary(summary: Dict) -> str:
+    seconds = summary["seconds"] or 1e-9
+    verb = "encoded" if summary["kind"] == "encode" else "decoded"
+    lines = [f"{summary['processed']} {verb}, {summary['skipped']} up to date, "
+             f"{summary['failed']} failed (of {summary['total']}) in {summary['seconds']:.2f}s",
+             f"Throughput: {summary['processed'] / seconds:.1f} files/s, "
+             f"{summary['bytes_in'] / seconds / 1e6:.2f} MB/s in, "
+             f"{summary['bytes_out'] / seconds / 1e6:.2f} MB/s out"]
+    lines += [f"[FAIL] {path}: {error}" for path, error in summary["failures"]]
+    return "\n".join(lines)
+
+
+# -----------------------------
+# Command line (the `batch` subcommand of the encoder and decoder)
+# -----------------------------
+def batch_main(kind: str, argv: List[str]) -> int:
+    """Parse `batch` arguments for the encoder or decoder, run them and return the exit code."""
+    script = "bytes_to_musical_xml.py" if kind == "encode" else "musical_xml_to_bytes.py"
+    ext = ".json" if kind == "encode" else ".musicxml"
+    parser = argparse.ArgumentParser(
+        prog=f"{script} batch",
+        description=f"{'Encode' if kind == 'encode' else 'Decode'} many files in one process, "
+                    f"mirroring the input tree in the output directory",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog=f"""
+Examples:
+  python {script} batch payloads/ -o out/ --jobs 8
+  python {script} batch "payloads/**/*{ext}" -o out/
+  python {script} batch --manifest nightly.txt -o out/ --force
+        """
+    )
+    parser.add_argument("inputs", nargs="*", help="Files, directories or glob patterns")
+    parser.add_argument("-o", "--output-dir", required=True, help="Directory for the results")
+    parser.add_argument("-m", "--manifest", help="File listing inputs, one path/directory/glob per line")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1,
+                        help="Worker processes (default: number of CPUs)")
+    parser.add_argument("-f", "--force", action="store_true", help="Also redo outputs that are up to date")
+    if kind == "encode":
+        parser.add_argument("-n", "--notes-per-measure", type=int, default=16,
+                            help="Number of notes per measure (default: 16)")
+        parser.add_argument("-p", "--part-name", default="Encoded Bytes",
+                            help="Name of the musical part (default: 'Encoded Bytes')")
+        parser.add_argument("-s", "--scheme", choices=sorted(SCHEMES), default=DEFAULT_SCHEME,
+                            help="Encoding scheme (default: nibble)")
+        parser.add_argument("-c", "--compress", choices=["none", "auto"] + sorted(available_codecs()),
+                            default="none", help="Compress each input before encoding (default: none)")
+        parser.add_argument("--mxl", action="store_true",
+                            help="Write compressed MusicXML containers (<name>.mxl)")
+    else:
+        parser.add_argument("--no-validate", action="store_true",
+                            help="Disable warnings for unexpected note configurations")
+        parser.add_argument("--no-fast", action="store_true",
+                            help="Always decode through partitura instead of the streaming decoder")
+
+    args = parser.parse_args(argv)
+    if kind == "encode":
+        options = dict(part_name=args.part_name, notes_per_measure=args.notes_per_measure,
+                       scheme=args.scheme, compression=args.compress, mxl=args.mxl)
+    else:
+        options = dict(validate=not args.no_validate, fast=not args.no_fast)
+
+    try:
+        summary = run_batch(kind, args.inputs, args.output_dir, jobs=args.jobs, force=args.force,
+                            manifest=args.manifest, **options)
+    except Exception as e:
+        print(f"Error: {e}")
+        return 1
+    print(format_summary(summary))
+    return 1 if summary["failed"] else 0
@@ -0,0 +1,385 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+from bytes_to_musical_xml import iter_measure_numbered, write_musicxml
+from musical_xml_to_bytes import decode_musicxml
+
+# Baseline file used by --save/--compare when no path is given
+DEFAULT_BASELINE = os.path.join("benchmarks", "baseline.json")
+DEFAULT_SIZES = "1K,64K,1M"
+# Largest MusicXML written to disk for the decode benchmark (about 230 bytes per input nibble)
+MAX_XML_BYTES = 2 << 30
+# Largest input rendered by the optional LilyPond benchmark
+MAX_LILYPOND_INPUT = 4 << 10
+# Largest input sounded by the optional audio benchmarks (882 WAV samples per byte),
+# at a rate and transposition the demodulator reads back through noise
+MAX_AUDIO_INPUT = 64 << 10
+AUDIO_RATE = 100
+AUDIO_TRANSPOSE = 3
+SEED = 1234
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+# Only the compatibility paths may load these; importing a module must not
+HEAVY_MODULES = ("partitura", "scipy", "pikepdf")
+# Modules checked for heavy imports, with any extra modules they must not load.
+# NumPy is only for the vectorized codec and the audio modems; the CLIs load
+# it when they encode or decode, not for --help
+IMPORT_BUDGET = {
+    "codec_core": ("numpy",),
+    "nibble_codec": (),
+    "encoding_schemes": ("numpy",),
+    "payload_compression": ("numpy",),
+    "metrics": ("numpy",),
+    "mxl_container": ("numpy",),
+    "bytes_to_musical_xml": ("numpy",),
+    "musical_xml_to_bytes": ("numpy",),
+    "bytes_to_lilypond": ("numpy",),
+    "score_append": ("numpy",),
+    "score_merge": ("numpy",),
+    "bytes_to_midi": ("numpy",),
+    "midi_to_bytes": ("numpy",),
+    "bytes_to_wav": (),
+    "wav_to_bytes": (),
+    "pdf_attachments": ("numpy",),
+    "batch": ("numpy",),
+    "service": ("numpy",),
+    "main": ("numpy",),
+}
+# Cold-start benchmarks: a fresh interpreter running these arguments
+COLD_STARTS = {
+    "import/codec_core": ["-c", "import codec_core"],
+    "import/bytes_to_musical_xml": ["-c", "import bytes_to_musical_xml"],
+    "import/musical_xml_to_bytes": ["-c", "import musical_xml_to_bytes"],
+    "help/bytes_to_musical_xml": ["bytes_to_musical_xml.py", "--help"],
+    "help/musical_xml_to_bytes": ["musical_xml_to_bytes.py", "--help"],
+    "help/main": ["main.py", "--help"],
+}
+
+
+# -----------------------------
+# Inputs
+# -----------------------------
+def parse_size(text: str) -> int:
+    """'1K' → 1024, '100M' → 104857600, '512' → 512."""
+    units = {"K": 1 << 10, "M": 1 << 20, "G": 1 << 30}
+    text = text.strip().upper()
+    if text and text[-1] in units:
+        return int(float(text[:-1]) * units[text[-1]])
+    return int(text)
+
+
+def format_size(n: int) -> str:
+    for unit, scale in (("G", 1 << 30), ("M", 1 << 20), ("K", 1 << 10)):
+        if n >= scale and n % scale == 0:
+            return f"{n // scale}{unit}"
+    return str(n)
+
+
+def make_input(kind: str, size: int, seed: int = SEED) -> bytes:
+    """Deterministic benchmark input: uniformly random bytes or JSON-like records."""
+    rng = np.random.default_rng(seed)
+    if kind == "random":
+        return rng.bytes(size)
+    if kind == "json":
+        words = ["alpha", "bravo", "charlie", "delta", "echo", "foxtrot", "golf", "hotel"]
+        records = [{"id": i,
+                    "name": " ".join(rng.choice(words, 2)),
+                    "score": round(float(rng.random()) * 100, 3),
+                    "tags": list(rng.choice(words, 3)),
+                    "active": bool(rng.integers(2))}
+                   for i in range(2000)]
+        block = json.dumps(records, indent=2).encode("utf-8")
+        return (block * (size // len(block) + 1))[:size]
+    raise ValueError(f"Unknown input kind: {kind}")
+
+
+class _NullSink:
+    """Text or binary sink that only counts what is written."""
+
+    def __init__(self):
+        self.size = 0
+
+    def write(self, chunk) -> int:
+        self.size += len(chunk)
+        return len(chunk)
+
+    def tell(self) -> int:
+        return self.size
+
+    def flush(self) -> None:
+        pass
+
+
+# -----------------------------
+# Measurements
+# -----------------------------
+def measure(fn: Callable[[], None], repeat: int = 3, memory: bool = True) -> Dict[str, float]:
+    """
+    Best wall time of `repeat` runs of fn(), plus the peak of Python/NumPy
+    allocations during one extra run under tracemalloc.
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    result = {"seconds": best}
+    if memory:
+        tracemalloc.start()
+        try:
+            fn()
+            result["peak_bytes"] = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return result
+
+
+def run_benchmarks(sizes: List[int], kinds: List[str], repeat: int = 3, memory: bool = True,
+                   lilypond: Optional[str] = None, tmp_dir: Optional[str] = None,
+                   audio: bool = False,
+                   log: Callable[[str], None] = print) -> Dict[str, Dict[str, float]]:
+    """
+    Run every benchmark for every (kind, size) and return
+    {"<bench>/<kind>/<size>": {"seconds", "mb_per_s", "peak_bytes"}}.
+
+    Benchmarks: encode (write_musicxml), number (add_measure_numbers_file
+    on the generated XML), decode (musicxml_to_bytes' streaming decoder on a file)
+    and, when `lilypond` is the path of the binary, lilypond (rendering the
+    native .ly of small inputs). With `audio`, modulate (write_wav) and
+    demodulate (decode_wav on the file) run on inputs up to MAX_AUDIO_INPUT.
+    """
+    results = {}
+
+    def record(name: str, size: int, stats: Dict[str, float]) -> None:
+        stats["mb_per_s"] = size / stats["seconds"] / 1e6 if stats["seconds"] else 0.0
+        results[name] = stats
+        peak = f", peak {stats['peak_bytes'] / 1e6:.1f} MB" if "peak_bytes" in stats else ""
+        log(f"{name:<28} {stats['seconds']:9.4f} s  {stats['mb_per_s']:8.3f} MB/s{peak}")
+
+    for kind in kinds:
+        for size in sizes:
+            data = make_input(kind, size)
+            label = f"{kind}/{format_size(size)}"
+
+            record(f"encode/{label}", size,
+                   measure(lambda: write_musicxml(data, _NullSink()), repeat, memory))
+            sink = _NullSink()
+            write_musicxml(data, sink)
+            if sink.size > MAX_XML_BYTES:
+                log(f"number/{label}, decode/{label}: skipped, {sink.size / 1e9:.1f} GB of MusicXML exceeds the limit")
+            else:
+                fd, xml_path = tempfile.mkstemp(suffix=".musicxml", dir=tmp_dir)
+                try:
+                    with os.fdopen(fd, "w", encoding="utf-8") as f:
+                        write_musicxml(data, f)
+                    record(f"number/{label}", size,
+                           measure(lambda: _number_file(xml_path), repeat, memory))
+                    record(f"decode/{label}", size,
+                           measure(lambda: decode_musicxml(xml_path, _NullSink(), validate=False),
+                                   repeat, memory))
+                finally:
+                    os.unlink(xml_path)
+
+            if lilypond and size <= MAX_LILYPOND_INPUT:
+                record(f"lilypond/{label}", size, measure(lambda: _render(data, lilypond, tmp_dir), 1, False))
+            if audio and size <= MAX_AUDIO_INPUT:
+                _audio_benchmarks(data, label, repeat, memory, tmp_dir, record, log)
+    return results
+
+
+def _audio_benchmarks(data: bytes, label: str, repeat: int, memory: bool, tmp_dir: Optional[str],
+                      record: Callable, log: Callable[[str], None]) -> None:
+    from bytes_to_wav import write_wav
+    from wav_to_bytes import decode_wav
+
+    options = dict(rate=AUDIO_RATE, transpose=AUDIO_TRANSPOSE)
+    record(f"modulate/{label}", len(data),
+           measure(lambda: write_wav(data, _NullSink(), **options), repeat, memory))
+    fd, wav_path = tempfile.mkstemp(suffix=".wav", dir=tmp_dir)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            write_wav(data, f, **options)
+        stats = measure(lambda: decode_wav(wav_path, _NullSink(), validate=False, **options), repeat, memory)
+        # The channel itself: payload carried per second of audio, and how much faster than real time it decodes
+        stats["audio_seconds"] = 2 * len(data) / AUDIO_RATE
+        record(f"demodulate/{label}", len(data), stats)
+        log(f"{'':<28} {len(data) / stats['audio_seconds']:9.1f} B/s of audio, "
+            f"decoded {stats['audio_seconds'] / stats['seconds']:.0f}x real time")
+    finally:
+        os.unlink(wav_path)
+
+
+def run_cold_starts(repeat: int = 5, log: Callable[[str], None] = print) -> Dict[str, Dict[str, float]]:
+    """Best wall time of a fresh interpreter for each of COLD_STARTS, as "cold/<name>"."""
+    results = {}
+    for name, argv in COLD_STARTS.items():
+        best = float("inf")
+        for _ in range(repeat):
+            start = time.perf_counter()
+            subprocess.run([sys.executable] + argv, cwd=REPO_DIR, check=True,
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            best = min(best, time.perf_counter() - start)
+        results[f"cold/{name}"] = {"seconds": best}
+        log(f"{'cold/' + name:<40} {best:9.4f} s")
+    return results
+
+
+def check_imports() -> List[str]:
+    """Modules of IMPORT_BUDGET that load a heavy (or forbidden) module when imported."""
+    script = ("import json, sys, importlib; importlib.import_module(sys.argv[1]); "
+              "print(json.dumps(sorted({m.split('.')[0] for m in sys.modules})))")
+    violations = []
+    for module, extra in IMPORT_BUDGET.items():
+        result = subprocess.run([sys.executable, "-c", script, module], cwd=REPO_DIR,
+                                capture_output=True, text=True)
+        if result.returncode != 0:
+            violations.append(f"import {module} failed: {result.stderr.strip().splitlines()[-1:]}")
+            continue
+        loaded = set(json.loads(result.stdout.strip().splitlines()[-1]))
+        heavy = sorted(loaded & set(HEAVY_MODULES + extra))
+        if heavy:
+            violations.append(f"import {module} loads {', '.join(heavy)}")
+    return violations
+
+
+def _number_file(xml_path: str, chunk_size: int = 1 << 16) -> None:
+    """add_measure_numbers_file without the output file."""
+    with open(xml_path, "r", encoding="utf-8", newline="") as src:
+        for _ in iter_measure_numbered(iter(lambda: src.read(chunk_size), "")):
+            pass
+
+
+def _render(data: bytes, lilypond: str, tmp_dir: Optional[str]) -> None:
+    from pathlib import Path
+
+    from bytes_to_lilypond import write_lilypond
+    from main import render_ly
+
+    with tempfile.TemporaryDirectory(dir=tmp_dir) as work:
+        ly_path = Path(work) / "bench.ly"
+        with open(ly_path, "w", encoding="utf-8") as f:
+            write_lilypond(data, f, midi=True)
+        render_ly(ly_path, lilypond)
+
+
+# -----------------------------
+# Baselines
+# -----------------------------
+def environment() -> Dict[str, str]:
+    return {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpus": str(os.cpu_count()),
+        "date": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+    }
+
+
+def save_baseline(path: str, results: Dict[str, Dict[str, float]]) -> None:
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"environment": environment(), "results": results}, f, indent=2, sort_keys=True)
+
+
+def compare(results: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]],
+            tolerance: float = 0.25, memory_tolerance: float = 0.25) -> List[str]:
+    """
+    Regressions of `results` against `baseline`: benchmarks more than
+    `tolerance` slower, or using more than `memory_tolerance` more peak
+    memory. Benchmarks missing from either side are ignored.
+    """
+    regressions = []
+    for name in sorted(results.keys() & baseline.keys()):
+        new, old = results[name], baseline[name]
+        if new["seconds"] > old["seconds"] * (1 + tolerance):
+            regressions.append(f"{name}: {new['seconds']:.4f} s vs {old['seconds']:.4f} s "
+                               f"(+{new['seconds'] / old['seconds'] - 1:.0%})")
+        if "peak_bytes" in new and old.get("peak_bytes"):
+            if new["peak_bytes"] > old["peak_bytes"] * (1 + memory_tolerance):
+                regressions.append(f"{name}: peak {new['peak_bytes'] / 1e6:.1f} MB vs "
+                                   f"{old['peak_bytes'] / 1e6:.1f} MB "
+                                   f"(+{new['peak_bytes'] / old['peak_bytes'] - 1:.0%})")
+    return regressions
+
+
+# -----------------------------
+# Command line
+# -----------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmark encoding, measure numbering, decoding and LilyPond rendering",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  python benchmark.py --save                         # record benchmarks/baseline.json
+  python benchmark.py --compare                      # fail if slower than the baseline
+  python benchmark.py --sizes 1K,1M,100M --kinds random --no-memory
+  python benchmark.py --lilypond ~/lilypond-2.24.4/bin/lilypond
+  python benchmark.py --sizes 1K --kinds random      # mostly cold start and import checks
+  python benchmark.py --sizes 1K,64K --audio
+        """
+    )
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help=f"Input sizes (default: {DEFAULT_SIZES})")
+    parser.add_argument("--kinds", default="random,json", help="Input kinds: random, json (default: both)")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per benchmark; the best counts (default: 3)")
+    parser.add_argument("--no-memory", action="store_true", help="Skip the tracemalloc peak-memory run")
+    parser.add_argument("--lilypond", help="Path of the lilypond binary to also benchmark rendering")
+    parser.add_argument("--audio", action="store_true",
+                        help=f"Also benchmark the WAV modulator and demodulator (inputs up to {MAX_AUDIO_INPUT >> 10}K)")
+    parser.add_argument("--save", nargs="?", const=DEFAULT_BASELINE, help="Write results as a baseline JSON")
+    parser.add_argument("--compare", nargs="?", const=DEFAULT_BASELINE, help="Compare against a baseline JSON")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="Allowed slowdown/memory growth against the baseline (default: 0.25)")
+    parser.add_argument("--tmp-dir", help="Directory for temporary MusicXML files")
+    parser.add_argument("--no-cold-start", action="store_true",
+                        help="Skip the interpreter start-up benchmarks and the heavy-import check")
+
+    args = parser.parse_args()
+
+    baseline = None
+    if args.compare:
+        try:
+            with open(args.compare, encoding="utf-8") as f:
+                baseline = json.load(f)["results"]
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Error: cannot read baseline {args.compare}: {e}")
+            exit(1)
+
+    results = run_benchmarks([parse_size(s) for s in args.sizes.split(",")],
+                             [k.strip() for k in args.kinds.split(",")],
+                             repeat=args.repeat, memory=not args.no_memory,
+                             lilypond=args.lilypond, tmp_dir=args.tmp_dir, audio=args.audio)
+    violations = []
+    if not args.no_cold_start:
+        results.update(run_cold_starts(max(args.repeat, 5)))
+        violations = check_imports()
+
+    if args.save:
+        save_baseline(args.save, results)
+        print(f"Wrote {args.save}")
+    if violations:
+        print(f"REGRESSION: {len(violations)} module(s) import heavy dependencies eagerly:")
+        for line in violations:
+            print(f"  {line}")
+    if baseline is not None:
+        regressions = compare(results, baseline, args.tolerance, args.tolerance)
+        if regressions:
+            print(f"REGRESSION: {len(regressions)} benchmark(s) worse than {args.compare}:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print(f"No regressions against {args.compare}")
+    if violations:
+        sys.exit(1)
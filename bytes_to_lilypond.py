@@ -0,0 +1,316 @@
+import argparse
+import io
+import os
+from typing import Dict, Iterator, List, Sequence, TextIO, Tuple
+
+import metrics
+from bytes_to_musical_xml import iter_measure_symbols, map_input, nibble_to_note, prepare_payload
+from codec_core import BytesLike
+from encoding_schemes import DEFAULT_SCHEME, SCHEMES, Scheme, event_sixteenths, get_scheme, time_signature
+from payload_compression import available_codecs
+
+
+# -----------------------------
+# Note tokens
+# -----------------------------
+# LilyPond's unmarked octave is octave 3 (c = C3, c' = middle C)
+LY_BASE_OCTAVE = 3
+LY_ALTERS = {-1: "es", 0: "", 1: "is"}
+LY_DURATIONS = {"16th": "16", "eighth": "8", "quarter": "4", "half": "2"}
+
+
+def ly_pitch(step: str, alter: int, octave: int) -> str:
+    """Absolute LilyPond pitch, e.g. ('C', 1, 4) → "cis'"."""
+    shift = octave - LY_BASE_OCTAVE
+    marks = "'" * shift if shift > 0 else "," * -shift
+    name = step.lower() + LY_ALTERS[alter]
+    # Dutch names contract the vowel steps: es, as rather than ees, aes
+    if name in ("ees", "aes"):
+        name = name[0] + "s"
+    return name + marks
+
+
+# Pitch of each nibble value: ces' cis' des' dis' ... fis''
+NOTE_TOKENS = [ly_pitch(*nibble_to_note(n)) for n in range(16)]
+
+
+def event_tokens(scheme: Scheme) -> List[str]:
+    """
+    Precompute the LilyPond token of every symbol of `scheme`: a note such as
+    "cis'4", or a chord such as "<cis' ces>4" for multi-note events.
+    """
+    table = []
+    for symbol in range(1 << scheme.bits):
+        notes = scheme.event_notes(symbol)
+        duration = LY_DURATIONS[notes[0][3]]
+        pitches = [ly_pitch(step, alter, octave) for step, alter, octave, _ in notes]
+        if len(pitches) == 1:
+            table.append(pitches[0] + duration)
+        else:
+            table.append(f"<{' '.join(pitches)}>{duration}")
+    return table
+
+
+# -----------------------------
+# Score fragments
+# -----------------------------
+LY_HEADER = (
+    '\\version "2.24.4"\n'
+    "\\pointAndClickOff\n"
+)
+LY_LAYOUT = (
+    "\\layout {\n"
+    "    \\context { \\Score\n"
+    "        autoBeaming = ##f\n"
+    "        }\n"
+    "    }\n"
+)
+LY_MUSIC_OPEN = (
+    "PartPZeroVoiceOne = {\n"
+    '    \\clef "treble" \\numericTimeSignature\\time 4/4 \\key c \\major\n'
+)
+LY_SCORE = (
+    "\n"
+    "\\score {{\n"
+    "    \\new Staff \\with {{ instrumentName = {name} }}\n"
+    "        \\new Voice = \"PartPZeroVoiceOne\" {{ \\PartPZeroVoiceOne }}\n"
+    "{blocks}"
+    "}}\n"
+)
+
+
+# Segments are engraved separately and their PDFs merged, which numbers the
+# pages itself; only the last segment keeps the tagline
+LY_SEGMENT_PAPER = (
+    "\\paper {\n"
+    "    print-page-number = ##f\n"
+    "    }\n"
+)
+LY_NO_TAGLINE = "\\header { tagline = ##f }\n"
+# Continuation of the music in a later segment: same clef and key, the bar
+# numbers carry on and the 4/4 time signature is not repeated
+LY_SEGMENT_OPEN = "    \\set Score.currentBarNumber = #{bar}\n"
+LY_OMIT_TIME = "    \\omit Staff.TimeSignature\n"
+# 16th notes in a 4/4 bar
+BAR_SIXTEENTHS = 16
+
+
+def _ly_string(text: str) -> str:
+    """LilyPond string literal."""
+    return '"' + text.replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+def iter_measures_ly(data, notes_per_measure: int = 16, scheme: str = DEFAULT_SCHEME,
+                     first_measure: int = 1, lead: Sequence[int] = ()) -> Iterator[str]:
+    """
+    Yield one line of LilyPond music per measure, ending in a bar check when
+    the measure fills whole 4/4 bars and in a "% N" measure-number comment.
+    In schemes with note lengths from the payload each measure is one bar,
+    opened by its own \\time as in the MusicXML (see time_signature).
+    Numbering starts at `first_measure`; the symbols of `lead` open the
+    first measure (see iter_measure_symbols).
+    """
+    for line, _ in _iter_measures_ly(data, notes_per_measure, get_scheme(scheme), first_measure, lead):
+        yield line
+
+
+def _iter_measures_ly(data, notes_per_measure: int, codec: Scheme, first_measure: int = 1,
+                      lead: Sequence[int] = ()) -> Iterator[Tuple[str, List[int]]]:
+    """iter_measures_ly, with the symbols of each measure."""
+    table = event_tokens(codec)
+    lengths = event_sixteenths(codec) if codec.uses_types else None
+    bar_checks = not codec.uses_types and notes_per_measure % 4 == 0
+    chunks = iter_measure_symbols(data, notes_per_measure, codec.bits, lead)
+    for number, chunk in enumerate(chunks, first_measure):
+        notes = " ".join([table[s] for s in chunk])
+        if lengths is not None:
+            beats, beat_type = time_signature(sum(lengths[s] for s in chunk))
+            yield f"    \\time {beats}/{beat_type} {notes} | % {number}\n", chunk
+        else:
+            check = "| " if bar_checks and len(chunk) == notes_per_measure else ""
+            yield f"    {notes} {check}% {number}\n", chunk
+
+
+def write_lilypond(data: BytesLike,
+                   out: TextIO,
+                   part_name: str = "Encoded Bytes",
+                   notes_per_measure: int = 16,
+                   scheme: str = DEFAULT_SCHEME,
+                   compression: str = None,
+                   layout: bool = True,
+                   midi: bool = False) -> None:
+    """
+    Stream a LilyPond score encoding `data` to the text stream `out`, one
+    measure per line, with the same notes, clef, key and time as the
+    MusicXML written by write_musicxml.
+
+    Parameters:
+    - data: Bytes to encode
+    - out: Writable text stream (opened with encoding='utf-8' for files)
+    - part_name: Instrument name printed on the staff
+    - notes_per_measure: Positive number of notes per measure
+    - scheme: Name of the encoding scheme (see encoding_schemes.SCHEMES)
+    - compression: Compression codec for the payload (see write_musicxml)
+    - layout: If True, add a \\layout block (engrave a PDF)
+    - midi: If True, add a \\midi block (render a MIDI file)
+    """
+    if notes_per_measure <= 0:
+        raise ValueError(f"notes_per_measure must be > 0 (got {notes_per_measure})")
+    if not (layout or midi):
+        raise ValueError("At least one of layout and midi must be enabled")
+    data, fields = prepare_payload(data, scheme, compression)
+    write = metrics.timed_call("ly_serialization", out.write, len)
+
+    write(_ly_head(fields, layout))
+    write(LY_MUSIC_OPEN)
+    for line in metrics.timed_iter("note_construction", iter_measures_ly(data, notes_per_measure, scheme)):
+        write(line)
+    write("    }\n")
+    write(_ly_score(part_name, layout, midi))
+
+
+def _ly_head(fields: Dict[str, str], layout: bool, paper: str = "") -> str:
+    # The scheme and codec go along as comments; the attached MusicXML is authoritative
+    comments = "".join(f"% {name}: {value}\n" for name, value in fields.items())
+    return LY_HEADER + comments + "\n" + paper + (LY_LAYOUT if layout else "")
+
+
+def _ly_score(part_name: str, layout: bool, midi: bool) -> str:
+    blocks = ""
+    if layout:
+        blocks += "    \\layout {}\n"
+    if midi:
+        blocks += "    \\midi { }\n"
+    return LY_SCORE.format(name=_ly_string(part_name or ""), blocks=blocks)
+
+
+def iter_lilypond_segments(data: BytesLike,
+                           measures_per_segment: int,
+                           part_name: str = "Encoded Bytes",
+                           notes_per_measure: int = 16,
+                           scheme: str = DEFAULT_SCHEME,
+                           compression: str = None,
+                           layout: bool = True,
+                           midi: bool = False) -> Iterator[str]:
+    """
+    Yield the score of write_lilypond split into standalone LilyPond files
+    of at least `measures_per_segment` measures each, so they can be
+    engraved in parallel and merged in order (see score_merge).
+
+    Segments end on 4/4 bar lines, so a segment runs on until its music
+    fills whole bars: with notes_per_measure 6, say, segments hold an even
+    number of measures. With note lengths from the payload (the byte
+    scheme) every measure is a bar in its own time, so segments hold
+    exactly measures_per_segment measures. Bar numbers carry on from one
+    segment to the next, the instrument name and the 4/4 time signature
+    are only printed at the start of the first, and no segment prints page
+    numbers. Only the last keeps the tagline, so the merged PDF looks like
+    one score, except that every segment starts on a new page.
+
+    Only one segment's measure lines are held in memory at a time. An empty
+    payload gives one empty segment.
+    """
+    if measures_per_segment <= 0:
+        raise ValueError(f"measures_per_segment must be > 0 (got {measures_per_segment})")
+    if notes_per_measure <= 0:
+        raise ValueError(f"notes_per_measure must be > 0 (got {notes_per_measure})")
+    if not (layout or midi):
+        raise ValueError("At least one of layout and midi must be enabled")
+    data, fields = prepare_payload(data, scheme, compression)
+    codec = get_scheme(scheme)
+    lengths = event_sixteenths(codec)
+    measures = metrics.timed_iter("note_construction", _iter_measures_ly(data, notes_per_measure, codec))
+
+    def segment(first: bool, bar: int, chunk: List[str], last: bool) -> str:
+        with metrics.stage("ly_serialization"):
+            parts = [_ly_head(fields, layout, LY_SEGMENT_PAPER + ("" if last else LY_NO_TAGLINE)),
+                     LY_MUSIC_OPEN]
+            if not first:
+                if not codec.uses_types:
+                    parts.append(LY_OMIT_TIME)
+                parts.append(LY_SEGMENT_OPEN.format(bar=bar))
+            parts.extend(chunk)
+            parts.append("    }\n")
+            parts.append(_ly_score(part_name if first else "", layout, midi))
+            return "".join(parts)
+
+    # A segment is written once the next one has a measure, so the last is known
+    bar, chunk, elapsed = 1, [], 0
+    for line, symbols in measures:
+        if len(chunk) >= measures_per_segment and not elapsed % BAR_SIXTEENTHS:
+            yield segment(bar == 1, bar, chunk, False)
+            bar, chunk, elapsed = bar + elapsed // BAR_SIXTEENTHS, [], 0
+        chunk.append(line)
+        # A measure with its own time signature is one bar
+        elapsed += BAR_SIXTEENTHS if codec.uses_types else sum(lengths[s] for s in symbols)
+    yield segment(bar == 1, bar, chunk, True)
+
+
+def bytes_to_lilypond(data: bytes,
+                      part_name: str = "Encoded Bytes",
+                      notes_per_measure: int = 16,
+                      scheme: str = DEFAULT_SCHEME,
+                      compression: str = None,
+                      layout: bool = True,
+                      midi: bool = False) -> str:
+    """Return the LilyPond score of `data` as a string (see write_lilypond)."""
+    buf = io.StringIO()
+    write_lilypond(data, buf, part_name=part_name, notes_per_measure=notes_per_measure,
+                   scheme=scheme, compression=compression, layout=layout, midi=midi)
+    return buf.getvalue()
+
+
+# -----------------------------
+# Example usage
+# -----------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Convert arbitrary bytes straight to a LilyPond score",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  python bytes_to_lilypond.py input.json -o output.ly --midi
+  python bytes_to_lilypond.py input.json -o output.ly --no-layout --midi
+  python bytes_to_lilypond.py more.json -o output.ly --append     (extend output.ly in place)
+  lilypond output.ly
+        """
+    )
+    parser.add_argument("input_file", help="Input file to convert")
+    parser.add_argument("-o", "--output", default="output.ly", help="Output .ly file (default: output.ly)")
+    parser.add_argument("-n", "--notes-per-measure", type=int, default=16,
+                        help="Number of notes per measure (default: 16)")
+    parser.add_argument("-p", "--part-name", default="Encoded Bytes",
+                        help="Name of the musical part (default: 'Encoded Bytes')")
+    parser.add_argument("-s", "--scheme", choices=sorted(SCHEMES), default=DEFAULT_SCHEME,
+                        help="Encoding scheme (default: nibble)")
+    parser.add_argument("-c", "--compress", choices=["none", "auto"] + sorted(available_codecs()),
+                        default="none", help="Compress the input before encoding (default: none)")
+    parser.add_argument("--midi", action="store_true", help="Add a \\midi block")
+    parser.add_argument("--no-layout", action="store_true", help="Leave out the \\layout block (MIDI only)")
+    parser.add_argument("--append", action="store_true",
+                        help="Append the input to the payload of an existing OUTPUT instead of overwriting it")
+
+    args = parser.parse_args()
+    if args.append and args.compress != "none":
+        parser.error("--append cannot compress the input")
+
+    try:
+        if args.append and os.path.exists(args.output):
+            from score_append import append_lilypond
+
+            with map_input(args.input_file) as data:
+                result = append_lilypond(args.output, data, args.notes_per_measure)
+                print(f"Appended {len(data)} bytes: {result['measures']} measures")
+        else:
+            with map_input(args.input_file) as data, open(args.output, "w", encoding="utf-8") as f:
+                write_lilypond(data, f,
+                               part_name=args.part_name,
+                               notes_per_measure=args.notes_per_measure,
+                               scheme=args.scheme,
+                               compression=args.compress,
+                               layout=not args.no_layout,
+                               midi=args.midi)
+    except Exception as e:
+        print(f"Error: {e}")
+        exit(1)
+    print(f"Wrote {args.output}")
@@ -0,0 +1,186 @@
+import argparse
+import io
+import struct
+from typing import TYPE_CHECKING, BinaryIO, Iterator, List
+
+from bytes_to_musical_xml import iter_blocks, map_input, prepare_payload
+from encoding_schemes import DEFAULT_SCHEME, NOTE_TYPES, SCHEMES, Scheme, get_scheme
+from codec_core import BytesLike
+from payload_compression import available_codecs
+
+# NumPy (through nibble_codec) is imported when a file is written, not on import
+if TYPE_CHECKING:
+    import numpy as np
+
+
+# -----------------------------
+# MIDI note mapping
+# -----------------------------
+# MIDI keys carry no spelling (C#4 and Db4 are both key 61), so the
+# accidental travels in the note-on velocity.
+FLAT_VELOCITY = 80
+SHARP_VELOCITY = 100
+
+SEMITONES = {"C": 0, "D": 2, "E": 4, "F": 5, "G": 7, "A": 9, "B": 11}
+VELOCITIES = {-1: FLAT_VELOCITY, 1: SHARP_VELOCITY}
+
+# Quarter notes per minute; matches what LilyPond writes for our scores
+TEMPO_BPM = 60
+
+
+def midi_key(step: str, alter: int, octave: int) -> int:
+    """MIDI key number of a pitch, e.g. ('C', 0, 4) → 60."""
+    return 12 * (octave + 1) + SEMITONES[step] + alter
+
+
+def var_len(value: int) -> bytes:
+    """Encode a delta time as a MIDI variable-length quantity."""
+    out = [value & 0x7F]
+    value >>= 7
+    while value:
+        out.append(0x80 | (value & 0x7F))
+        value >>= 7
+    return bytes(reversed(out))
+
+
+def _meta(kind: int, payload: bytes) -> bytes:
+    return b"\x00\xff" + bytes([kind]) + var_len(len(payload)) + payload
+
+
+def event_messages(scheme: Scheme, division: int) -> List[bytes]:
+    """
+    Precompute the track events of every symbol of `scheme`, in running
+    status (every message is a channel 0 note-on; velocity 0 ends a note):
+    note-ons of all notes of the event at delta 0, then their note-offs
+    after the event's duration.
+    """
+    table = []
+    for symbol in range(1 << scheme.bits):
+        notes = scheme.event_notes(symbol)
+        keys = [midi_key(step, alter, octave) for step, alter, octave, _ in notes]
+        ons = b"".join(bytes([0, key, VELOCITIES[note[1]]]) for key, note in zip(keys, notes))
+        duration = int(division * NOTE_TYPES[notes[0][3]])
+        offs = b"".join((var_len(duration) if i == 0 else b"\x00") + bytes([key, 0])
+                        for i, key in enumerate(keys))
+        table.append(ons + offs)
+    return table
+
+
+def iter_symbol_blocks(data, bits: int) -> Iterator["np.ndarray"]:
+    """Yield the symbols (nibbles for bits=4, bytes for bits=8) of `data` one block at a time."""
+    import numpy as np
+    from nibble_codec import split_nibbles
+
+    for block in iter_blocks(data):
+        yield split_nibbles(block) if bits == 4 else np.frombuffer(block, dtype=np.uint8)
+
+
+# -----------------------------
+# bytes → Standard MIDI File (streaming)
+# -----------------------------
+def write_midi(data: BytesLike,
+               out: BinaryIO,
+               quarter_duration: int = 480,
+               part_name: str = "Encoded Bytes",
+               scheme: str = DEFAULT_SCHEME,
+               compression: str = None) -> int:
+    """
+    Stream a single-track Standard MIDI File encoding `data` to the binary
+    stream `out`, using the same notes as the MusicXML encoding.
+
+    The track length is counted from a first pass over the symbols, so the
+    file is written front to back and `out` does not need to be seekable.
+
+    Parameters:
+    - data: Bytes to encode
+    - out: Writable binary stream
+    - quarter_duration: Ticks per quarter note (1–32767)
+    - part_name: Track name
+    - scheme: Name of the encoding scheme (see encoding_schemes.SCHEMES)
+    - compression: Compression codec for the payload (see write_musicxml)
+
+    Returns the number of bytes written.
+    """
+    import numpy as np
+
+    if not 0 < quarter_duration < 0x8000:
+        raise ValueError(f"quarter_duration must be between 1 and 32767 (got {quarter_duration})")
+    codec = get_scheme(scheme)
+    codec.check(quarter_duration)
+    # The length pass needs the payload twice; the compressed payload is small
+    data, fields = prepare_payload(data, scheme, compression, joined=True)
+
+    table = event_messages(codec, quarter_duration)
+    lengths = np.array([len(t) for t in table], dtype=np.int64)
+
+    prefix = [_meta(0x03, (part_name or "").encode("utf-8"))]
+    # Header fields (scheme, compression) as text events, like the MusicXML header
+    prefix += [_meta(0x01, f"{name}={value}".encode("utf-8")) for name, value in fields.items()]
+    prefix.append(_meta(0x58, bytes([4, 2, 24, 8])))
+    prefix.append(_meta(0x51, (60_000_000 // TEMPO_BPM).to_bytes(3, "big")))
+    prefix = b"".join(prefix)
+    end = _meta(0x2F, b"")
+
+    body_length = sum(int(lengths[symbols].sum()) for symbols in iter_symbol_blocks(data, codec.bits))
+    # The first message carries the explicit note-on status byte
+    track_length = len(prefix) + body_length + (1 if body_length else 0) + len(end)
+
+    out.write(b"MThd" + struct.pack(">IHHH", 6, 0, 1, quarter_duration))
+    out.write(b"MTrk" + struct.pack(">I", track_length))
+    out.write(prefix)
+    first = True
+    for symbols in iter_symbol_blocks(data, codec.bits):
+        chunk = b"".join([table[s] for s in symbols.tolist()])
+        if first and chunk:
+            chunk = chunk[:1] + b"\x90" + chunk[1:]
+            first = False
+        out.write(chunk)
+    out.write(end)
+    return 22 + track_length
+
+
+def bytes_to_midi(data: bytes,
+                  quarter_duration: int = 480,
+                  part_name: str = "Encoded Bytes",
+                  scheme: str = DEFAULT_SCHEME,
+                  compression: str = None) -> bytes:
+    """Return the Standard MIDI File encoding `data` (see write_midi)."""
+    buf = io.BytesIO()
+    write_midi(data, buf, quarter_duration=quarter_duration, part_name=part_name,
+               scheme=scheme, compression=compression)
+    return buf.getvalue()
+
+
+# -----------------------------
+# Example usage
+# -----------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Convert arbitrary bytes straight to a Standard MIDI File",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  python bytes_to_midi.py input.json -o output.mid
+  python bytes_to_midi.py input.json -o output.mid --scheme byte --compress auto
+  python midi_to_bytes.py output.mid -o decoded.json
+        """
+    )
+    parser.add_argument("input_file", help="Input file to convert")
+    parser.add_argument("-o", "--output", default="output.mid", help="Output MIDI file (default: output.mid)")
+    parser.add_argument("-p", "--part-name", default="Encoded Bytes",
+                        help="Track name (default: 'Encoded Bytes')")
+    parser.add_argument("-s", "--scheme", choices=sorted(SCHEMES), default=DEFAULT_SCHEME,
+                        help="Encoding scheme (default: nibble)")
+    parser.add_argument("-c", "--compress", choices=["none", "auto"] + sorted(available_codecs()),
+                        default="none", help="Compress the input before encoding (default: none)")
+
+    args = parser.parse_args()
+
+    try:
+        with map_input(args.input_file) as data, open(args.output, "wb") as f:
+            size = write_midi(data, f, part_name=args.part_name, scheme=args.scheme,
+                              compression=args.compress)
+    except Exception as e:
+        print(f"Error: {e}")
+        exit(1)
+    print(f"Wrote {size} bytes to {args.output}")
@@ -1,44 +1,411 @@
+import io
+import mmap
 import os
+import re
+import sys
 import argparse
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack, contextmanager
+from typing import Dict, Iterable, Iterator, List, Sequence, TextIO, Tuple
 
-import partitura
-from partitura.score import Part, Note, Measure, TimeSignature, KeySignature, Clef
-from typing import Tuple, List
+import metrics
+from encoding_schemes import (DEFAULT_SCHEME, NOTE_TYPES, SCHEMES, Scheme, event_sixteenths, get_scheme, header_fields,
+                              time_signature)
+from codec_core import BytesLike, nibble_to_note
+from mxl_container import MXL_SUFFIX, open_score_writer
+from payload_compression import (HEADER_COMPRESSION, HEADER_LENGTH, available_codecs, choose_codec,
+                                 iter_compressed)
 
 
 # -----------------------------
-# 4-bit nibble → musical note
+# MusicXML fragments
 # -----------------------------
-def nibble_to_note(n: int) -> Tuple[str, int, int]:
+# The streaming writer below emits exactly what partitura.save_musicxml
+# produces for our fixed layout, so every piece of markup is precomputed once.
+XML_HEADER = (
+    "<?xml version='1.0' encoding='UTF-8'?>\n"
+    '<!DOCTYPE score-partwise PUBLIC\n'
+    '  "-//Recordare//DTD MusicXML 3.1 Partwise//EN"\n'
+    '  "http://www.musicxml.org/dtds/partwise.dtd">\n'
+    '<score-partwise>\n'
+)
+PART_LIST_OPEN = (
+    '  <part-list>\n'
+    '    <score-part id="P0">\n'
+)
+MEASURE_SEP = "    <!--=======================================================-->\n"
+TIME_XML = (
+    "        <time>\n"
+    "          <beats>{beats}</beats>\n"
+    "          <beat-type>{beat_type}</beat-type>\n"
+    "        </time>\n"
+)
+ATTRIBUTES_XML = (
+    "      <attributes>\n"
+    "        <divisions>{divisions}</divisions>\n"
+    "        <key>\n"
+    "          <fifths>0</fifths>\n"
+    "          <mode>major</mode>\n"
+    "        </key>\n"
+    "{time}"
+    "        <staves>1</staves>\n"
+    "        <clef>\n"
+    "          <sign>G</sign>\n"
+    "          <line>2</line>\n"
+    "        </clef>\n"
+    "      </attributes>\n"
+)
+# Time signature change opening a later measure
+TIME_CHANGE_XML = "      <attributes>\n{time}      </attributes>\n"
+NOTE_OPEN = '      <note id="n%d">\n'
+NOTE_BODY = (
+    "{chord}"
+    "        <pitch>\n"
+    "          <step>{step}</step>\n"
+    "          <alter>{alter}</alter>\n"
+    "          <octave>{octave}</octave>\n"
+    "        </pitch>\n"
+    "        <duration>{duration}</duration>\n"
+    "        <voice>1</voice>\n"
+    "        <type>{type}</type>\n"
+    "      </note>\n"
+)
+CHORD_XML = "        <chord/>\n"
+
+
+def _escape_text(text: str) -> str:
+    """Escape element text the way lxml serializes it (NUL is dropped, like partitura does)."""
+    return (text.replace("\x00", "")
+                .replace("&", "&amp;")
+                .replace("<", "&lt;")
+                .replace(">", "&gt;")
+                .replace("\r", "&#13;"))
+
+
+def identification_xml(fields: Dict[str, str]) -> str:
+    """<identification> block carrying encoder metadata as <miscellaneous-field>s."""
+    if not fields:
+        return ""
+    lines = ["  <identification>\n", "    <miscellaneous>\n"]
+    for name, value in fields.items():
+        lines.append(f'      <miscellaneous-field name="{name}">{_escape_text(value)}</miscellaneous-field>\n')
+    lines.append("    </miscellaneous>\n")
+    lines.append("  </identification>\n")
+    return "".join(lines)
+
+
+def note_bodies(quarter_duration: int) -> List[str]:
     """
-    Convert a 4-bit value (0–15) into (step, alter, octave)
-    using your encoding rules:
+    Precompute the XML of one note (everything after the <note id="..."> tag)
+    for each of the 16 nibble values.
+    """
+    return [bodies[0] for bodies in event_bodies(SCHEMES[DEFAULT_SCHEME], quarter_duration)]
+
+
+def event_bodies(scheme: Scheme, quarter_duration: int) -> List[List[str]]:
+    """
+    Precompute the note bodies of every symbol of `scheme`: one list per
+    symbol, one body per note of the event (chord notes after the first
+    carry <chord/>).
+    """
+    table = []
+    for symbol in range(1 << scheme.bits):
+        bodies = []
+        for i, (step, alter, octave, note_type) in enumerate(scheme.event_notes(symbol)):
+            bodies.append(NOTE_BODY.format(chord=CHORD_XML if i else "",
+                                           step=step, alter=alter, octave=octave,
+                                           duration=int(quarter_duration * NOTE_TYPES[note_type]),
+                                           type=note_type))
+        table.append(bodies)
+    return table
+
+
+# Input is split into symbols this many bytes at a time
+BLOCK_SIZE = 1 << 16
+
+
+def iter_measure_nibbles(data: BytesLike, notes_per_measure: int) -> Iterator[List[int]]:
+    """
+    Yield the nibbles of each measure as a list, splitting `data` with the
+    batch codec one block at a time so memory stays flat.
+    """
+    return iter_measure_symbols(data, notes_per_measure, 4)
+
+
+def iter_blocks(data, block_size: int = BLOCK_SIZE) -> Iterator[BytesLike]:
+    """Cut bytes-like `data` into blocks; an iterable of byte chunks is passed through."""
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        view = memoryview(data)
+        return (view[offset:offset + block_size] for offset in range(0, len(view), block_size))
+    return iter(data)
+
+
+def iter_measure_symbols(data, events_per_measure: int, bits: int,
+                         lead: Sequence[int] = ()) -> Iterator[List[int]]:
+    """
+    Yield the symbols (nibbles for bits=4, bytes for bits=8) of each measure
+    as a list, one block of `data` at a time so memory stays flat. `data` is
+    bytes-like or an iterable of byte chunks of any size. The symbols of
+    `lead` come first, e.g. those of a partial measure being continued.
+    """
+    import numpy as np
+    from nibble_codec import split_nibbles
+
+    carry = np.array(lead, dtype=np.uint8)
+    for block in iter_blocks(data):
+        with metrics.stage("nibble_split", nbytes=len(block)):
+            symbols = split_nibbles(block) if bits == 4 else np.frombuffer(block, dtype=np.uint8)
+            if carry.size:
+                symbols = np.concatenate((carry, symbols))
+            full = symbols.size - symbols.size % events_per_measure
+            measures = symbols[:full].reshape(-1, events_per_measure).tolist()
+            carry = symbols[full:]
+        yield from measures
+    if carry.size:
+        yield carry.tolist()
+
+
+def iter_measures_xml(data: BytesLike,
+                      quarter_duration: int = 480,
+                      notes_per_measure: int = 16,
+                      measure_numbers: bool = False,
+                      first_measure: int = 1,
+                      scheme: str = DEFAULT_SCHEME,
+                      lead: Sequence[int] = ()) -> Iterator[str]:
+    """
+    Yield the XML of each measure encoding `data`, starting at measure
+    `first_measure`. Note ids continue from the notes of the preceding
+    measures, so a shard of a larger input renders exactly like the
+    corresponding measures of the whole. The symbols of `lead` open the
+    first measure (see iter_measure_symbols).
+
+    notes_per_measure counts events, i.e. chords count once. Measures
+    are declared 4/4, except in schemes with note lengths from the payload,
+    where every measure declares its own length (see time_signature).
+    """
+    codec = get_scheme(scheme)
+    table = event_bodies(codec, quarter_duration)
+    lengths = event_sixteenths(codec) if codec.uses_types else None
+    time = TIME_XML.format(beats=4, beat_type=4)
+    note_id = (first_measure - 1) * notes_per_measure * codec.notes_per_event
+    measure_number = first_measure
+    for chunk in iter_measure_symbols(data, notes_per_measure, codec.bits, lead):
+        if measure_numbers:
+            pieces = [MEASURE_SEP, f'    <measure number="{measure_number}">\n']
+        else:
+            pieces = [MEASURE_SEP, "    <measure>\n"]
+        if lengths is not None:
+            beats, beat_type = time_signature(sum(lengths[s] for s in chunk))
+            time = TIME_XML.format(beats=beats, beat_type=beat_type)
+        if measure_number == 1:
+            pieces.append(ATTRIBUTES_XML.format(divisions=quarter_duration, time=time))
+        elif lengths is not None:
+            pieces.append(TIME_CHANGE_XML.format(time=time))
+        measure_number += 1
+        for symbol in chunk:
+            for body in table[symbol]:
+                pieces.append(NOTE_OPEN % note_id)
+                pieces.append(body)
+                note_id += 1
+        pieces.append("    </measure>\n")
+        yield "".join(pieces)
+
+
+# -----------------------------
+# Sharded parallel encoding
+# -----------------------------
+# Approximate number of input bytes handed to one worker
+SHARD_SIZE = 1 << 18
+
+
+def shard_measures(notes_per_measure: int, shard_size: int = SHARD_SIZE, bits: int = 4) -> int:
+    """
+    Number of measures per shard. For nibble symbols it is kept even when
+    notes_per_measure is odd so that every shard starts on a byte boundary.
+    """
+    per_byte = 8 // bits
+    measures = max(1, (shard_size * per_byte) // notes_per_measure)
+    if per_byte == 2 and notes_per_measure % 2 and measures % 2:
+        measures += 1
+    return measures
+
+
+def _encode_shard(args) -> str:
+    shard, quarter_duration, notes_per_measure, measure_numbers, first_measure, scheme = args
+    return "".join(iter_measures_xml(shard, quarter_duration, notes_per_measure,
+                                     measure_numbers, first_measure, scheme))
+
+
+def iter_measures_xml_parallel(data: BytesLike,
+                               jobs: int,
+                               quarter_duration: int = 480,
+                               notes_per_measure: int = 16,
+                               measure_numbers: bool = False,
+                               shard_size: int = SHARD_SIZE,
+                               scheme: str = DEFAULT_SCHEME) -> Iterator[str]:
+    """
+    Same output as iter_measures_xml, with the input cut into shards on measure
+    boundaries and encoded in a pool of `jobs` worker processes. Shards are
+    yielded in order; at most 2 * jobs shards are in flight at a time.
+    """
+    view = memoryview(data)
+    bits = get_scheme(scheme).bits
+    measures = shard_measures(notes_per_measure, shard_size, bits)
+    step = measures * notes_per_measure * bits // 8
+    tasks = ((bytes(view[offset:offset + step]), quarter_duration, notes_per_measure,
+              measure_numbers, 1 + (offset // step) * measures, scheme)
+             for offset in range(0, len(view), step))
+
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        pending = []
+        for task in tasks:
+            pending.append(pool.submit(_encode_shard, task))
+            if len(pending) >= 2 * jobs:
+                yield pending.pop(0).result()
+        for future in pending:
+            yield future.result()
+
 
-        pitch (2 bits): 0=C, 1=D, 2=E, 3=F
-        accidental:     0=flat, 1=sharp
-        octave:         0=4,    1=5
+# -----------------------------
+# bytes → MusicXML (streaming)
+# -----------------------------
+def prepare_payload(data: BytesLike,
+                    scheme: str = DEFAULT_SCHEME,
+                    compression: str = None,
+                    joined: bool = False) -> Tuple[object, Dict[str, str]]:
     """
-    if not 0 <= n <= 0xF:
-        raise ValueError("Nibble must be 0–15")
+    Apply `compression` to `data` and collect the header fields describing
+    the scheme and codec.
 
-    # bits 0–1
-    pitch_bits = n & 0b11
-    # bit 2
-    accidental_bit = (n >> 2) & 0b1
-    # bit 3
-    octave_bit = (n >> 3) & 0b1
+    Returns (payload, fields). The payload is `data` itself, or an iterator
+    of compressed chunks (joined into bytes if `joined`).
+    """
+    fields = header_fields(get_scheme(scheme))
+    if compression == "auto":
+        compression = choose_codec(data)
+    if compression not in (None, "none"):
+        fields[HEADER_COMPRESSION] = compression
+        fields[HEADER_LENGTH] = str(len(data))
+        data = metrics.timed_iter("compress", iter_compressed(data, compression), len)
+        if joined:
+            data = b"".join(data)
+    return data, fields
+
+
+def iter_musicxml(data: BytesLike,
+                  quarter_duration: int = 480,
+                  part_name: str = "Encoded Bytes",
+                  notes_per_measure: int = 16,
+                  measure_numbers: bool = False,
+                  jobs: int = 1,
+                  scheme: str = DEFAULT_SCHEME,
+                  compression: str = None) -> Iterator[str]:
+    """
+    Yield the MusicXML encoding of `data` as text chunks: the header, then
+    one chunk per measure (one per shard with jobs > 1), then the closing
+    tags. Only one chunk is held at a time, so memory stays flat however
+    large `data` is (e.g. a memory-mapped file, see map_input).
+
+    Takes the same parameters as write_musicxml; "".join() of the chunks is
+    what write_musicxml writes. Parameters are checked when called, before
+    the first chunk is requested.
+    """
+    if quarter_duration <= 0:
+        raise ValueError(f"quarter_duration must be > 0 (got {quarter_duration})")
+    if notes_per_measure <= 0:
+        raise ValueError(f"notes_per_measure must be > 0 (got {notes_per_measure})")
+    get_scheme(scheme).check(quarter_duration)
+    # Shards need random access; the compressed payload is small
+    data, fields = prepare_payload(data, scheme, compression, joined=jobs > 1)
+
+    if jobs > 1 and len(data) > SHARD_SIZE:
+        measures = iter_measures_xml_parallel(data, jobs, quarter_duration,
+                                              notes_per_measure, measure_numbers,
+                                              scheme=scheme)
+    else:
+        measures = iter_measures_xml(data, quarter_duration, notes_per_measure,
+                                     measure_numbers, scheme=scheme)
+    measures = iter(metrics.timed_iter("note_construction", measures))
+    return _iter_score_chunks(measures, fields, part_name)
+
+
+def _iter_score_chunks(measures: Iterator[str], fields: Dict[str, str], part_name: str) -> Iterator[str]:
+    name = _escape_text(part_name or "")
+    yield "".join([XML_HEADER, identification_xml(fields), PART_LIST_OPEN,
+                   f"      <part-name>{name}</part-name>\n" if name else "      <part-name/>\n",
+                   "    </score-part>\n  </part-list>\n"])
+
+    first = next(measures, None)
+    if first is None:
+        yield '  <part id="P0"/>\n</score-partwise>\n'
+        return
+
+    yield '  <part id="P0">\n'
+    yield first
+    yield from measures
+    yield "  </part>\n</score-partwise>\n"
+
+
+def write_musicxml(data: BytesLike,
+                   out: TextIO,
+                   quarter_duration: int = 480,
+                   part_name: str = "Encoded Bytes",
+                   notes_per_measure: int = 16,
+                   measure_numbers: bool = False,
+                   jobs: int = 1,
+                   scheme: str = DEFAULT_SCHEME,
+                   compression: str = None) -> None:
+    """
+    Stream the MusicXML encoding of `data` to the text stream `out`, one measure
+    at a time, without building a partitura Part.
 
-    # C, D, E, F
-    steps = ["C", "D", "E", "F"]
-    step = steps[pitch_bits]
+    The output is byte-identical to what bytes_to_musicxml(..., native=False)
+    produces through partitura.save_musicxml.
 
-    # accidental: flat = -1, sharp = +1
-    alter = -1 if accidental_bit == 0 else +1
+    Parameters:
+    - data: Bytes to encode
+    - out: Writable text stream (opened with encoding='utf-8' for files)
+    - quarter_duration: Tick length of one quarter note (must be > 0)
+    - part_name: Name for the part
+    - notes_per_measure: Positive number of notes per measure
+    - measure_numbers: If True, write <measure number="N"> while generating,
+      giving the same numbering as add_measure_numbers without a second pass
+    - jobs: Number of worker processes; inputs larger than one shard are
+      encoded in parallel with identical output
+    - scheme: Name of the encoding scheme (see encoding_schemes.SCHEMES). Any
+      scheme other than the default is recorded in the score's
+      <identification> block so the decoder can pick it automatically
+    - compression: None/"none", a codec from payload_compression.available_codecs(),
+      or "auto" to pick the codec that best shrinks the start of `data`. The
+      payload is compressed as it is encoded; the codec and the original
+      length are recorded in the header
+    """
+    chunks = iter_musicxml(data, quarter_duration, part_name, notes_per_measure,
+                           measure_numbers, jobs, scheme, compression)
+    # Returns out.write itself when metrics are disabled
+    write = metrics.timed_call("xml_serialization", out.write, len)
+    for chunk in chunks:
+        write(chunk)
 
-    # octave 4 or 5
-    octave = 4 + octave_bit
 
-    return step, alter, octave
+@contextmanager
+def map_input(path) -> Iterator[BytesLike]:
+    """
+    Memory-map the file at `path` read-only for encoding: pages are read
+    from disk as the encoder reaches them and can be dropped again, so the
+    input never has to fit in memory. Yields b"" for an empty file.
+    """
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            yield b""
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            view = memoryview(mm)
+            try:
+                yield view
+            finally:
+                # The map can only be closed once no view of it is left
+                view.release()
 
 
 # -----------------------------
@@ -48,7 +415,10 @@ def bytes_to_musicxml(data: bytes,
                       quarter_duration: int = 480,
                       part_name: str = "Encoded Bytes",
                       notes_per_measure: int = 16,
-                      validate: bool = True) -> str:
+                      validate: bool = True,
+                      native: bool = True,
+                      scheme: str = DEFAULT_SCHEME,
+                      compression: str = None) -> str:
     """
     Convert arbitrary bytes into a sequence of musical notes encoded using 4-bit chunks.
 
@@ -57,7 +427,36 @@ def bytes_to_musicxml(data: bytes,
     - part_name: Name for the part
     - notes_per_measure: Positive number of notes per measure
     - validate: If True, prints warnings for any zero-length notes/measures
+      (only meaningful for the partitura path; the native writer cannot produce them)
+    - native: If True, use the streaming writer; if False, build a partitura Part
+      and serialize it with partitura.save_musicxml
+    - scheme: Encoding scheme; only the default "nibble" scheme has a partitura path
+    - compression: Compression codec for the payload (see write_musicxml)
     """
+    if native:
+        buf = io.StringIO()
+        write_musicxml(data, buf,
+                       quarter_duration=quarter_duration,
+                       part_name=part_name,
+                       notes_per_measure=notes_per_measure,
+                       scheme=scheme,
+                       compression=compression)
+        return buf.getvalue()
+    if scheme != DEFAULT_SCHEME or compression not in (None, "none"):
+        raise ValueError(f"The partitura path only supports the uncompressed {DEFAULT_SCHEME} scheme")
+    return _bytes_to_musicxml_partitura(data, quarter_duration, part_name,
+                                        notes_per_measure, validate)
+
+
+def _bytes_to_musicxml_partitura(data: bytes,
+                                 quarter_duration: int,
+                                 part_name: str,
+                                 notes_per_measure: int,
+                                 validate: bool) -> str:
+    # Only the partitura path needs partitura; the streaming writer does not
+    import partitura
+    from partitura.score import Part, Note, Measure, TimeSignature, KeySignature, Clef
+
     if quarter_duration <= 0:
         raise ValueError(f"quarter_duration must be > 0 (got {quarter_duration})")
     if notes_per_measure <= 0:
@@ -135,29 +534,71 @@ def bytes_to_musicxml(data: bytes,
         xml_text = xml_bytes
     return xml_text
 
-import xml.etree.ElementTree as ET
+# -----------------------------
+# Measure numbering
+# -----------------------------
+# <measure ...> start tags only, not <measure-style>, <measure-numbering>, ...
+MEASURE_TAG = re.compile(r"<measure(?=[\s/>])([^>]*?)(/?)>")
+NUMBER_ATTR = re.compile(r"""(\snumber\s*=\s*)(["'])(.*?)\2""", re.S)
+
+
+def iter_measure_numbered(chunks: Iterable[str]) -> Iterator[str]:
+    """
+    Stream MusicXML text through, giving every <measure> without a (non-empty)
+    number attribute its position as number. Only the <measure> start tags
+    change; everything else is passed through untouched.
+    """
+    counter = 1
+
+    def renumber(m):
+        nonlocal counter
+        number = str(counter)
+        counter += 1
+        attrs, slash = m.group(1), m.group(2)
+        existing = NUMBER_ATTR.search(attrs)
+        if existing is None:
+            return f'<measure{attrs.rstrip()} number="{number}"{slash}>'
+        if existing.group(3):
+            return m.group(0)
+        q = existing.group(2)
+        attrs = attrs[:existing.start()] + f"{existing.group(1)}{q}{number}{q}" + attrs[existing.end():]
+        return f"<measure{attrs}{slash}>"
+
+    carry = ""
+    for chunk in chunks:
+        text = carry + chunk
+        # Hold back a start tag that is cut in half by the chunk boundary
+        cut = text.rfind("<")
+        if cut != -1 and text.find(">", cut) == -1:
+            text, carry = text[:cut], text[cut:]
+        else:
+            carry = ""
+        yield MEASURE_TAG.sub(renumber, text)
+    if carry:
+        yield MEASURE_TAG.sub(renumber, carry)
+
 
 def add_measure_numbers(xml_in: str) -> str:
-    tree = ET.fromstring(xml_in)
-    ns = ''  # partitura usually uses no default namespace for score-partwise
-
-    measure_counter = 1
-    for part in tree.findall('part'):
-        for measure in part.findall('measure'):
-            if 'number' not in measure.attrib:
-                measure.set('number', str(measure_counter))
-            else:
-                # if present but empty, fix it too
-                if not measure.attrib['number']:
-                    measure.set('number', str(measure_counter))
-            measure_counter += 1
+    return "".join(metrics.timed_iter("measure_numbering", iter_measure_numbered([xml_in]), len))
+
 
-    return ET.tostring(tree, encoding='utf-8', xml_declaration=True).decode('utf-8')
+def add_measure_numbers_file(src_path: str, dst_path: str, chunk_size: int = 1 << 16) -> None:
+    """Number the measures of an existing MusicXML file, streaming it to dst_path."""
+    with open(src_path, "r", encoding="utf-8", newline="") as src, \
+            open(dst_path, "w", encoding="utf-8", newline="") as dst:
+        chunks = metrics.timed_iter("read", iter(lambda: src.read(chunk_size), ""), len)
+        write = metrics.timed_call("write", dst.write, len)
+        for text in metrics.timed_iter("measure_numbering", iter_measure_numbered(chunks), len):
+            write(text)
 
 # -----------------------------
 # Example usage
 # -----------------------------
 if __name__ == "__main__":
+    if sys.argv[1:2] == ["batch"]:
+        from batch import batch_main
+        sys.exit(batch_main("encode", sys.argv[2:]))
+
     parser = argparse.ArgumentParser(
         description="Convert arbitrary bytes to MusicXML notation",
         formatter_class=argparse.RawDescriptionHelpFormatter,
@@ -166,6 +607,15 @@ Examples:
   python bytes_to_musical_xml.py input.json
   python bytes_to_musical_xml.py input.json -o music.xml
   python bytes_to_musical_xml.py input.json --notes-per-measure 8 -o music.xml
+  python bytes_to_musical_xml.py big.bin -o big.xml --jobs 8
+  python bytes_to_musical_xml.py input.json -o music.xml --scheme byte
+  python bytes_to_musical_xml.py input.json -o music.xml --compress auto
+  python bytes_to_musical_xml.py big.bin -o big.xml --index
+  python bytes_to_musical_xml.py more.bin -o big.xml --append        (extend big.xml in place)
+  python bytes_to_musical_xml.py big.bin -o big.mxl                 (compressed MusicXML)
+  python bytes_to_musical_xml.py input.json -o music.xml --cache-dir ~/.cache/msenc
+  python bytes_to_musical_xml.py big.bin -o big.xml --profile --metrics-json metrics.json
+  python bytes_to_musical_xml.py batch payloads/ -o scores/ --jobs 8   (see batch --help)
         """
     )
     parser.add_argument(
@@ -175,7 +625,7 @@ Examples:
     )
     parser.add_argument(
         "-o", "--output",
-        help="Output MusicXML file path (default: music.xml)"
+        help="Output MusicXML file path; a .mxl path writes a compressed container (default: music.xml)"
     )
     parser.add_argument(
         "-n", "--notes-per-measure",
@@ -189,18 +639,49 @@ Examples:
         help="Name of the musical part (default: 'Encoded Bytes')"
     )
     parser.add_argument("--no-validate", action="store_true", help="Disable zero-duration sanity checks")
+    parser.add_argument(
+        "-j", "--jobs",
+        type=int,
+        default=1,
+        help="Worker processes for encoding large inputs (default: 1)"
+    )
+    parser.add_argument(
+        "-s", "--scheme",
+        choices=sorted(SCHEMES),
+        default=DEFAULT_SCHEME,
+        help="Encoding scheme: nibble (4 bits/note), byte (8 bits/note), "
+             "chord (8 bits/two-note chord) (default: nibble)"
+    )
+    parser.add_argument(
+        "-c", "--compress",
+        choices=["none", "auto"] + sorted(available_codecs()),
+        default="none",
+        help="Compress the input before encoding; 'auto' picks the smallest (default: none)"
+    )
+    parser.add_argument(
+        "--cache-dir",
+        help="Reuse the MusicXML cached for identical input and options"
+    )
+    parser.add_argument(
+        "--index",
+        action="store_true",
+        help="Also write the measure index for random access (OUTPUT.index.json)"
+    )
+    parser.add_argument(
+        "--append",
+        action="store_true",
+        help="Append the input to the payload of an existing OUTPUT instead of overwriting it "
+             "(its scheme is kept; -n must match the score)"
+    )
+    metrics.add_arguments(parser)
 
     args = parser.parse_args()
 
-    # Create test_data directory if it doesn't exist (retained for backward compatibility)
-    output_dir = "test_data"
-    os.makedirs(output_dir, exist_ok=True)
-
-    # Read input data
+    # Map the input instead of reading it, so it never has to fit in memory
+    inputs = ExitStack()
     if args.input_file:
         try:
-            with open(args.input_file, "rb") as f:
-                data = f.read()
+            data = inputs.enter_context(map_input(args.input_file))
             print(f"Read {len(data)} bytes from {args.input_file}")
         except FileNotFoundError:
             print(f"Error: File '{args.input_file}' not found")
@@ -213,24 +694,66 @@ Examples:
         data = b"Hello"
         print("No input file provided, using sample: 'Hello'")
 
-    # Convert to MusicXML
-    xml = bytes_to_musicxml(
-        data,
-        part_name=args.part_name,
-        notes_per_measure=args.notes_per_measure,
-        validate=not args.no_validate
-    )
-    xml = add_measure_numbers(xml)
-
-
     # Determine output path
     if args.output:
         output_path = args.output
     else:
         output_path = "music.xml"
-
-    # Write output
-    with open(output_path, "w", encoding="utf-8") as f:
-        f.write(xml)
+    mxl = output_path.lower().endswith(MXL_SUFFIX)
+    if args.index and mxl:
+        parser.error("--index needs an uncompressed MusicXML output, not .mxl")
+    if args.append and (mxl or args.cache_dir or args.compress != "none"):
+        parser.error("--append needs an uncompressed MusicXML output, without --compress or --cache-dir")
+    append = args.append and os.path.exists(output_path)
+    # Only the directory of the requested output is created (e.g. -o test_data/music.xml)
+    if os.path.dirname(output_path):
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+
+    # Convert to MusicXML, numbering measures as they are written
+    def build(path):
+        with open_score_writer(path, mxl) as f:
+            write_musicxml(
+                data,
+                f,
+                part_name=args.part_name,
+                notes_per_measure=args.notes_per_measure,
+                measure_numbers=True,
+                jobs=args.jobs,
+                scheme=args.scheme,
+                compression=args.compress
+            )
+
+    with inputs, metrics.from_args(args):
+        if append:
+            from score_append import append_musicxml
+
+            try:
+                result = append_musicxml(output_path, data, args.notes_per_measure)
+            except ValueError as e:
+                print(f"Error: {e}")
+                exit(1)
+            print(f"Appended {len(data)} bytes: {result['measures']} measures, {result['size']} bytes")
+        elif args.cache_dir:
+            from artifact_cache import ArtifactCache, format_stats
+
+            cache = ArtifactCache(args.cache_dir)
+            key = cache.key("musicxml", data, part_name=args.part_name,
+                            notes_per_measure=args.notes_per_measure, quarter_duration=480,
+                            scheme=args.scheme, scheme_version=get_scheme(args.scheme).version,
+                            compression=args.compress, measure_numbers=True)
+            hit = cache.materialize(key, MXL_SUFFIX if mxl else ".musicxml", output_path, build)
+            print(f"Cache {'hit' if hit else 'miss'}: {format_stats(cache.stats())}")
+        else:
+            build(output_path)
+        if args.index:
+            from musical_xml_to_bytes import INDEX_SUFFIX, load_measure_index, write_measure_index
+
+            # An index kept up to date by the append is reused as it is
+            if append:
+                load_measure_index(output_path, events_per_measure=args.notes_per_measure)
+            else:
+                write_measure_index(output_path, events_per_measure=args.notes_per_measure)
 
     print(f"Wrote {output_path}")
+    if args.index:
+        print(f"Wrote {output_path}{INDEX_SUFFIX}")
@@ -0,0 +1,166 @@
+import argparse
+import io
+import wave
+from typing import BinaryIO
+
+import numpy as np
+
+from bytes_to_midi import midi_key
+from bytes_to_musical_xml import iter_blocks, map_input
+from codec_core import BytesLike, nibble_to_note
+from nibble_codec import split_nibbles
+
+
+# -----------------------------
+# Tones
+# -----------------------------
+SAMPLE_RATE = 44100
+# Notes per second; every note carries one nibble, so bytes/s of audio is half of it
+DEFAULT_RATE = 10
+# 16-bit mono PCM
+SAMPLE_WIDTH = 2
+FULL_SCALE = 32767
+
+# Peak level of the fundamental and of the sharp marker (full scale = 1)
+FUNDAMENTAL_LEVEL = 0.5
+MARKER_LEVEL = 0.25
+# Enharmonic nibbles sound alike (C♯4 and D♭4 are both key 61), so sharps
+# also sound their third harmonic, like the MIDI velocity marks them
+MARKER_HARMONIC = 3
+# Raised-cosine fade at both ends of every note, as a fraction of its length
+FADE = 0.05
+# Samples synthesized per write
+CHUNK_SAMPLES = 1 << 20
+
+
+def key_frequency(key: int, transpose: int = 0) -> float:
+    """Equal-tempered frequency of MIDI key `key` (A4 = 440 Hz), `transpose` octaves up."""
+    return 440.0 * 2.0 ** ((key - 69) / 12 + transpose)
+
+
+def samples_per_note(sample_rate: int = SAMPLE_RATE, rate: float = DEFAULT_RATE) -> int:
+    """Length of one note in samples; the modulator and demodulator must agree on it."""
+    if rate <= 0:
+        raise ValueError(f"rate must be > 0 notes per second (got {rate})")
+    samples = int(round(sample_rate / rate))
+    if samples < 32:
+        raise ValueError(f"{rate} notes per second leaves only {samples} samples per note at {sample_rate} Hz")
+    return samples
+
+
+def check_band(sample_rate: int = SAMPLE_RATE, transpose: int = 0) -> None:
+    """Raise ValueError if the highest marker harmonic does not fit below the Nyquist frequency."""
+    top = MARKER_HARMONIC * max(key_frequency(midi_key(*nibble_to_note(n)), transpose) for n in range(16))
+    if top >= sample_rate / 2:
+        raise ValueError(f"Transposing {transpose} octaves needs a sample rate above {2 * top:.0f} Hz")
+
+
+def note_table(sample_rate: int = SAMPLE_RATE, rate: float = DEFAULT_RATE,
+               transpose: int = 0) -> np.ndarray:
+    """
+    Precompute the 16-bit samples of the note of every nibble as a
+    (16, samples_per_note) array: a sine at the nibble's pitch, plus its
+    third harmonic for sharps, faded in and out to avoid clicks.
+    """
+    check_band(sample_rate, transpose)
+    size = samples_per_note(sample_rate, rate)
+    t = np.arange(size) / sample_rate
+    fade = max(1, int(size * FADE))
+    envelope = np.ones(size)
+    ramp = 0.5 - 0.5 * np.cos(np.pi * np.arange(fade) / fade)
+    envelope[:fade] = ramp
+    envelope[-fade:] = ramp[::-1]
+
+    table = np.empty((16, size))
+    for nibble in range(16):
+        step, alter, octave = nibble_to_note(nibble)
+        frequency = key_frequency(midi_key(step, alter, octave), transpose)
+        tone = FUNDAMENTAL_LEVEL * np.sin(2 * np.pi * frequency * t)
+        if alter > 0:
+            tone += MARKER_LEVEL * np.sin(2 * np.pi * MARKER_HARMONIC * frequency * t)
+        table[nibble] = tone * envelope
+    return np.rint(table * FULL_SCALE).astype("<i2")
+
+
+# -----------------------------
+# bytes → WAV (streaming)
+# -----------------------------
+def write_wav(data: BytesLike,
+              out: BinaryIO,
+              rate: float = DEFAULT_RATE,
+              sample_rate: int = SAMPLE_RATE,
+              transpose: int = 0) -> int:
+    """
+    Stream a mono 16-bit WAV file sounding the notes of the nibble encoding
+    of `data`, one note of fixed length per nibble (high nibble first), to
+    the binary stream `out`. The length is known up front, so `out` does
+    not need to be seekable.
+
+    Parameters:
+    - data: Bytes to encode
+    - out: Writable binary stream
+    - rate: Notes per second
+    - sample_rate: Samples per second of the WAV file
+    - transpose: Octaves to shift every note up; higher notes are further
+      apart in frequency, so they can be told apart at higher rates
+
+    Returns the number of bytes written.
+    """
+    table = note_table(sample_rate, rate, transpose)
+    size = table.shape[1]
+    frames = 2 * len(data) * size
+    # Whole bytes per chunk, about CHUNK_SAMPLES samples each
+    block_size = max(1, CHUNK_SAMPLES // (2 * size))
+
+    with wave.open(out, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(SAMPLE_WIDTH)
+        wav.setframerate(sample_rate)
+        wav.setnframes(frames)
+        for block in iter_blocks(data, block_size):
+            wav.writeframesraw(table[split_nibbles(block)].tobytes())
+    return 44 + frames * SAMPLE_WIDTH
+
+
+def bytes_to_wav(data: bytes, rate: float = DEFAULT_RATE, sample_rate: int = SAMPLE_RATE,
+                 transpose: int = 0) -> bytes:
+    """Return the WAV file sounding `data` (see write_wav)."""
+    buf = io.BytesIO()
+    write_wav(data, buf, rate=rate, sample_rate=sample_rate, transpose=transpose)
+    return buf.getvalue()
+
+
+# -----------------------------
+# Example usage
+# -----------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Sound arbitrary bytes as a WAV file, one note per nibble",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  python bytes_to_wav.py input.json -o output.wav
+  python bytes_to_wav.py input.json -o output.wav --rate 100 --transpose 3
+  python wav_to_bytes.py output.wav -o decoded.json --rate 100 --transpose 3
+        """
+    )
+    parser.add_argument("input_file", help="Input file to convert")
+    parser.add_argument("-o", "--output", default="output.wav", help="Output WAV file (default: output.wav)")
+    parser.add_argument("-r", "--rate", type=float, default=DEFAULT_RATE,
+                        help=f"Notes per second (default: {DEFAULT_RATE})")
+    parser.add_argument("--sample-rate", type=int, default=SAMPLE_RATE,
+                        help=f"Samples per second (default: {SAMPLE_RATE})")
+    parser.add_argument("-t", "--transpose", type=int, default=0,
+                        help="Octaves to shift the notes up, for higher rates (default: 0)")
+
+    args = parser.parse_args()
+
+    try:
+        with map_input(args.input_file) as data, open(args.output, "wb") as f:
+            size = write_wav(data, f, rate=args.rate, sample_rate=args.sample_rate,
+                             transpose=args.transpose)
+    except Exception as e:
+        print(f"Error: {e}")
+        exit(1)
+    seconds = (size - 44) / SAMPLE_WIDTH / args.sample_rate
+    print(f"Wrote {size} bytes ({seconds:.1f} s of audio) to {args.output}")
@@ -0,0 +1,88 @@
+from typing import Tuple, Union
+
+# The scalar codec: no third-party imports, so it loads instantly (CLI
+# --help, argument errors, one-off conversions). The vectorized codec is in
+# nibble_codec; partitura and pikepdf are only imported by the paths that
+# need them.
+
+BytesLike = Union[bytes, bytearray, memoryview]
+
+# -----------------------------
+# Encoding tables
+# -----------------------------
+#     pitch (2 bits): 0=C, 1=D, 2=E, 3=F
+#     accidental:     0=flat, 1=sharp
+#     octave:         0=4,    1=5
+STEPS = ("C", "D", "E", "F")
+STEP_MAP = {step: code for code, step in enumerate(STEPS)}
+INVALID_STEP = 0xFF
+
+
+# -----------------------------
+# 4-bit nibble → musical note
+# -----------------------------
+def nibble_to_note(n: int) -> Tuple[str, int, int]:
+    """
+    Convert a 4-bit value (0–15) into (step, alter, octave)
+    using your encoding rules:
+
+        pitch (2 bits): 0=C, 1=D, 2=E, 3=F
+        accidental:     0=flat, 1=sharp
+        octave:         0=4,    1=5
+    """
+    if not 0 <= n <= 0xF:
+        raise ValueError("Nibble must be 0–15")
+
+    # bits 0–1
+    pitch_bits = n & 0b11
+    # bit 2
+    accidental_bit = (n >> 2) & 0b1
+    # bit 3
+    octave_bit = (n >> 3) & 0b1
+
+    # C, D, E, F
+    step = STEPS[pitch_bits]
+
+    # accidental: flat = -1, sharp = +1
+    alter = -1 if accidental_bit == 0 else +1
+
+    # octave 4 or 5
+    octave = 4 + octave_bit
+
+    return step, alter, octave
+
+
+# -----------------------------
+# musical note → 4-bit nibble
+# -----------------------------
+def note_to_nibble(step: str, alter: int, octave: int) -> int:
+    """
+    Convert (step, alter, octave) back into a 4-bit value (0–15)
+    using the inverse of the encoding rules:
+
+        pitch (2 bits): C=0, D=1, E=2, F=3
+        accidental:     flat=0, sharp=1
+        octave:         4=0, 5=1
+    """
+    # Map step to pitch bits
+    if step not in STEP_MAP:
+        raise ValueError(f"Unknown step: {step}")
+    pitch_bits = STEP_MAP[step]
+
+    # Map alter to accidental bit
+    if alter < 0:
+        accidental_bit = 0  # flat
+    else:
+        accidental_bit = 1  # sharp (or natural treated as sharp)
+
+    # Map octave to octave bit
+    if octave == 4:
+        octave_bit = 0
+    elif octave == 5:
+        octave_bit = 1
+    else:
+        raise ValueError(f"Octave must be 4 or 5 (got {octave})")
+
+    # Reconstruct nibble: bits 3,2,1,0 = octave, accidental, pitch_bit1, pitch_bit0
+    nibble = (octave_bit << 3) | (accidental_bit << 2) | pitch_bits
+    return nibble & 0xF
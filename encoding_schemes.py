@@ -0,0 +1,188 @@
+from typing import TYPE_CHECKING, Dict, List, Sequence, Tuple
+
+from codec_core import INVALID_STEP, nibble_to_note
+
+# The vectorized decoders import NumPy (through nibble_codec) when first
+# used, so the CLIs start without it
+if TYPE_CHECKING:
+    import numpy as np
+
+# (step, alter, octave, note type) of one written note
+NoteSpec = Tuple[str, int, int, str]
+
+# Header fields written to <identification>/<miscellaneous>
+HEADER_SCHEME = "msenc-scheme"
+HEADER_SCHEME_VERSION = "msenc-scheme-version"
+
+DEFAULT_SCHEME = "nibble"
+
+# Note type → length in quarter notes
+NOTE_TYPES = {"16th": 0.25, "eighth": 0.5, "quarter": 1, "half": 2}
+
+
+def _spelled(nibble: int, octave_offset: int = 0) -> Tuple[str, int, int]:
+    step, alter, octave = nibble_to_note(nibble)
+    return step, alter, octave + octave_offset
+
+
+# -----------------------------
+# Schemes
+# -----------------------------
+class Scheme:
+    """
+    Maps symbols of `bits` bits to events of `notes_per_event` notes
+    (a single note or a chord) and back.
+    """
+    name = ""
+    version = 1
+    bits = 4
+    notes_per_event = 1
+    uses_types = False
+
+    def check(self, quarter_duration: int) -> None:
+        """Raise ValueError if the scheme cannot be written with this quarter_duration."""
+
+    def event_notes(self, symbol: int) -> List[NoteSpec]:
+        raise NotImplementedError
+
+    def decode(self, steps: Sequence[str], alters: "np.ndarray", octaves: "np.ndarray",
+               types: Sequence[str], chords: "np.ndarray") -> "np.ndarray":
+        """
+        Vectorized inverse of event_notes for a run of whole events. `chords`
+        flags notes written with <chord/>. Raises ValueError on notes the
+        scheme cannot produce.
+        """
+        raise NotImplementedError
+
+
+class NibbleScheme(Scheme):
+    """The original encoding: 4 bits per quarter note, C–F, flat/sharp, octaves 4–5."""
+    name = "nibble"
+
+    def event_notes(self, symbol: int) -> List[NoteSpec]:
+        return [_spelled(symbol) + ("quarter",)]
+
+    def decode(self, steps, alters, octaves, types, chords) -> "np.ndarray":
+        from nibble_codec import notes_to_nibbles, step_codes
+
+        return notes_to_nibbles(step_codes(steps), alters, octaves)
+
+
+class ByteScheme(Scheme):
+    """
+    A whole byte per note:
+
+        bits 7–4: step, accidental and octave bit as in the nibble scheme
+        bits 3–2: octave pair (octaves 1–2, 3–4, 5–6, 7–8)
+        bits 1–0: duration (quarter, eighth, half, 16th)
+    """
+    name = "byte"
+    bits = 8
+    uses_types = True
+    DURATIONS = ("quarter", "eighth", "half", "16th")
+    DURATION_CODES = {t: code for code, t in enumerate(DURATIONS)}
+
+    def check(self, quarter_duration: int) -> None:
+        if quarter_duration % 4:
+            raise ValueError(f"The byte scheme needs quarter_duration divisible by 4 (got {quarter_duration})")
+
+    def event_notes(self, symbol: int) -> List[NoteSpec]:
+        pair = (symbol >> 2) & 0b11
+        step, alter, octave = _spelled(symbol >> 4, 2 * pair - 3)
+        return [(step, alter, octave, self.DURATIONS[symbol & 0b11])]
+
+    def decode(self, steps, alters, octaves, types, chords) -> "np.ndarray":
+        import numpy as np
+        from nibble_codec import step_codes
+
+        if chords.any():
+            raise ValueError("The byte scheme does not use chords")
+        codes = step_codes(steps)
+        durations = np.fromiter((self.DURATION_CODES.get(t, 0xFF) for t in types), dtype=np.uint8)
+        if (codes == INVALID_STEP).any():
+            raise ValueError("Unknown step in byte scheme note")
+        if (durations == 0xFF).any():
+            raise ValueError("Unknown note type in byte scheme note")
+        if ((octaves < 1) | (octaves > 8)).any():
+            raise ValueError("Byte scheme octaves must be between 1 and 8")
+        shifted = (octaves - 1).astype(np.uint8)
+        nibbles = ((shifted & 1) << 3) | ((alters >= 0).astype(np.uint8) << 2) | codes
+        return (nibbles << 4) | ((shifted >> 1) << 2) | durations
+
+
+class ChordScheme(Scheme):
+    """
+    A whole byte per beat as a two-note chord: the high nibble in octaves 4–5
+    and the low nibble, spelled the same way, in octaves 2–3.
+    """
+    name = "chord"
+    bits = 8
+    notes_per_event = 2
+
+    def event_notes(self, symbol: int) -> List[NoteSpec]:
+        return [_spelled(symbol >> 4) + ("quarter",),
+                _spelled(symbol & 0xF, -2) + ("quarter",)]
+
+    def decode(self, steps, alters, octaves, types, chords) -> "np.ndarray":
+        import numpy as np
+        from nibble_codec import notes_to_nibbles, step_codes
+
+        if chords.size % 2 or chords[0::2].any() or not chords[1::2].all():
+            raise ValueError("The chord scheme needs two-note chords on every beat")
+        codes = step_codes(steps)
+        octaves = np.asarray(octaves).reshape(-1, 2)
+        # Chord notes may come in either order; the upper one is the high nibble
+        upper = octaves >= 4
+        if not (upper.sum(axis=1) == 1).all():
+            raise ValueError("Every chord needs one note in octaves 4–5 and one in octaves 2–3")
+        order = np.argsort(~upper, axis=1, kind="stable")
+        pick = (np.arange(octaves.shape[0])[:, None], order)
+        octaves = octaves[pick] + np.array([0, 2])
+        nibbles = notes_to_nibbles(codes.reshape(-1, 2)[pick].ravel(),
+                                   np.asarray(alters).reshape(-1, 2)[pick].ravel(),
+                                   octaves.ravel()).reshape(-1, 2)
+        return (nibbles[:, 0] << 4) | nibbles[:, 1]
+
+
+SCHEMES: Dict[str, Scheme] = {s.name: s for s in (NibbleScheme(), ByteScheme(), ChordScheme())}
+
+
+def get_scheme(name: str, version: int = 1) -> Scheme:
+    """Look up a scheme by name, rejecting versions newer than this code knows."""
+    scheme = SCHEMES.get(name)
+    if scheme is None:
+        raise ValueError(f"Unknown encoding scheme: {name} (known: {', '.join(SCHEMES)})")
+    if version > scheme.version:
+        raise ValueError(f"Encoding scheme {name} version {version} is newer than supported ({scheme.version})")
+    return scheme
+
+
+def header_fields(scheme: Scheme) -> Dict[str, str]:
+    """Header fields recording the scheme; empty for the default scheme."""
+    if scheme.name == DEFAULT_SCHEME:
+        return {}
+    return {HEADER_SCHEME: scheme.name, HEADER_SCHEME_VERSION: str(scheme.version)}
+
+
+# -----------------------------
+# Time signatures
+# -----------------------------
+def event_sixteenths(scheme: Scheme) -> List[int]:
+    """Length of the event of every symbol of `scheme`, in 16th notes."""
+    return [int(NOTE_TYPES[scheme.event_notes(symbol)[0][3]] * 4) for symbol in range(1 << scheme.bits)]
+
+
+def time_signature(sixteenths: int) -> Tuple[int, int]:
+    """
+    (beats, beat type) of a measure `sixteenths` 16th notes long, counted in
+    quarters where possible: 16 → 4/4, 30 → 15/8, 33 → 33/16.
+
+    Schemes that take note lengths from the payload (uses_types) write each
+    measure with its own time signature, since its length varies with the
+    data; the others keep the 4/4 of the original encoding.
+    """
+    beats, beat_type = sixteenths, 16
+    while beats % 2 == 0 and beat_type > 4:
+        beats, beat_type = beats // 2, beat_type // 2
+    return beats, beat_type
+
@@ -1,73 +1,454 @@
-# from MuseParse.classes.Output.helpers import setupLilypondClean as setupLilypond
-# from MuseParse.classes.Input import MxmlParser
-# from MuseParse.classes.Output import LilypondOutput
-# import os
+import argparse
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List, Optional
 
-# # default_path_to_lily = '../../../../Downloads/lilypond-2.24.4/bin'
-# # setupLilypond(default_path_to_lily)
+import metrics
+from artifact_cache import DEFAULT_MAX_BYTES, ArtifactCache, format_stats, hash_file
+from bytes_to_lilypond import iter_lilypond_segments, write_lilypond
+from bytes_to_musical_xml import map_input, write_musicxml
+from encoding_schemes import DEFAULT_SCHEME, SCHEMES, get_scheme
+from mxl_container import MXL_SUFFIX, open_score_writer
+from payload_compression import available_codecs
+from pdf_attachments import attach_files
 
-# parser = MxmlParser.MxmlParser()
-# obj = parser.parse("./test_data/sample_music.musicxml")
 
-# renderer = LilypondOutput.LilypondRenderer(obj, "output")
-# renderer.run()
-# # import subprocess
+# -----------------------------
+# Tools
+# -----------------------------
+# Directory holding musicxml2ly and lilypond, e.g. ~/lilypond-2.24.4/bin.
+# Falls back to PATH when neither the option nor the variable is set.
+LILYPOND_DIR_ENV = "LILYPOND_DIR"
 
-# # PYTHON = "/usr/bin/python3"  # or the exact python3 that works for you
-# # LILYPOND_DIR = "/Users/szaszdominik/Downloads/lilypond-2.24.4/bin"
 
-# # musicxml_path = "test_data/sample_music.musicxml"
-# # ly_path = "/Users/szaszdominik/programming/py/musicXML/music-shít2/output.ly"
+def find_tool(name: str, tool_dir: Optional[str] = None) -> str:
+    """
+    Locate a LilyPond tool: in `tool_dir`, then in $LILYPOND_DIR, then on PATH.
+    """
+    for directory in (tool_dir, os.environ.get(LILYPOND_DIR_ENV)):
+        if directory:
+            for candidate in (name, name + ".exe", name + ".py"):
+                path = Path(directory) / candidate
+                if path.is_file():
+                    return str(path)
+    found = shutil.which(name)
+    if found is None:
+        raise FileNotFoundError(f"Cannot find '{name}'; pass --lilypond-dir or set {LILYPOND_DIR_ENV}")
+    return found
 
-# # subprocess.run(
-# #     [PYTHON, f"{LILYPOND_DIR}/musicxml2ly", "-o", ly_path, musicxml_path],
-# #     check=True,
-# # )
 
-# # subprocess.run(
-# #     [f"{LILYPOND_DIR}/lilypond", ly_path],
-# #     check=True,
-# # )
-from pathlib import Path
-import subprocess
+@contextmanager
+def timed(timings: Dict[str, float], stage: str):
+    """Add the wall time of the block to timings[stage]."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[stage] = timings.get(stage, 0.0) + time.perf_counter() - start
 
-LILYPOND_DIR = "/Users/szaszdominik/Downloads/lilypond-2.24.4/bin"
-musicxml_path = "test_data/sample_music.musicxml"
-ly_path = Path("output.ly")
 
-# 1) MusicXML -> .ly
-subprocess.run(
-    [f"{LILYPOND_DIR}/musicxml2ly", "-o", str(ly_path), musicxml_path],
-    check=True,
-)
+def _run(cmd: List[str], cwd: Optional[Path] = None) -> None:
+    result = subprocess.run(cmd, cwd=cwd, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"{Path(cmd[0]).name} failed ({result.returncode}):\n{result.stderr.strip()}")
 
-# 2) Read and patch score block
-text = ly_path.read_text(encoding="utf-8")
 
-from pathlib import Path
+# -----------------------------
+# Stages
+# -----------------------------
+# The commented-out hint musicxml2ly leaves inside the \score block
+MIDI_HINT = re.compile(r"^([ \t]*)% To create MIDI output, uncomment the following line:\n"
+                       r"[ \t]*%[ \t]*\\midi[^\n]*\n", re.M)
+
+
+def enable_midi(ly_text: str) -> str:
+    """Turn musicxml2ly's commented \\midi hint into an active \\midi block."""
+    if re.search(r"^[ \t]*\\midi", ly_text, re.M):
+        return ly_text
+    return MIDI_HINT.sub(lambda m: m.group(1) + "\\midi { }\n", ly_text, count=1)
+
+
+def musicxml_to_ly(xml_path: Path, ly_path: Path, musicxml2ly: str, midi: bool = True) -> None:
+    """Run musicxml2ly and patch in the \\midi block."""
+    with metrics.stage("musicxml2ly"):
+        _run([musicxml2ly, "-o", str(ly_path), str(xml_path)])
+    if midi:
+        ly_path.write_text(enable_midi(ly_path.read_text(encoding="utf-8")), encoding="utf-8")
+
+
+def render_ly(ly_path: Path, lilypond: str) -> Dict[str, Path]:
+    """
+    Run lilypond next to `ly_path` and return the produced files by kind
+    ("pdf", "midi").
+    """
+    base = ly_path.with_suffix("")
+    with metrics.stage("lilypond"):
+        _run([lilypond, "-o", str(base), str(ly_path)], cwd=ly_path.parent)
+    produced = {}
+    for kind, suffixes in (("pdf", (".pdf",)), ("midi", (".midi", ".mid"))):
+        for suffix in suffixes:
+            path = base.with_suffix(suffix)
+            if path.exists():
+                produced[kind] = path
+                break
+    if "pdf" not in produced:
+        raise RuntimeError(f"lilypond did not produce {base}.pdf")
+    return produced
+
+
+def default_render_jobs(jobs: int = 1) -> int:
+    """
+    lilypond processes per segmented score when `jobs` scores are rendered
+    at once: the CPUs are shared between them, so a batch does not start
+    jobs × CPUs processes.
+    """
+    return max(1, (os.cpu_count() or 1) // max(1, jobs))
+
+
+def render_segments(ly_paths: List[Path], lilypond: str, cache: Optional[ArtifactCache],
+                    midi: bool, jobs: int = 1) -> List[Dict[str, Path]]:
+    """
+    Render the .ly files of a segmented score, at most `jobs` lilypond
+    processes at a time, and return what each produced, in order.
+    """
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as pool:
+        return list(pool.map(lambda path: render_ly_cached(path, lilypond, cache, midi), ly_paths))
+
+
+def merge_segments(produced: List[Dict[str, Path]], base: Path, midi: bool) -> Dict[str, Path]:
+    """Merge the PDFs (and MIDI files) of the rendered segments into `base`.pdf (and .midi)."""
+    from score_merge import merge_midi, merge_pdfs
+
+    merged = {"pdf": base.with_suffix(".pdf")}
+    with metrics.stage("merge"):
+        merge_pdfs([str(p["pdf"]) for p in produced], str(merged["pdf"]))
+        if midi:
+            if not all("midi" in p for p in produced):
+                raise RuntimeError("lilypond did not produce a MIDI file for every segment")
+            merged["midi"] = base.with_suffix(".midi")
+            merge_midi([str(p["midi"]) for p in produced], str(merged["midi"]))
+    return merged
+
+
+def attach_file(pdf_path: Path, attachment: Path, out_pdf: Path, name: Optional[str] = None) -> None:
+    """Embed `attachment` into `pdf_path`, writing the result to `out_pdf`."""
+    attach_files(str(pdf_path), {name or attachment.name: attachment}, str(out_pdf))
+
+
+# -----------------------------
+# Pipeline
+# -----------------------------
+@lru_cache(maxsize=None)
+def tool_version(tool: str) -> str:
+    """First line of `tool --version`, part of the cache key of its output."""
+    result = subprocess.run([tool, "--version"], capture_output=True, text=True)
+    lines = (result.stdout or result.stderr).strip().splitlines()
+    return lines[0] if lines else ""
+
 
-ly_path = Path("output.ly").resolve()
-text = ly_path.read_text(encoding="utf-8")
-
-# Abort if an active \midi already exists (not commented)
-if "\\midi" in text and "%  \\midi" not in text:
-    print("MIDI block already present")
-else:
-    # Replace the commented midi hint block that musicxml2ly creates
-    text = text.replace(
-        "    % To create MIDI output, uncomment the following line:\n"
-        "    %  \\midi {\\tempo 4 = 100 }\n"
-        "    }\n",
-        "    \\midi { }\n"
-        "}\n"
+def run_pipeline(input_path: Path,
+                 output_pdf: Path,
+                 midi_path: Optional[Path] = None,
+                 xml_path: Optional[Path] = None,
+                 workdir: Optional[Path] = None,
+                 lilypond_dir: Optional[str] = None,
+                 part_name: str = "Encoded Bytes",
+                 notes_per_measure: int = 16,
+                 scheme: str = "nibble",
+                 compression: Optional[str] = None,
+                 use_musicxml2ly: bool = False,
+                 mxl: bool = False,
+                 cache: Optional[ArtifactCache] = None,
+                 segment_measures: int = 0,
+                 render_jobs: int = 1) -> Dict[str, float]:
+    """
+    bytes → MusicXML → .ly → PDF/MIDI → PDF with the MusicXML attached.
+
+    The .ly is written straight from the bytes by write_lilypond, unless
+    `use_musicxml2ly` asks for LilyPond's own converter to read the MusicXML.
+    With `mxl`, the score is written and attached as a compressed .mxl container.
+    With `segment_measures`, the .ly is split into files of that many
+    measures, rendered by up to `render_jobs` lilypond processes at once,
+    and the PDFs (and MIDI files) are merged in order; the page numbers and
+    the attached score cover the whole score.
+    Intermediates go to `workdir` (kept) or to a temporary directory
+    (removed). With a `cache`, every stage first looks for its output there.
+    Returns the wall time of each stage in seconds.
+    """
+    if segment_measures and use_musicxml2ly:
+        raise ValueError("Segmented rendering needs the .ly written by bytes_to_lilypond, not musicxml2ly")
+    musicxml2ly = find_tool("musicxml2ly", lilypond_dir) if use_musicxml2ly else None
+    lilypond = find_tool("lilypond", lilypond_dir)
+    timings: Dict[str, float] = {}
+    midi = midi_path is not None
+    params = dict(part_name=part_name, notes_per_measure=notes_per_measure, quarter_duration=480,
+                  scheme=scheme, scheme_version=get_scheme(scheme).version,
+                  compression=compression or "none")
+
+    def stage(name: str, key_data: bytes, suffix: str, dest: Path, build, **extra) -> None:
+        if cache is None:
+            build(dest)
+        else:
+            cache.materialize(cache.key(name, key_data, **params, **extra), suffix, dest, build)
+
+    with tempfile.TemporaryDirectory(prefix="msenc-") as tmp, map_input(input_path) as data:
+        work = Path(workdir) if workdir else Path(tmp)
+        work.mkdir(parents=True, exist_ok=True)
+        stem = input_path.stem
+        score = work / f"{stem}{MXL_SUFFIX if mxl else '.musicxml'}"
+        ly_path = work / f"{stem}.ly"
+
+        def build_score(dest: Path) -> None:
+            with open_score_writer(dest, mxl) as f:
+                write_musicxml(data, f, part_name=part_name, notes_per_measure=notes_per_measure,
+                               measure_numbers=True, scheme=scheme, compression=compression)
+
+        def build_ly(dest: Path) -> None:
+            with open(dest, "w", encoding="utf-8") as f:
+                write_lilypond(data, f, part_name=part_name, notes_per_measure=notes_per_measure,
+                               scheme=scheme, compression=compression, midi=midi)
+
+        with timed(timings, "encode"):
+            stage("musicxml", data, score.suffix, score, build_score, measure_numbers=True)
+        if use_musicxml2ly:
+            with timed(timings, "musicxml2ly"):
+                stage("musicxml2ly", data, ".ly", ly_path,
+                      lambda dest: musicxml_to_ly(score, dest, musicxml2ly, midi=midi),
+                      midi=midi, tool=tool_version(musicxml2ly))
+        elif segment_measures:
+            # Segments are cheap to write; their renders are cached one by one
+            segments = []
+            with timed(timings, "ly"):
+                for number, text in enumerate(iter_lilypond_segments(
+                        data, segment_measures, part_name=part_name, notes_per_measure=notes_per_measure,
+                        scheme=scheme, compression=compression, midi=midi), 1):
+                    segments.append(work / f"{stem}-{number:04d}.ly")
+                    segments[-1].write_text(text, encoding="utf-8")
+        else:
+            with timed(timings, "ly"):
+                stage("ly", data, ".ly", ly_path, build_ly, midi=midi)
+        with timed(timings, "lilypond"):
+            if segment_measures:
+                produced = render_segments(segments, lilypond, cache, midi, render_jobs)
+            else:
+                produced = render_ly_cached(ly_path, lilypond, cache, midi)
+        if segment_measures:
+            with timed(timings, "merge"):
+                produced = merge_segments(produced, work / stem, midi)
+        with timed(timings, "attach"):
+            output_pdf.parent.mkdir(parents=True, exist_ok=True)
+            attach_file(produced["pdf"], score, output_pdf)
+
+        if midi_path is not None:
+            if "midi" not in produced:
+                raise RuntimeError("lilypond did not produce a MIDI file")
+            shutil.copyfile(produced["midi"], midi_path)
+        if xml_path is not None:
+            shutil.copyfile(score, xml_path)
+
+    return timings
+
+
+def render_ly_cached(ly_path: Path, lilypond: str, cache: Optional[ArtifactCache],
+                     midi: bool) -> Dict[str, Path]:
+    """render_ly, reusing the PDF (and MIDI) cached for identical .ly input and LilyPond version."""
+    if cache is None:
+        return render_ly(ly_path, lilypond)
+    key = cache.key("lilypond", b"", ly=hash_file(ly_path), tool=tool_version(lilypond))
+    kinds = ("pdf", "midi") if midi else ("pdf",)
+    base = ly_path.with_suffix("")
+    cached = {kind: cache.get(key, "." + kind) for kind in kinds}
+    if all(cached.values()):
+        produced = {}
+        for kind, path in cached.items():
+            produced[kind] = base.with_suffix("." + kind)
+            shutil.copyfile(path, produced[kind])
+        return produced
+    produced = render_ly(ly_path, lilypond)
+    for kind in kinds:
+        if kind in produced:
+            cache.put(key, "." + kind, produced[kind])
+    return produced
+
+
+def batch_outputs(inputs: List[Path], output_dir: Path) -> Dict[Path, Path]:
+    """
+    Output base path (without suffix) of every input: <name> under
+    `output_dir`, in the same subdirectory as the input is under the
+    inputs' common directory, so a/data.json and b/data.json do not
+    overwrite each other. Raises ValueError if two inputs still map to the
+    same output (e.g. data.json and data.bin).
+    """
+    if not inputs:
+        return {}
+    parents = [os.path.abspath(path.parent) for path in inputs]
+    root = os.path.commonpath(parents)
+    bases: Dict[Path, Path] = {}
+    owners: Dict[Path, Path] = {}
+    for path, parent in zip(inputs, parents):
+        base = output_dir / os.path.relpath(parent, root) / path.stem
+        if base in owners:
+            raise ValueError(f"{owners[base]} and {path} would both be written to {base}.pdf")
+        owners[base], bases[path] = path, base
+    return bases
+
+
+def run_batch(inputs: List[Path], output_dir: Path, jobs: int = 1, midi: bool = False,
+              **options) -> Dict[Path, object]:
+    """
+    Run the pipeline for many inputs, at most `jobs` at a time. The LilyPond
+    stages are external processes, so threads are enough to keep them busy.
+    Segmented scores get default_render_jobs(jobs) lilypond processes each
+    unless `render_jobs` is given. Outputs are named as batch_outputs says.
+
+    Returns the stage timings, or the exception, for each input.
+    """
+    bases = batch_outputs(inputs, output_dir)
+    options.setdefault("render_jobs", default_render_jobs(jobs))
+
+    def one(path: Path):
+        base = bases[path]
+        base.parent.mkdir(parents=True, exist_ok=True)
+        return run_pipeline(path, base.with_name(base.name + ".pdf"),
+                            midi_path=base.with_name(base.name + ".midi") if midi else None,
+                            **options)
+
+    output_dir.mkdir(parents=True, exist_ok=True)
+    results: Dict[Path, object] = {}
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as pool:
+        futures = {path: pool.submit(one, path) for path in bases}
+        for path, future in futures.items():
+            try:
+                results[path] = future.result()
+            except Exception as e:
+                results[path] = e
+    return results
+
+
+def format_timings(timings: Dict[str, float]) -> str:
+    total = sum(timings.values())
+    parts = [f"{stage} {seconds:.2f}s" for stage, seconds in timings.items()]
+    return f"{', '.join(parts)} (total {total:.2f}s)"
+
+
+# -----------------------------
+# Command line
+# -----------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        prog="encode-pipeline",
+        description="Encode files to MusicXML, engrave them with LilyPond and attach the score to the PDF",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  python main.py input.json -o more_shit.pdf --midi output.midi
+  python main.py input.json -o more_shit.pdf --lilypond-dir ~/lilypond-2.24.4/bin
+  python main.py payloads/*.json --output-dir scores/ --jobs 4
+  python main.py payloads/*.json --output-dir scores/ --cache-dir ~/.cache/msenc
+  python main.py input.json -o more_shit.pdf --profile --metrics-json metrics.json
+  python main.py input.json -o more_shit.pdf --mxl --xml music.mxl
+  python main.py big.bin -o big.pdf --segment-measures 200 --render-jobs 8
+        """
     )
-    ly_path.write_text(text, encoding="utf-8")
-    print("Patched output.ly, now contains \\midi { }")
+    parser.add_argument("inputs", nargs="+", help="Input file(s) to encode")
+    parser.add_argument("-o", "--output", help="Output PDF (single input only)")
+    parser.add_argument("--output-dir", help="Output directory for <name>.pdf (and .midi) per input; "
+                                             "subdirectories of the inputs are kept")
+    parser.add_argument("--midi", nargs="?", const=True,
+                        help="Also produce MIDI (path for a single input, default: OUTPUT with .midi; "
+                             "flag for --output-dir)")
+    parser.add_argument("--xml", help="Also keep the MusicXML at this path (single input only)")
+    parser.add_argument("--mxl", action="store_true",
+                        help="Write and attach the score as compressed MusicXML (.mxl)")
+    parser.add_argument("--workdir", help="Keep intermediates in this directory instead of a temp dir")
+    parser.add_argument("--lilypond-dir", help=f"Directory with musicxml2ly and lilypond (default: ${LILYPOND_DIR_ENV} or PATH)")
+    parser.add_argument("-p", "--part-name", default="Encoded Bytes", help="Name of the musical part")
+    parser.add_argument("-n", "--notes-per-measure", type=int, default=16, help="Number of notes per measure")
+    parser.add_argument("-s", "--scheme", choices=sorted(SCHEMES), default=DEFAULT_SCHEME,
+                        help="Encoding scheme (default: nibble)")
+    parser.add_argument("-c", "--compress", choices=["none", "auto"] + sorted(available_codecs()),
+                        default="none", help="Compression codec (default: none)")
+    parser.add_argument("-j", "--jobs", type=int, default=1, help="Inputs rendered concurrently (default: 1)")
+    parser.add_argument("--cache-dir", help="Reuse generated artifacts from this cache directory")
+    parser.add_argument("--cache-size", type=int, default=DEFAULT_MAX_BYTES >> 20,
+                        help=f"Cache size limit in MB (default: {DEFAULT_MAX_BYTES >> 20})")
+    parser.add_argument("--musicxml2ly", action="store_true",
+                        help="Convert the MusicXML with musicxml2ly instead of writing the .ly directly")
+    parser.add_argument("--segment-measures", type=int, default=0,
+                        help="Render the score in segments of this many measures in parallel "
+                             "and merge the PDFs (default: 0, one lilypond run)")
+    parser.add_argument("--render-jobs", type=int,
+                        help="lilypond processes per score with --segment-measures "
+                             "(default: CPU count, shared between the --jobs inputs of a batch)")
+    metrics.add_arguments(parser)
+
+    args = parser.parse_args()
+    if args.segment_measures < 0:
+        parser.error("--segment-measures must be >= 0")
+    if args.segment_measures and args.musicxml2ly:
+        parser.error("--segment-measures cannot be combined with --musicxml2ly")
+    if args.jobs < 1:
+        parser.error("--jobs must be >= 1")
+    if args.render_jobs is None:
+        args.render_jobs = default_render_jobs(args.jobs if args.output_dir else 1)
+    elif args.render_jobs < 1:
+        parser.error("--render-jobs must be >= 1")
+    options = dict(lilypond_dir=args.lilypond_dir, part_name=args.part_name,
+                   notes_per_measure=args.notes_per_measure, scheme=args.scheme,
+                   compression=args.compress, use_musicxml2ly=args.musicxml2ly, mxl=args.mxl,
+                   segment_measures=args.segment_measures, render_jobs=args.render_jobs)
+    if args.cache_dir:
+        options["cache"] = ArtifactCache(args.cache_dir, args.cache_size << 20)
+    paths = [Path(p) for p in args.inputs]
+    if not args.output_dir and (len(paths) != 1 or not args.output):
+        parser.error("a single input needs -o/--output; use --output-dir for several inputs")
 
-# 3) Run lilypond
-subprocess.run(
-    [f"{LILYPOND_DIR}/lilypond", str(ly_path)],
-    check=True,
-)
+    # A bare --midi puts the MIDI file next to the PDF
+    if isinstance(args.midi, str):
+        midi_path = Path(args.midi)
+    else:
+        midi_path = Path(args.output).with_suffix(".midi") if args.midi and args.output else None
 
+    with metrics.from_args(args):
+        if args.output_dir:
+            try:
+                batch_outputs(paths, Path(args.output_dir))
+            except ValueError as e:
+                parser.error(str(e))
+            results = run_batch(paths, Path(args.output_dir), jobs=args.jobs, midi=bool(args.midi),
+                                workdir=None, **options)
+            failures = 0
+            for path, result in results.items():
+                if isinstance(result, Exception):
+                    failures += 1
+                    print(f"[FAIL] {path}: {result}")
+                else:
+                    print(f"[OK] {path}: {format_timings(result)}")
+            print(f"{len(results) - failures} succeeded, {failures} failed")
+            if args.cache_dir:
+                print(f"Cache: {format_stats(options['cache'].stats())}")
+            exit(1 if failures else 0)
 
+        try:
+            timings = run_pipeline(paths[0], Path(args.output),
+                                   midi_path=midi_path,
+                                   xml_path=Path(args.xml) if args.xml else None,
+                                   workdir=Path(args.workdir) if args.workdir else None,
+                                   **options)
+        except Exception as e:
+            print(f"Error: {e}")
+            exit(1)
+        print(f"Wrote {args.output}")
+        if midi_path is not None:
+            print(f"Wrote {midi_path}")
+        print(f"Timings: {format_timings(timings)}")
+        if args.cache_dir:
+            print(f"Cache: {format_stats(options['cache'].stats())}")
@@ -0,0 +1,261 @@
+import json
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+
+# Called with (stage, seconds, items, nbytes) every time a span of a stage ends
+Callback = Callable[[str, float, int, int], None]
+
+# The Metrics instance stages are recorded into, or None when disabled.
+# Instrumented code checks it once per call (or per block), so disabled
+# metrics cost one global lookup there and nothing in the inner loops.
+_active = None
+
+
+class Metrics:
+    """
+    Wall time, call count, items and bytes per stage (nibble split, note
+    construction, XML serialization, measure numbering, parse, nibble join,
+    LilyPond, attach, ...).
+
+    Time is exclusive: while a nested stage runs in the same thread, the
+    time goes to the inner stage only, so the stage totals add up to the
+    instrumented wall time. Work done in worker processes (--jobs) is seen
+    as time spent waiting for the results.
+    """
+
+    def __init__(self, callback: Optional[Callback] = None):
+        self.stages: Dict[str, Dict[str, float]] = {}
+        self.callbacks: List[Callback] = [callback] if callback else []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _stack(self) -> list:
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def record(self, stage: str, seconds: float, items: int = 0, nbytes: int = 0) -> None:
+        with self._lock:
+            stats = self.stages.get(stage)
+            if stats is None:
+                stats = self.stages[stage] = {"calls": 0, "seconds": 0.0, "items": 0, "bytes": 0}
+            stats["calls"] += 1
+            stats["seconds"] += seconds
+            stats["items"] += items
+            stats["bytes"] += nbytes
+        for callback in self.callbacks:
+            callback(stage, seconds, items, nbytes)
+
+    def merge(self, snapshot: Dict[str, Dict[str, float]]) -> None:
+        """Add the totals of another snapshot(), e.g. one returned by a worker process."""
+        with self._lock:
+            for stage, other in snapshot.items():
+                stats = self.stages.setdefault(stage, {"calls": 0, "seconds": 0.0, "items": 0, "bytes": 0})
+                for field in stats:
+                    stats[field] += other.get(field, 0)
+
+    def span(self, stage: str, items: int = 0, nbytes: int = 0) -> "_Span":
+        return _Span(self, stage, items, nbytes)
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            return {stage: dict(stats) for stage, stats in self.stages.items()}
+
+    def to_json(self) -> str:
+        return json.dumps({"stages": self.snapshot()}, indent=2, sort_keys=True)
+
+    def write_json(self, path: str) -> None:
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(self.to_json())
+            f.write("\n")
+
+
+class _Span:
+    """One timed run of a stage; count() adds to the items and bytes it reports."""
+
+    __slots__ = ("metrics", "stage", "items", "nbytes", "_start", "_elapsed")
+
+    def __init__(self, metrics: Metrics, stage: str, items: int = 0, nbytes: int = 0):
+        self.metrics = metrics
+        self.stage = stage
+        self.items = items
+        self.nbytes = nbytes
+        self._elapsed = 0.0
+
+    def count(self, items: int = 0, nbytes: int = 0) -> None:
+        self.items += items
+        self.nbytes += nbytes
+
+    def __enter__(self) -> "_Span":
+        stack = self.metrics._stack()
+        now = time.perf_counter()
+        if stack:
+            # Pause the enclosing stage
+            parent = stack[-1]
+            parent._elapsed += now - parent._start
+        stack.append(self)
+        self._start = now
+        return self
+
+    def __exit__(self, *exc) -> None:
+        stack = self.metrics._stack()
+        now = time.perf_counter()
+        self._elapsed += now - self._start
+        stack.pop()
+        if stack:
+            stack[-1]._start = now
+        self.metrics.record(self.stage, self._elapsed, self.items, self.nbytes)
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def count(self, items: int = 0, nbytes: int = 0) -> None:
+        pass
+
+    def __enter__(self) -> "_NullSpan":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+# -----------------------------
+# Switching metrics on and off
+# -----------------------------
+def enable(callback: Optional[Callback] = None, metrics: Optional[Metrics] = None) -> Metrics:
+    """
+    Start recording stages into `metrics` (a new Metrics by default) and
+    return it. `callback` is called with (stage, seconds, items, nbytes)
+    at the end of every span, e.g. to feed an external metrics system.
+    """
+    global _active
+    metrics = metrics or Metrics()
+    if callback is not None:
+        metrics.callbacks.append(callback)
+    _active = metrics
+    return metrics
+
+
+def disable() -> Optional[Metrics]:
+    """Stop recording and return the Metrics that were active."""
+    global _active
+    metrics, _active = _active, None
+    return metrics
+
+
+def active() -> Optional[Metrics]:
+    return _active
+
+
+@contextmanager
+def collect(callback: Optional[Callback] = None) -> Iterator[Metrics]:
+    """Record the stages run inside the block: `with metrics.collect() as m: ...`."""
+    previous = _active
+    metrics = enable(callback)
+    try:
+        yield metrics
+    finally:
+        if previous is not None:
+            enable(metrics=previous)
+        else:
+            disable()
+
+
+# -----------------------------
+# Instrumentation helpers
+# -----------------------------
+def stage(name: str, items: int = 0, nbytes: int = 0):
+    """Context manager timing the block as `name`; a shared no-op when disabled."""
+    metrics = _active
+    if metrics is None:
+        return _NULL_SPAN
+    return _Span(metrics, name, items, nbytes)
+
+
+def timed_iter(name: str, iterable: Iterable, size: Optional[Callable] = None) -> Iterable:
+    """
+    Time how long `iterable` takes to produce each item as stage `name`,
+    counting one item (or size(item) bytes) per item. Returns `iterable`
+    itself when disabled.
+    """
+    metrics = _active
+    if metrics is None:
+        return iterable
+    return _timed_iter(metrics, name, iter(iterable), size)
+
+
+def _timed_iter(metrics: Metrics, name: str, it: Iterator, size: Optional[Callable]) -> Iterator:
+    while True:
+        with metrics.span(name) as span:
+            try:
+                item = next(it)
+            except StopIteration:
+                return
+            span.count(1, size(item) if size else 0)
+        yield item
+
+
+def timed_call(name: str, fn: Callable, size: Optional[Callable] = None) -> Callable:
+    """
+    Wrap `fn` so each call is timed as stage `name` (size(first argument)
+    counted as bytes). Returns `fn` itself when disabled.
+    """
+    metrics = _active
+    if metrics is None:
+        return fn
+
+    def timed(*args, **kwargs):
+        with metrics.span(name, 1, size(args[0]) if size else 0):
+            return fn(*args, **kwargs)
+    return timed
+
+
+# -----------------------------
+# Reports and command lines
+# -----------------------------
+def format_report(metrics: Metrics) -> str:
+    """Table of the stages, slowest first."""
+    stages = sorted(metrics.snapshot().items(), key=lambda kv: -kv[1]["seconds"])
+    total = sum(stats["seconds"] for _, stats in stages)
+    lines = [f"{'stage':<20} {'seconds':>9} {'share':>6} {'calls':>9} {'items':>11} {'MB':>9}"]
+    for name, stats in stages:
+        share = stats["seconds"] / total if total else 0.0
+        lines.append(f"{name:<20} {stats['seconds']:9.4f} {share:6.1%} {stats['calls']:9d} "
+                     f"{stats['items']:11d} {stats['bytes'] / 1e6:9.2f}")
+    lines.append(f"{'total':<20} {total:9.4f}")
+    return "\n".join(lines)
+
+
+def add_arguments(parser) -> None:
+    """Add --profile and --metrics-json to an argparse parser."""
+    parser.add_argument("--profile", action="store_true",
+                        help="Print the time spent in each stage when done")
+    parser.add_argument("--metrics-json", metavar="PATH",
+                        help="Write per-stage timings and counts as JSON")
+
+
+@contextmanager
+def from_args(args) -> Iterator[Optional[Metrics]]:
+    """
+    Collect metrics around a command if --profile or --metrics-json was
+    given, and print/write them at the end (also when the command fails).
+    """
+    if not (getattr(args, "profile", False) or getattr(args, "metrics_json", None)):
+        yield None
+        return
+    with collect() as metrics:
+        try:
+            yield metrics
+        finally:
+            if args.profile:
+                print("Profile:")
+                print(format_report(metrics))
+            if args.metrics_json:
+                metrics.write_json(args.metrics_json)
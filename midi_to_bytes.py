@@ -0,0 +1,293 @@
+import argparse
+import io
+import struct
+from typing import TYPE_CHECKING, BinaryIO, Dict, Iterator, List, Tuple
+
+from bytes_to_midi import FLAT_VELOCITY, SHARP_VELOCITY
+from encoding_schemes import DEFAULT_SCHEME, HEADER_SCHEME, HEADER_SCHEME_VERSION, NOTE_TYPES, get_scheme
+from musical_xml_to_bytes import PayloadSink, batch_nibbles, write_nibble_batches
+
+# NumPy is imported when a file is decoded, not on import
+if TYPE_CHECKING:
+    import numpy as np
+
+READ_SIZE = 1 << 16
+# Notes converted per batch
+BATCH_NOTES = 1 << 15
+
+ALTERS = {FLAT_VELOCITY: -1, SHARP_VELOCITY: 1}
+STEP_NAMES = {0: "C", 2: "D", 4: "E", 5: "F", 7: "G", 9: "A", 11: "B"}
+# Note length in quarter notes → note type
+TYPE_NAMES = {length: name for name, length in NOTE_TYPES.items()}
+
+
+# -----------------------------
+# Standard MIDI File reading
+# -----------------------------
+# Data bytes following each channel message status (by high nibble)
+DATA_BYTES = {0x8: 2, 0x9: 2, 0xA: 2, 0xB: 2, 0xC: 1, 0xD: 1, 0xE: 2}
+# Longest channel message: 4-byte delta, status, 2 data bytes
+MAX_MESSAGE = 7
+
+Note = Tuple[int, int, int, int]
+
+
+def _iter_track_notes(f: BinaryIO, length: int, header: Dict[str, str]) -> Iterator[List[Note]]:
+    """
+    Parse one MTrk chunk of `length` bytes, READ_SIZE bytes at a time, and
+    yield the notes completed by each block as (start, key, velocity,
+    duration) lists in order of start time. Text events of the form
+    "name=value" go into `header`.
+
+    The event loop is written out inline: it runs once per MIDI message.
+    """
+    left = length
+    buf = b""
+    i = 0
+    tick = 0
+    status = 0
+    # Notes in start order; a note is released once it and all before it ended
+    notes: List[List[int]] = []
+    sounding: Dict[int, List[List[int]]] = {}
+    done = 0
+
+    def fill(need: int):
+        nonlocal buf, i, left
+        while len(buf) - i < need and left:
+            chunk = f.read(min(max(READ_SIZE, need), left))
+            if not chunk:
+                raise ValueError("Truncated MIDI file")
+            left -= len(chunk)
+            buf = buf[i:] + chunk
+            i = 0
+        if len(buf) - i < need:
+            raise ValueError("Truncated MIDI track")
+
+    while i < len(buf) or left:
+        if len(buf) - i < MAX_MESSAGE and left:
+            fill(min(MAX_MESSAGE, len(buf) - i + left))
+            if done:
+                yield [tuple(n) for n in notes[:done]]
+                del notes[:done]
+                done = 0
+        b = buf[i]
+        i += 1
+        delta = b & 0x7F
+        while b & 0x80:
+            b = buf[i]
+            i += 1
+            delta = (delta << 7) | (b & 0x7F)
+        tick += delta
+
+        b = buf[i]
+        if b >= 0xF0:
+            i += 1
+            # Meta type byte and a length of up to 4 bytes
+            fill(min(5, len(buf) - i + left))
+            if b == 0xFF:
+                kind = buf[i]
+                i += 1
+            size = 0
+            while True:
+                c = buf[i]
+                i += 1
+                size = (size << 7) | (c & 0x7F)
+                if not c & 0x80:
+                    break
+            fill(size)
+            payload = buf[i:i + size]
+            i += size
+            if b == 0xFF:
+                if kind == 0x01 and b"=" in payload:
+                    name, value = payload.decode("utf-8", "replace").split("=", 1)
+                    header[name] = value
+                elif kind == 0x2F:
+                    break
+            continue
+        if b & 0x80:
+            status = b
+            i += 1
+        elif not status:
+            raise ValueError("MIDI data byte without a status")
+        kind = status >> 4
+        key = buf[i]
+        velocity = buf[i + 1] if DATA_BYTES[kind] == 2 else 0
+        i += DATA_BYTES[kind]
+
+        if kind == 0x9 and velocity:
+            note = [tick, key, velocity, -1]
+            notes.append(note)
+            sounding.setdefault(key, []).append(note)
+        elif kind == 0x8 or kind == 0x9:
+            started = sounding.get(key)
+            if started:
+                note = started.pop(0)
+                note[3] = tick - note[0]
+                while done < len(notes) and notes[done][3] >= 0:
+                    done += 1
+
+    for note in notes[done:]:
+        if note[3] < 0:
+            raise ValueError(f"Note {note[1]} at tick {note[0]} is never released")
+    if notes:
+        yield [tuple(n) for n in notes]
+    if left:
+        f.read(left)
+
+
+def iter_midi_notes(source, header: Dict[str, str]) -> Iterator[List[Note]]:
+    """
+    Yield the notes of a Standard MIDI File in batches of (start, key,
+    velocity, duration), in order of start time, from all tracks in turn.
+    Text events of the form "name=value" are collected into `header`, and
+    the file's ticks per quarter note into header["division"].
+    """
+    f = source if hasattr(source, "read") else open(source, "rb")
+    try:
+        if f.read(4) != b"MThd":
+            raise ValueError("Not a Standard MIDI File")
+        length, fmt, tracks, division = struct.unpack(">IHHH", f.read(10))
+        f.read(length - 6)
+        if division & 0x8000:
+            raise ValueError("SMPTE time division is not supported")
+        header["division"] = str(division)
+
+        for _ in range(tracks):
+            chunk_type = f.read(4)
+            if len(chunk_type) < 4:
+                break
+            length = struct.unpack(">I", f.read(4))[0]
+            if chunk_type != b"MTrk":
+                f.read(length)
+                continue
+            yield from _iter_track_notes(f, length, header)
+    finally:
+        if f is not source:
+            f.close()
+
+
+# -----------------------------
+# MIDI → bytes (streaming)
+# -----------------------------
+def _spell(keys: "np.ndarray", velocities: "np.ndarray") -> Tuple[List[str], "np.ndarray", "np.ndarray"]:
+    """(steps, alters, octaves) of MIDI notes, reading the accidental from the velocity."""
+    import numpy as np
+
+    alters = np.array([ALTERS.get(v, 0) for v in velocities.tolist()], dtype=np.int64)
+    if (alters == 0).any():
+        bad = int(velocities[alters == 0][0])
+        raise ValueError(f"Note velocity {bad} does not record an accidental; "
+                         f"only files written by bytes_to_midi can be decoded")
+    natural = keys - alters
+    steps = [STEP_NAMES.get(pc, "?") for pc in (natural % 12).tolist()]
+    return steps, alters, natural // 12 - 1
+
+
+def iter_midi_nibble_batches(source, validate: bool = True,
+                             header: Dict[str, str] = None) -> Iterator["np.ndarray"]:
+    """
+    Yield the nibbles of a MIDI file written by bytes_to_midi, BATCH_NOTES
+    notes at a time, decoded with the scheme named in its text events.
+
+    Parameters:
+    - source: Path or binary file object of a Standard MIDI File
+    - validate: If True, prints warnings for notes that cannot be decoded
+    - header: Optional dict filled with the file's header fields; it is
+      complete by the time the first batch is yielded
+    """
+    import numpy as np
+
+    header = {} if header is None else header
+    scheme = None
+    pending: List[Note] = []
+    count = 0
+
+    def convert(notes):
+        starts, keys, velocities, durations = (np.array(c, dtype=np.int64) for c in zip(*notes))
+        steps, alters, octaves = _spell(keys, velocities)
+        division = int(header["division"])
+        types = [TYPE_NAMES.get(d / division, "") for d in durations.tolist()]
+        chords = np.zeros(len(notes), dtype=bool)
+        chords[1:] = starts[1:] == starts[:-1]
+        return batch_nibbles(steps, alters, octaves, types, chords, scheme, validate)
+
+    for notes in iter_midi_notes(source, header):
+        if scheme is None:
+            scheme = get_scheme(header.get(HEADER_SCHEME, DEFAULT_SCHEME),
+                                int(header.get(HEADER_SCHEME_VERSION, 1)))
+        pending.extend(notes)
+        count += len(notes)
+        if len(pending) >= BATCH_NOTES:
+            whole = len(pending) - len(pending) % scheme.notes_per_event
+            yield convert(pending[:whole])
+            pending = pending[whole:]
+
+    if not count:
+        raise ValueError("No notes found in the MIDI file")
+    if len(pending) % scheme.notes_per_event:
+        raise ValueError(f"Incomplete event at the end of a '{scheme.name}' MIDI file")
+    if pending:
+        yield convert(pending)
+
+
+def decode_midi(source, out: BinaryIO, validate: bool = True) -> int:
+    """
+    Decode a MIDI file written by bytes_to_midi, writing the recovered bytes
+    to `out` as they are produced (decompressing them if needed).
+
+    Returns the number of bytes written.
+    """
+    header: Dict[str, str] = {}
+    sink = PayloadSink(out, header)
+    write_nibble_batches(iter_midi_nibble_batches(source, validate=validate, header=header),
+                         sink, validate=validate)
+    return sink.close()
+
+
+def midi_to_bytes(midi_path: str, validate: bool = True) -> bytes:
+    """
+    Decode a MIDI file written by bytes_to_midi back to the original bytes.
+
+    Parameters:
+    - midi_path: Path to the .mid file
+    - validate: If True, prints warnings for notes that cannot be decoded
+    """
+    buf = io.BytesIO()
+    decode_midi(midi_path, buf, validate=validate)
+    return buf.getvalue()
+
+
+# -----------------------------
+# Example usage
+# -----------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Convert a MIDI file written by bytes_to_midi back to arbitrary bytes",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  python midi_to_bytes.py output.mid
+  python midi_to_bytes.py output.mid -o decoded.json
+        """
+    )
+    parser.add_argument("input_file", help="Input MIDI file to decode")
+    parser.add_argument("-o", "--output", help="Output binary file path (default: print hex to stdout)")
+    parser.add_argument("--no-validate", action="store_true",
+                        help="Disable warnings for unexpected note configurations")
+
+    args = parser.parse_args()
+
+    try:
+        if args.output:
+            with open(args.output, "wb") as f:
+                size = decode_midi(args.input_file, f, validate=not args.no_validate)
+            print(f"Decoded {size} bytes from {args.input_file}")
+            print(f"Wrote {args.output}")
+        else:
+            recovered_bytes = midi_to_bytes(args.input_file, validate=not args.no_validate)
+            print(f"Decoded {len(recovered_bytes)} bytes from {args.input_file}")
+            print(f"Decoded data (hex): {recovered_bytes.hex().upper()}")
+            print(f"Decoded data (ASCII): {recovered_bytes.decode('utf-8', errors='replace')}")
+    except Exception as e:
+        print(f"Error: {e}")
+        exit(1)
@@ -1,65 +1,813 @@
 import argparse
-import partitura
-from typing import Tuple, List
+import io
+import json
+import mmap
+import os
+import re
+import sys
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor
+from typing import TYPE_CHECKING, BinaryIO, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import metrics
+from encoding_schemes import (DEFAULT_SCHEME, HEADER_SCHEME, HEADER_SCHEME_VERSION, SCHEMES,
+                              Scheme, get_scheme)
+from codec_core import INVALID_STEP, note_to_nibble
+from mxl_container import is_mxl, open_mxl
+from payload_compression import HEADER_COMPRESSION, HEADER_LENGTH, DecompressingWriter
+
+# NumPy (through nibble_codec) is imported by the functions that decode, so
+# --help and argument errors do not pay for it
+if TYPE_CHECKING:
+    import numpy as np
+
+
+# -----------------------------
+# MusicXML → nibbles (streaming)
+# -----------------------------
+class NonCanonicalScore(ValueError):
+    """Raised by the streaming decoder when a score is not in the layout written by the encoder."""
+
+
+# Anything that makes document order differ from the order partitura would
+# produce (chords, voices rewound with <backup>, tied notes merged, ...).
+NON_CANONICAL_TAGS = {"chord", "grace", "cue", "rest", "unpitched", "tie", "backup", "forward"}
+PITCH_FIELDS = {"step", "alter", "octave"}
+HEADER_FIELD = "miscellaneous-field"
+
+READ_SIZE = 1 << 16
+FLUSH_SIZE = 1 << 16
+
+
+def _local(tag: str) -> str:
+    # Strip a "{namespace}" prefix if the document declares one
+    return tag.rpartition("}")[2] if tag[0] == "{" else tag
+
+
+class _PitchCollector:
+    """
+    XMLParser target that collects note pitches in document order without
+    building an element tree. The encoding scheme comes from the score's
+    <miscellaneous-field> header, or is given up front for partial documents.
+    """
+
+    def __init__(self, scheme: Scheme = None):
+        self.parts = 0
+        self.notes = 0
+        self.header: Dict[str, str] = {}
+        self.scheme = scheme or SCHEMES[DEFAULT_SCHEME]
+        self.steps: List[str] = []
+        self.alters: List[int] = []
+        self.octaves: List[int] = []
+        self.types: List[str] = []
+        self.chords: List[bool] = []
+        self._reject = NON_CANONICAL_TAGS
+        self._note_id = None
+        self._in_note = False
+        self._chord = False
+        self._pitch = None
+        self._field = None
+        self._text: List[str] = []
+        if scheme is not None:
+            self._use_scheme(scheme)
+
+    def _use_scheme(self, scheme: Scheme) -> None:
+        self.scheme = scheme
+        self._reject = NON_CANONICAL_TAGS - ({"chord"} if scheme.notes_per_event > 1 else set())
+
+    def _non_canonical(self, message: str) -> Exception:
+        # Only the default scheme can be handed to partitura instead
+        if self.scheme.name == DEFAULT_SCHEME:
+            return NonCanonicalScore(message)
+        return ValueError(f"{message} in a '{self.scheme.name}' score")
+
+    def start(self, tag, attrib):
+        tag = _local(tag)
+        if tag in self._reject:
+            raise self._non_canonical(f"Unsupported <{tag}> element")
+        if self._pitch is not None and tag in PITCH_FIELDS:
+            self._field = tag
+            self._text = []
+        elif tag == "note":
+            self._note_id = attrib.get("id")
+            self._in_note = True
+            self._chord = False
+        elif tag == "pitch":
+            self._pitch = {}
+        elif tag == "chord":
+            self._chord = True
+        elif tag == "type" and self._in_note and self.scheme.uses_types:
+            self._field = tag
+            self._text = []
+        elif tag == HEADER_FIELD:
+            self._field = attrib.get("name", "")
+            self._text = []
+        elif tag == "part":
+            self.parts += 1
+            if self.parts > 1:
+                raise self._non_canonical("More than one part in MusicXML file")
+
+    def data(self, text):
+        if self._field is not None:
+            self._text.append(text)
+
+    def end(self, tag):
+        tag = _local(tag)
+        if self._field is not None:
+            value = "".join(self._text).strip()
+            if tag == HEADER_FIELD:
+                self.header[self._field] = value
+            elif tag == "type":
+                self.types.append(value)
+            else:
+                self._pitch[self._field] = value
+            self._field = None
+        elif tag == "note":
+            self._in_note = False
+            pitch, self._pitch = self._pitch, None
+            if pitch is None:
+                raise self._non_canonical(f"Note {self._note_id} has no <pitch>")
+            try:
+                self.steps.append(pitch["step"])
+                self.alters.append(int(pitch.get("alter") or 0))
+                self.octaves.append(int(pitch["octave"]))
+            except (KeyError, ValueError) as e:
+                raise self._non_canonical(f"Unreadable pitch in note {self._note_id}: {e}")
+            if self.scheme.uses_types and len(self.types) < len(self.steps):
+                self.types.append("")
+            self.chords.append(self._chord)
+            self.notes += 1
+        elif tag == "identification" and HEADER_SCHEME in self.header:
+            self._use_scheme(get_scheme(self.header[HEADER_SCHEME],
+                                        int(self.header.get(HEADER_SCHEME_VERSION, 1))))
+
+    def close(self):
+        return None
+
+    def take(self) -> Tuple[List[str], List[int], List[int], List[str], List[bool]]:
+        """Return and reset the pitches of the whole events collected so far."""
+        # A chord may continue in the next chunk of the document
+        keep = len(self.steps) % self.scheme.notes_per_event
+        cut = len(self.steps) - keep
+        batch = (self.steps[:cut], self.alters[:cut], self.octaves[:cut],
+                 self.types[:cut], self.chords[:cut])
+        self.steps, self.alters, self.octaves = self.steps[cut:], self.alters[cut:], self.octaves[cut:]
+        self.types, self.chords = self.types[cut:], self.chords[cut:]
+        return batch
+
+
+def batch_nibbles(steps: List[str], alters: List[int], octaves: List[int],
+                   types: List[str], chords: List[bool], scheme: Scheme,
+                   validate: bool) -> "np.ndarray":
+    """
+    Convert a batch of whole events to nibbles. The default scheme skips
+    undecodable notes with a warning; other schemes decode whole bytes and
+    reject notes they could not have written.
+    """
+    import numpy as np
+    from nibble_codec import notes_to_nibbles, split_nibbles, step_codes
+
+    if scheme.name != DEFAULT_SCHEME:
+        symbols = scheme.decode(steps, np.array(alters, dtype=np.int64),
+                                np.array(octaves, dtype=np.int64), types,
+                                np.array(chords, dtype=bool))
+        return split_nibbles(symbols.astype(np.uint8).tobytes())
+
+    codes = step_codes(steps)
+    alters = np.array(alters, dtype=np.int64)
+    octaves = np.array(octaves, dtype=np.int64)
+    valid = (codes != INVALID_STEP) & ((octaves == 4) | (octaves == 5))
+    if not valid.all():
+        for i in np.flatnonzero(~valid):
+            try:
+                note_to_nibble(steps[i], int(alters[i]), int(octaves[i]))
+            except ValueError as e:
+                if validate:
+                    print(f"[WARN] {e}")
+        codes, alters, octaves = codes[valid], alters[valid], octaves[valid]
+    return notes_to_nibbles(codes, alters, octaves)
+
+
+class _BufferReader:
+    """read()/seek()/tell() over a bytes-like document, without copying it up front."""
+
+    def __init__(self, data):
+        self.view = memoryview(data).cast("B")
+        self.pos = 0
+
+    def read(self, size: int = -1) -> bytes:
+        end = len(self.view) if size is None or size < 0 else min(len(self.view), self.pos + size)
+        chunk = bytes(self.view[self.pos:end])
+        self.pos = end
+        return chunk
+
+    def seek(self, pos: int, whence: int = os.SEEK_SET) -> int:
+        base = {os.SEEK_SET: 0, os.SEEK_CUR: self.pos, os.SEEK_END: len(self.view)}[whence]
+        self.pos = max(0, base + pos)
+        return self.pos
+
+    def tell(self) -> int:
+        return self.pos
+
+    def seekable(self) -> bool:
+        return True
+
+    def close(self) -> None:
+        self.view.release()
+
+
+def open_source(source) -> BinaryIO:
+    """
+    Binary file object for a MusicXML source: a path, a binary file object
+    (returned as is), or the document itself as bytes, bytearray or
+    memoryview. A compressed .mxl container is opened at its score member,
+    which is inflated as it is read. Callers close what they opened, i.e.
+    when the result is not `source`.
+    """
+    if hasattr(source, "read"):
+        return open_mxl(source) if is_mxl(source) else source
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        reader = _BufferReader(source)
+        return open_mxl(reader) if is_mxl(source) else reader
+    return open_mxl(source) if is_mxl(source) else open(source, "rb")
+
+
+def _is_path(source) -> bool:
+    return isinstance(source, (str, os.PathLike))
+
+
+def iter_nibble_batches_fast(source, validate: bool = True,
+                             header: Dict[str, str] = None) -> Iterator["np.ndarray"]:
+    """
+    Feed the document to an incremental XML parser READ_SIZE bytes at a time
+    and yield the nibbles of the notes completed by each chunk as one array,
+    in document order. No element tree is built, so memory stays flat whatever
+    the size of the score.
+
+    Parameters:
+    - source: Path, binary file object or bytes-like MusicXML document
+    - validate: If True, prints warnings for notes that cannot be decoded
+    - header: Optional dict filled with the score's header fields; it is
+      complete by the time the first batch is yielded
+
+    The encoding scheme recorded in the score header picks the codec; scores
+    without one use the default nibble scheme. Bytes of 8-bit schemes are
+    yielded as nibble pairs too.
+
+    Raises NonCanonicalScore if the score has more than one part or contains
+    chords, rests, ties, grace notes or <backup>/<forward> elements.
+    """
+    collector = _PitchCollector()
+    if header is not None:
+        collector.header = header
+    parser = ET.XMLParser(target=collector)
+    f = open_source(source)
+    try:
+        while True:
+            chunk = f.read(READ_SIZE)
+            if not chunk:
+                break
+            with metrics.stage("parse", nbytes=len(chunk)):
+                parser.feed(chunk)
+            if len(collector.steps) >= collector.scheme.notes_per_event:
+                with metrics.stage("note_decode", len(collector.steps)):
+                    nibbles = batch_nibbles(*collector.take(), collector.scheme, validate)
+                yield nibbles
+        parser.close()
+        if collector.steps:
+            raise ValueError(f"Incomplete event at the end of a '{collector.scheme.name}' score")
+    finally:
+        if f is not source:
+            f.close()
+
+    if not collector.parts:
+        raise ValueError("No parts found in MusicXML file")
+    if not collector.notes:
+        raise ValueError("No notes found in the MusicXML file")
+
+
+def iter_nibbles_fast(source, validate: bool = True) -> Iterator[int]:
+    """Same as iter_nibble_batches_fast, one nibble at a time."""
+    for nibbles in iter_nibble_batches_fast(source, validate=validate):
+        yield from nibbles.tolist()
+
+
+def write_nibble_batches(batches: Iterable["np.ndarray"], out: BinaryIO, validate: bool = True) -> int:
+    """
+    Pack a stream of nibble arrays into bytes and write them to `out` in
+    FLUSH_SIZE pieces. A nibble pair may straddle two batches.
+
+    Returns the number of bytes written.
+    """
+    import numpy as np
+    from nibble_codec import join_nibbles
+
+    pending: List[np.ndarray] = []
+    pending_size = 0
+    written = 0
+    count = 0
+    for nibbles in batches:
+        count += nibbles.size
+        pending.append(nibbles)
+        pending_size += nibbles.size
+        if pending_size >= 2 * FLUSH_SIZE:
+            batch = np.concatenate(pending)
+            # Keep an odd trailing nibble for the next batch
+            even = batch.size - batch.size % 2
+            with metrics.stage("nibble_join", even):
+                chunk = join_nibbles(batch[:even])
+            out.write(chunk)
+            written += len(chunk)
+            pending = [batch[even:]]
+            pending_size = batch.size - even
+
+    if validate and not count:
+        print("[WARN] No valid nibbles extracted from notes")
+    if count % 2 and validate:
+        # Odd number of nibbles; join_nibbles pads with zero
+        print(f"[WARN] Odd number of nibbles ({count}); last nibble will be padded with 0")
+    chunk = join_nibbles(np.concatenate(pending)) if pending else b""
+    out.write(chunk)
+    return written + len(chunk)
+
+
+class PayloadSink:
+    """
+    Binary sink in front of `out` that decompresses the payload when the
+    score header names a compression codec. The header only has to be
+    complete by the first write.
+    """
+
+    def __init__(self, out: BinaryIO, header: Dict[str, str]):
+        self.out = out
+        self.header = header
+        self.written = 0
+        self._decompressor = None
+        self._started = False
+
+    def write(self, chunk: bytes) -> None:
+        if not self._started:
+            self._started = True
+            codec = self.header.get(HEADER_COMPRESSION)
+            if codec:
+                length = self.header.get(HEADER_LENGTH)
+                self._decompressor = DecompressingWriter(self.out, codec,
+                                                         int(length) if length else None)
+        if self._decompressor is not None:
+            with metrics.stage("decompress", nbytes=len(chunk)):
+                self._decompressor.write(chunk)
+        else:
+            self.out.write(chunk)
+            self.written += len(chunk)
+
+    def close(self) -> int:
+        """Finish the payload and return the number of bytes written to `out`."""
+        if self._decompressor is not None:
+            return self._decompressor.close()
+        return self.written
+
+
+def decode_musicxml(source, out: BinaryIO, validate: bool = True) -> int:
+    """
+    Decode a canonical MusicXML document with iter_nibble_batches_fast,
+    writing the recovered bytes to `out` as they are produced (decompressing
+    them if the score was encoded with compression).
+
+    Returns the number of bytes written. Raises NonCanonicalScore (possibly
+    after some bytes were already written) if the score needs the partitura path.
+    """
+    header: Dict[str, str] = {}
+    sink = PayloadSink(out, header)
+    write_nibble_batches(iter_nibble_batches_fast(source, validate=validate, header=header),
+                         sink, validate=validate)
+    return sink.close()
+
+
+# -----------------------------
+# Parallel decoding by measure ranges
+# -----------------------------
+# Approximate number of XML bytes handed to one worker
+DECODE_SHARD_SIZE = 1 << 23
+MEASURE_START = re.compile(rb"<measure[\s/>]")
+PART_START = re.compile(rb"<part[\s/>]")
+
+
+def read_header(source) -> Dict[str, str]:
+    """
+    Read the <miscellaneous-field> header of a score, parsing only the
+    document up to its first <part>. `source` is anything open_source takes.
+    """
+    collector = _PitchCollector()
+    parser = ET.XMLParser(target=collector)
+    f = open_source(source)
+    try:
+        tail = b""
+        while True:
+            chunk = f.read(READ_SIZE)
+            if not chunk:
+                break
+            m = PART_START.search(tail + chunk)
+            if m is not None:
+                parser.feed(chunk[:max(0, m.start() - len(tail))])
+                break
+            parser.feed(chunk)
+            tail = chunk[-8:]
+    finally:
+        if f is not source:
+            f.close()
+    return collector.header
+
+
+def _map_score(f) -> mmap.mmap:
+    if os.fstat(f.fileno()).st_size == 0:
+        raise ValueError("No parts found in MusicXML file")
+    return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def _part_body(mm) -> Tuple[int, int]:
+    """Byte offsets where the body of the score's only <part> starts and ends."""
+    part = PART_START.search(mm)
+    if part is None:
+        raise ValueError("No parts found in MusicXML file")
+    if PART_START.search(mm, part.end()) is not None:
+        raise NonCanonicalScore("More than one part in MusicXML file")
+    return part.end(), mm.rfind(b"</part>")
+
+
+def measure_ranges(xml_path: str, shard_size: int = DECODE_SHARD_SIZE) -> List[Tuple[int, int]]:
+    """
+    One cheap pass over the memory-mapped file: return (start, end) byte
+    offsets of consecutive runs of whole measures, about shard_size bytes each.
+    """
+    with open(xml_path, "rb") as f, _map_score(f) as mm:
+        body_start, part_end = _part_body(mm)
+
+        ranges = []
+        m = MEASURE_START.search(mm, body_start)
+        while m is not None and m.start() < part_end:
+            start = m.start()
+            m = MEASURE_START.search(mm, start + shard_size)
+            end = m.start() if m is not None and m.start() < part_end else part_end
+            ranges.append((start, end))
+        return ranges
+
+
+def _decode_slice(xml_path: str, start: int, end: int, scheme: Scheme,
+                  validate: bool) -> Tuple["np.ndarray", int]:
+    """Nibbles and note count of the whole measures between two byte offsets of a file."""
+    with open(xml_path, "rb") as f:
+        f.seek(start)
+        chunk = f.read(end - start)
+    collector = _PitchCollector(scheme)
+    parser = ET.XMLParser(target=collector)
+    with metrics.stage("parse", nbytes=len(chunk)):
+        parser.feed(b"<part>")
+        parser.feed(chunk)
+        parser.feed(b"</part>")
+        parser.close()
+    with metrics.stage("note_decode", collector.notes):
+        return batch_nibbles(*collector.take(), collector.scheme, validate), collector.notes
+
+
+def _decode_range(args) -> Tuple["np.ndarray", int]:
+    xml_path, start, end, scheme, validate = args
+    return _decode_slice(xml_path, start, end, SCHEMES[scheme], validate)
+
+
+def decode_musicxml_parallel(xml_path: str, out: BinaryIO, jobs: int,
+                             validate: bool = True,
+                             shard_size: int = DECODE_SHARD_SIZE) -> int:
+    """
+    Decode a canonical MusicXML file by handing measure ranges (see
+    measure_ranges) to a pool of `jobs` worker processes. Nibble arrays come
+    back in order and are joined like in decode_musicxml, so the output is the
+    same as the serial decoder's.
+
+    Returns the number of bytes written.
+    """
+    header = read_header(xml_path)
+    scheme = get_scheme(header.get(HEADER_SCHEME, DEFAULT_SCHEME),
+                        int(header.get(HEADER_SCHEME_VERSION, 1))).name
+    ranges = measure_ranges(xml_path, shard_size)
+    notes = 0
+
+    def batches():
+        nonlocal notes
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            pending = []
+            for start, end in ranges:
+                pending.append(pool.submit(_decode_range, (xml_path, start, end, scheme, validate)))
+                if len(pending) >= 2 * jobs:
+                    nibbles, count = pending.pop(0).result()
+                    notes += count
+                    yield nibbles
+            for future in pending:
+                nibbles, count = future.result()
+                notes += count
+                yield nibbles
+        if not notes:
+            raise ValueError("No notes found in the MusicXML file")
+
+    sink = PayloadSink(out, header)
+    # Time spent waiting for the workers
+    write_nibble_batches(metrics.timed_iter("parallel_decode", batches()), sink, validate=validate)
+    return sink.close()
 
 
 # -----------------------------
-# musical note → 4-bit nibble
+# Random access by byte ranges
 # -----------------------------
-def note_to_nibble(step: str, alter: int, octave: int) -> int:
+# Sidecar file of the measure index: big.musicxml → big.musicxml.index.json
+INDEX_SUFFIX = ".index.json"
+INDEX_VERSION = 2
+# Every INDEX_STRIDE-th measure offset is stored; the rest are found by scanning forward
+INDEX_STRIDE = 64
+
+
+def build_measure_index(xml_path: str, stride: int = INDEX_STRIDE,
+                        events_per_measure: Optional[int] = None) -> Dict:
+    """
+    One cheap pass over the memory-mapped score recording where its measures
+    start, without parsing them.
+
+    Every measure holds the same number of events, except possibly the last,
+    so byte offset B of the payload is in measure B * 8 // (bits * events per
+    measure). The index stores the scheme, the events per measure (counted
+    in the first measure), the number of measures, the file offset of every
+    `stride`-th measure and the end of the last one. The file's size and
+    modification time tell a stale index from a fresh one.
+
+    A score of a single measure does not say how many events a full measure
+    holds. Pass `events_per_measure` (the encoder's notes_per_measure) to
+    record it; otherwise the note count of that measure is recorded and
+    "measure_size_known" is False, so code extending the score cannot
+    mistake it for the measure size.
+    """
+    if stride <= 0:
+        raise ValueError(f"stride must be > 0 (got {stride})")
+    if is_mxl(xml_path):
+        raise ValueError("Byte ranges cannot be read from .mxl containers; decode the whole score")
+    header = read_header(xml_path)
+    scheme = get_scheme(header.get(HEADER_SCHEME, DEFAULT_SCHEME),
+                        int(header.get(HEADER_SCHEME_VERSION, 1)))
+    with metrics.stage("index"), open(xml_path, "rb") as f, _map_score(f) as mm:
+        body_start, part_end = _part_body(mm)
+        offsets = []
+        count = 0
+        m = MEASURE_START.search(mm, body_start)
+        while m is not None and m.start() < part_end:
+            if count % stride == 0:
+                offsets.append(m.start())
+            count += 1
+            m = MEASURE_START.search(mm, m.end())
+        if not count:
+            raise ValueError("No notes found in the MusicXML file")
+        first_end = MEASURE_START.search(mm, offsets[0] + 1, part_end) if count > 1 else None
+        stat = os.fstat(f.fileno())
+    _, notes = _decode_slice(xml_path, offsets[0], first_end.start() if first_end else part_end,
+                             scheme, validate=False)
+    if not notes:
+        raise ValueError("No notes found in the MusicXML file")
+    counted = notes // scheme.notes_per_event
+    if events_per_measure is not None:
+        if counted > events_per_measure or (count > 1 and counted != events_per_measure):
+            raise ValueError(f"The first measure holds {counted} events, "
+                             f"not {events_per_measure} per measure")
+        counted = events_per_measure
+    return {
+        "version": INDEX_VERSION,
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "header": header,
+        "scheme": scheme.name,
+        "events_per_measure": counted,
+        "measure_size_known": count > 1 or events_per_measure is not None,
+        "measures": count,
+        "stride": stride,
+        "offsets": offsets,
+        "end": part_end,
+    }
+
+
+def write_measure_index(xml_path: str, index_path: str = None, stride: int = INDEX_STRIDE,
+                        events_per_measure: Optional[int] = None) -> Dict:
+    """Build the measure index of a score and save it as JSON (next to the score by default)."""
+    index = build_measure_index(xml_path, stride, events_per_measure)
+    with open(index_path or xml_path + INDEX_SUFFIX, "w", encoding="utf-8") as f:
+        json.dump(index, f)
+    return index
+
+
+def read_measure_index(xml_path: str, index_path: str = None) -> Optional[Dict]:
+    """The sidecar index of a score if it exists and matches the score's size and mtime, else None."""
+    try:
+        with open(index_path or xml_path + INDEX_SUFFIX, encoding="utf-8") as f:
+            index = json.load(f)
+        stat = os.stat(xml_path)
+    except (OSError, ValueError):
+        return None
+    if (index.get("version") == INDEX_VERSION and index.get("size") == stat.st_size
+            and index.get("mtime_ns") == stat.st_mtime_ns):
+        return index
+    return None
+
+
+def load_measure_index(xml_path: str, index_path: str = None, save: bool = True,
+                       events_per_measure: Optional[int] = None) -> Dict:
+    """
+    The measure index of a score, read from its sidecar file if that matches
+    the score's current size and modification time, and rebuilt otherwise
+    (see build_measure_index for `events_per_measure`). A rebuilt index is
+    saved for next time when `save` is True and the directory is writable.
+    """
+    index_path = index_path or xml_path + INDEX_SUFFIX
+    index = read_measure_index(xml_path, index_path)
+    if index is not None:
+        return index
+    if not save:
+        return build_measure_index(xml_path, events_per_measure=events_per_measure)
+    try:
+        return write_measure_index(xml_path, index_path, events_per_measure=events_per_measure)
+    except PermissionError:
+        return build_measure_index(xml_path, events_per_measure=events_per_measure)
+
+
+def extend_measure_index(xml_path: str, index: Dict, start: int, first_measure: int,
+                         events_per_measure: int, index_path: str = None) -> Dict:
     """
-    Convert (step, alter, octave) back into a 4-bit value (0–15)
-    using the inverse of the encoding rules:
+    Bring the index of a score up to date after the measures from byte
+    offset `start` on were rewritten, `first_measure` (0-based) being the
+    first of them. Only the rewritten part of the file is scanned; the
+    updated index is saved next to the score and returned.
+    """
+    stride = index["stride"]
+    offsets = index["offsets"][:-(-first_measure // stride)]
+    count = first_measure
+    with metrics.stage("index"), open(xml_path, "rb") as f, _map_score(f) as mm:
+        part_end = mm.rfind(b"</part>")
+        m = MEASURE_START.search(mm, start)
+        while m is not None and m.start() < part_end:
+            if count % stride == 0:
+                offsets.append(m.start())
+            count += 1
+            m = MEASURE_START.search(mm, m.end())
+        stat = os.fstat(f.fileno())
+    index.update(size=stat.st_size, mtime_ns=stat.st_mtime_ns, events_per_measure=events_per_measure,
+                 measure_size_known=True,
+                 measures=count, offsets=offsets, end=part_end)
+    with open(index_path or xml_path + INDEX_SUFFIX, "w", encoding="utf-8") as f:
+        json.dump(index, f)
+    return index
+
+
+def _measure_offset(mm, index: Dict, number: int) -> int:
+    """File offset where measure `number` (0-based) starts, or the end of the last measure."""
+    if number >= index["measures"]:
+        return index["end"]
+    pos = index["offsets"][number // index["stride"]]
+    for _ in range(number % index["stride"]):
+        pos = MEASURE_START.search(mm, pos + 1).start()
+    return pos
+
+
+def decode_range(xml_path: str, start: int, length: int, validate: bool = True,
+                 index: Dict = None) -> bytes:
+    """
+    Decode only the bytes start .. start + length of the payload of a
+    canonical score, parsing just the measures that hold them. The cost
+    grows with `length`, not with the size of the score. Ranges reaching
+    past the end of the payload are cut short.
+
+    Parameters:
+    - xml_path: Path to the MusicXML file
+    - start: Offset of the first byte to decode
+    - length: Number of bytes to decode
+    - validate: If True, prints warnings for notes that cannot be decoded
+    - index: Measure index of the score (default: load_measure_index(xml_path))
+
+    Compressed payloads cannot be cut into ranges; decode those whole.
+    """
+    from nibble_codec import join_nibbles
 
-        pitch (2 bits): C=0, D=1, E=2, F=3
-        accidental:     flat=0, sharp=1
-        octave:         4=0, 5=1
+    if start < 0 or length < 0:
+        raise ValueError(f"Byte range must not be negative (got {start}:{length})")
+    if index is None:
+        index = load_measure_index(xml_path)
+    if index["header"].get(HEADER_COMPRESSION):
+        raise ValueError("Byte ranges cannot be read from compressed scores; decode the whole score")
+    scheme = SCHEMES[index["scheme"]]
+    per_measure = index["events_per_measure"] * scheme.bits // 4
+    first, last = 2 * start, 2 * (start + length)
+    first_measure = first // per_measure
+    if not length or first_measure >= index["measures"]:
+        return b""
+
+    with open(xml_path, "rb") as f, _map_score(f) as mm:
+        begin = _measure_offset(mm, index, first_measure)
+        end = _measure_offset(mm, index, -(-last // per_measure))
+    nibbles, _ = _decode_slice(xml_path, begin, end, scheme, validate)
+    skip = first - first_measure * per_measure
+    with metrics.stage("nibble_join", last - first):
+        return join_nibbles(nibbles[skip:skip + last - first])
+
+
+def parse_range(text: str) -> Tuple[int, int]:
+    """Parse a "START:LEN" byte range, e.g. "1048576:100"."""
+    try:
+        start, length = (int(part) for part in text.split(":"))
+    except ValueError:
+        raise ValueError(f"Byte range must be START:LEN (got '{text}')")
+    if start < 0 or length < 0:
+        raise ValueError(f"Byte range must not be negative (got '{text}')")
+    return start, length
+
+
+def musicxml_to_file(source, out: BinaryIO, validate: bool = True, fast: bool = True,
+                     jobs: int = 1) -> int:
     """
-    # Map step to pitch bits
-    step_map = {"C": 0, "D": 1, "E": 2, "F": 3}
-    if step not in step_map:
-        raise ValueError(f"Unknown step: {step}")
-    pitch_bits = step_map[step]
+    Decode `source` into the seekable binary stream `out`, using the streaming
+    decoder when possible and the partitura path otherwise. With jobs > 1,
+    files larger than one shard are decoded by decode_musicxml_parallel.
 
-    # Map alter to accidental bit
-    if alter < 0:
-        accidental_bit = 0  # flat
-    else:
-        accidental_bit = 1  # sharp (or natural treated as sharp)
+    `source` is a path, a binary file object or the document as bytes-like
+    (bytes, bytearray, memoryview). A non-seekable file object is read into
+    memory first so the partitura fallback can start over.
 
-    # Map octave to octave bit
-    if octave == 4:
-        octave_bit = 0
-    elif octave == 5:
-        octave_bit = 1
-    else:
-        raise ValueError(f"Octave must be 4 or 5 (got {octave})")
+    Returns the number of bytes written.
+    """
+    if hasattr(source, "read") and not (hasattr(source, "seekable") and source.seekable()):
+        source = source.read()
+    origin = source.tell() if hasattr(source, "read") else 0
 
-    # Reconstruct nibble: bits 3,2,1,0 = octave, accidental, pitch_bit1, pitch_bit0
-    nibble = (octave_bit << 3) | (accidental_bit << 2) | pitch_bits
-    return nibble & 0xF
+    if fast:
+        start = out.tell()
+        try:
+            if (jobs > 1 and _is_path(source) and os.path.getsize(source) > DECODE_SHARD_SIZE
+                    and not is_mxl(source)):
+                return decode_musicxml_parallel(source, out, jobs, validate=validate)
+            return decode_musicxml(source, out, validate=validate)
+        except (NonCanonicalScore, ET.ParseError):
+            out.seek(start)
+            out.truncate()
+    try:
+        if hasattr(source, "read"):
+            source.seek(origin)
+        header = read_header(source)
+    except ET.ParseError:
+        header = {}
+    scheme = header.get(HEADER_SCHEME, DEFAULT_SCHEME)
+    if scheme != DEFAULT_SCHEME:
+        raise ValueError(f"Scores in the '{scheme}' scheme can only be read by the streaming decoder")
+    if HEADER_COMPRESSION in header:
+        raise ValueError("Compressed scores can only be read by the streaming decoder")
+    if hasattr(source, "read"):
+        source.seek(origin)
+    return _musicxml_to_file_partitura(source, out, validate)
 
 
 # -----------------------------
 # MusicXML → bytes
 # -----------------------------
-def musicxml_to_bytes(xml_path: str, validate: bool = True) -> bytes:
+def musicxml_to_bytes(source, validate: bool = True, fast: bool = True,
+                      jobs: int = 1) -> bytes:
     """
     Convert a MusicXML file back into the original bytes by extracting notes
     and decoding their pitch/accidental/octave information.
 
     Parameters:
-    - xml_path: Path to the MusicXML file
+    - source: Path to the MusicXML file, a binary file object, or the
+      document itself as bytes, bytearray or memoryview
     - validate: If True, prints warnings for unexpected note configurations
+    - fast: If True, use the streaming decoder and only fall back to partitura
+      for scores that are not in the canonical layout
+    - jobs: Worker processes for decoding large files by measure ranges
 
     Returns:
     - Reconstructed bytes
     """
+    buf = io.BytesIO()
+    musicxml_to_file(source, buf, validate=validate, fast=fast, jobs=jobs)
+    return buf.getvalue()
+
+
+def _musicxml_to_file_partitura(source, out: BinaryIO, validate: bool) -> int:
+    # Only the fallback path needs partitura; the streaming decoder does not
+    import numpy as np
+    import partitura
+
+    name = source if _is_path(source) else "<in-memory document>"
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        source = io.BytesIO(source)
+    # partitura opens .mxl paths itself, but not containers in memory
+    if not _is_path(source) and is_mxl(source):
+        source = open_mxl(source)
+
     # Load MusicXML file
     try:
-        score = partitura.load_musicxml(xml_path)
+        with metrics.stage("parse"):
+            score = partitura.load_musicxml(source)
     except Exception as e:
-        raise ValueError(f"Failed to load MusicXML file '{xml_path}': {e}")
+        raise ValueError(f"Failed to load MusicXML file '{name}': {e}")
 
     # Get the first part (assume single-part encoding)
     if not score.parts:
@@ -72,7 +820,8 @@ def musicxml_to_bytes(xml_path: str, validate: bool = True) -> bytes:
     if not notes:
         raise ValueError("No notes found in the MusicXML file")
 
-    nibbles: List[int] = []
+    nibbles = np.empty(len(notes), dtype=np.uint8)
+    count = 0
 
     for note in notes:
         try:
@@ -85,40 +834,27 @@ def musicxml_to_bytes(xml_path: str, validate: bool = True) -> bytes:
             continue
 
         try:
-            nibble = note_to_nibble(step, alter, octave)
-            nibbles.append(nibble)
+            nibbles[count] = note_to_nibble(step, alter, octave)
+            count += 1
         except ValueError as e:
             if validate:
                 print(f"[WARN] {e}")
             continue
 
-    if validate and not nibbles:
-        print("[WARN] No valid nibbles extracted from notes")
-
-    # Reconstruct bytes from pairs of nibbles
-    data = bytearray()
-    for i in range(0, len(nibbles), 2):
-        if i + 1 < len(nibbles):
-            # Combine two nibbles into one byte (hi, lo)
-            hi = nibbles[i]
-            lo = nibbles[i + 1]
-            byte_val = (hi << 4) | lo
-            data.append(byte_val)
-        else:
-            # Odd number of nibbles; pad with zero
-            if validate:
-                print(f"[WARN] Odd number of nibbles ({len(nibbles)}); last nibble will be padded with 0")
-            hi = nibbles[i]
-            byte_val = (hi << 4) | 0
-            data.append(byte_val)
-
-    return bytes(data)
+    # Same warnings as the streaming decoder; bytes are written FLUSH_SIZE at a time
+    step = 2 * FLUSH_SIZE
+    return write_nibble_batches((nibbles[i:min(i + step, count)] for i in range(0, count, step)),
+                                out, validate=validate)
 
 
 # -----------------------------
 # Example usage
 # -----------------------------
 if __name__ == "__main__":
+    if sys.argv[1:2] == ["batch"]:
+        from batch import batch_main
+        sys.exit(batch_main("decode", sys.argv[2:]))
+
     parser = argparse.ArgumentParser(
         description="Convert MusicXML notation back to arbitrary bytes",
         formatter_class=argparse.RawDescriptionHelpFormatter,
@@ -127,11 +863,15 @@ Examples:
   python musical_xml_to_bytes.py byte_music.musicxml
   python musical_xml_to_bytes.py byte_music.musicxml -o output.bin
   python musical_xml_to_bytes.py byte_music.musicxml --no-validate
+  python musical_xml_to_bytes.py big.musicxml -o big.bin --jobs 8
+  python musical_xml_to_bytes.py big.musicxml -o big.bin --profile
+  python musical_xml_to_bytes.py big.musicxml --range 1048576:100
+  python musical_xml_to_bytes.py batch scores/ -o decoded/ --jobs 8   (see batch --help)
         """
     )
     parser.add_argument(
         "input_file",
-        help="Input MusicXML file to decode"
+        help="Input MusicXML file to decode (.xml, .musicxml or compressed .mxl)"
     )
     parser.add_argument(
         "-o", "--output",
@@ -142,30 +882,72 @@ Examples:
         action="store_true",
         help="Disable warnings for unexpected note configurations"
     )
+    parser.add_argument(
+        "--no-fast",
+        action="store_true",
+        help="Always decode through partitura instead of the streaming decoder"
+    )
+    parser.add_argument(
+        "-j", "--jobs",
+        type=int,
+        default=1,
+        help="Worker processes for decoding large scores (default: 1)"
+    )
+    parser.add_argument(
+        "--range",
+        metavar="START:LEN",
+        help="Decode only LEN bytes from offset START, using the measure index "
+             "(built and saved next to the score on first use)"
+    )
+    metrics.add_arguments(parser)
 
     args = parser.parse_args()
 
-    # Decode MusicXML to bytes
-    try:
-        recovered_bytes = musicxml_to_bytes(args.input_file, validate=not args.no_validate)
-        print(f"Decoded {len(recovered_bytes)} bytes from {args.input_file}")
-    except Exception as e:
-        print(f"Error: {e}")
-        exit(1)
+    with metrics.from_args(args):
+        if args.range:
+            try:
+                start, length = parse_range(args.range)
+                recovered_bytes = decode_range(args.input_file, start, length,
+                                               validate=not args.no_validate)
+                if args.output:
+                    with open(args.output, "wb") as f:
+                        f.write(recovered_bytes)
+            except Exception as e:
+                print(f"Error: {e}")
+                exit(1)
+            print(f"Decoded {len(recovered_bytes)} bytes at offset {start} from {args.input_file}")
+            if args.output:
+                print(f"Wrote {args.output}")
+            else:
+                print(f"Decoded data (hex): {recovered_bytes.hex().upper()}")
+        # Stream straight into the output file when one is given
+        elif args.output:
+            try:
+                with open(args.output, "wb") as f:
+                    size = musicxml_to_file(args.input_file, f,
+                                            validate=not args.no_validate,
+                                            fast=not args.no_fast,
+                                            jobs=args.jobs)
+                print(f"Decoded {size} bytes from {args.input_file}")
+                print(f"Wrote {args.output}")
+            except Exception as e:
+                print(f"Error: {e}")
+                exit(1)
+        else:
+            # Decode MusicXML to bytes
+            try:
+                recovered_bytes = musicxml_to_bytes(args.input_file,
+                                                    validate=not args.no_validate,
+                                                    fast=not args.no_fast,
+                                                    jobs=args.jobs)
+                print(f"Decoded {len(recovered_bytes)} bytes from {args.input_file}")
+            except Exception as e:
+                print(f"Error: {e}")
+                exit(1)
 
-    # Output
-    if args.output:
-        try:
-            with open(args.output, "wb") as f:
-                f.write(recovered_bytes)
-            print(f"Wrote {args.output}")
-        except Exception as e:
-            print(f"Error writing output: {e}")
-            exit(1)
-    else:
-        # Print as hex and ASCII
-        print(f"Decoded data (hex): {recovered_bytes.hex().upper()}")
-        try:
-            print(f"Decoded data (ASCII): {recovered_bytes.decode('utf-8', errors='replace')}")
-        except Exception:
-            pass
+            # Print as hex and ASCII
+            print(f"Decoded data (hex): {recovered_bytes.hex().upper()}")
+            try:
+                print(f"Decoded data (ASCII): {recovered_bytes.decode('utf-8', errors='replace')}")
+            except Exception:
+                pass
@@ -0,0 +1,119 @@
+import io
+import os
+import xml.etree.ElementTree as ET
+import zipfile
+from contextlib import contextmanager
+from typing import BinaryIO, Iterator, TextIO
+
+# Compressed MusicXML: a zip holding the score, an uncompressed "mimetype"
+# entry first and META-INF/container.xml pointing at the score.
+MXL_SUFFIX = ".mxl"
+MXL_MIMETYPE = "application/vnd.recordare.musicxml"
+SCORE_MEMBER = "score.musicxml"
+CONTAINER_MEMBER = "META-INF/container.xml"
+CONTAINER_XML = (
+    '<?xml version="1.0" encoding="UTF-8"?>\n'
+    "<container>\n"
+    "  <rootfiles>\n"
+    '    <rootfile full-path="{path}" media-type="application/vnd.recordare.musicxml+xml"/>\n'
+    "  </rootfiles>\n"
+    "</container>\n"
+)
+ZIP_MAGIC = b"PK\x03\x04"
+# Fixed member timestamps, so identical scores give identical files
+ZIP_DATE = (1980, 1, 1, 0, 0, 0)
+
+
+def _entry(name: str, compress_type: int) -> zipfile.ZipInfo:
+    info = zipfile.ZipInfo(name, date_time=ZIP_DATE)
+    info.compress_type = compress_type
+    info.external_attr = 0o644 << 16
+    return info
+
+
+# -----------------------------
+# Writing
+# -----------------------------
+@contextmanager
+def open_mxl_writer(target, member: str = SCORE_MEMBER) -> Iterator[TextIO]:
+    """
+    Create a .mxl container at `target` (a path or a writable binary file)
+    and yield a text stream that deflates whatever is written to it into
+    the score member, so the uncompressed score never exists on disk or in
+    memory as a whole.
+    """
+    with zipfile.ZipFile(target, "w") as zf:
+        zf.writestr(_entry("mimetype", zipfile.ZIP_STORED), MXL_MIMETYPE)
+        zf.writestr(_entry(CONTAINER_MEMBER, zipfile.ZIP_DEFLATED), CONTAINER_XML.format(path=member))
+        with zf.open(_entry(member, zipfile.ZIP_DEFLATED), "w", force_zip64=True) as raw:
+            with io.TextIOWrapper(raw, encoding="utf-8", newline="\n") as text:
+                yield text
+
+
+def open_score_writer(path, mxl: bool = None):
+    """
+    Text stream for writing a score to `path`: a .mxl container when `mxl`
+    is True (default: when the path ends in .mxl), a plain UTF-8 file otherwise.
+    """
+    if mxl is None:
+        mxl = os.fspath(path).lower().endswith(MXL_SUFFIX)
+    if mxl:
+        return open_mxl_writer(path)
+    return open(path, "w", encoding="utf-8")
+
+
+# -----------------------------
+# Reading
+# -----------------------------
+def is_mxl(source) -> bool:
+    """
+    True if `source` (a path, a seekable binary file or a bytes-like
+    document) is a zip container rather than a plain MusicXML document.
+    """
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return bytes(memoryview(source)[:4]) == ZIP_MAGIC
+    if hasattr(source, "read"):
+        if not (hasattr(source, "seekable") and source.seekable()):
+            return False
+        pos = source.tell()
+        try:
+            return source.read(4) == ZIP_MAGIC
+        finally:
+            source.seek(pos)
+    with open(source, "rb") as f:
+        return f.read(4) == ZIP_MAGIC
+
+
+def rootfile(zf: zipfile.ZipFile) -> str:
+    """Name of the score member named by META-INF/container.xml (or the only MusicXML member)."""
+    try:
+        with zf.open(CONTAINER_MEMBER) as f:
+            for element in ET.parse(f).iter():
+                if element.tag.rpartition("}")[2] == "rootfile" and element.get("full-path"):
+                    return element.get("full-path")
+    except KeyError:
+        pass
+    scores = [name for name in zf.namelist()
+              if not name.startswith("META-INF/") and name.lower().endswith((".xml", ".musicxml"))]
+    if len(scores) != 1:
+        raise ValueError("The .mxl container does not say which member is the score")
+    return scores[0]
+
+
+def open_mxl(source) -> BinaryIO:
+    """
+    Binary stream of the score inside a .mxl container, decompressed as it
+    is read. `source` is a path or a seekable binary file; closing the
+    stream releases the container.
+    """
+    try:
+        zf = zipfile.ZipFile(source)
+    except zipfile.BadZipFile as e:
+        raise ValueError(f"Not a readable .mxl container: {e}")
+    try:
+        return zf.open(rootfile(zf))
+    except KeyError as e:
+        raise ValueError(f"Score missing from the .mxl container: {e}")
+    finally:
+        # The member keeps the underlying file open until it is closed itself
+        zf.close()
@@ -0,0 +1,88 @@
+import numpy as np
+from typing import Tuple
+
+from codec_core import INVALID_STEP, STEP_MAP, STEPS, BytesLike
+
+# -----------------------------
+# Encoding tables
+# -----------------------------
+_NIBBLES = np.arange(16, dtype=np.uint8)
+STEP_TABLE = (_NIBBLES & 0b11).astype(np.uint8)                        # index into STEPS
+ALTER_TABLE = np.where((_NIBBLES >> 2) & 0b1, 1, -1).astype(np.int8)   # -1=flat, +1=sharp
+OCTAVE_TABLE = (4 + ((_NIBBLES >> 3) & 0b1)).astype(np.uint8)          # 4 or 5
+
+
+# -----------------------------
+# bytes ↔ nibbles
+# -----------------------------
+def split_nibbles(data: BytesLike) -> np.ndarray:
+    """
+    Split bytes into a uint8 array of nibbles, high nibble first:
+    b"\\x48\\x65" → [4, 8, 6, 5].
+    """
+    raw = np.frombuffer(data, dtype=np.uint8)
+    nibbles = np.empty(raw.size * 2, dtype=np.uint8)
+    nibbles[0::2] = raw >> 4
+    nibbles[1::2] = raw & 0xF
+    return nibbles
+
+
+def join_nibbles(nibbles: np.ndarray) -> bytes:
+    """
+    Pack pairs of nibbles (hi, lo) back into bytes. An odd trailing nibble is
+    padded with 0, like the scalar decoder does.
+    """
+    nibbles = np.asarray(nibbles, dtype=np.uint8)
+    if nibbles.size % 2:
+        nibbles = np.append(nibbles, np.uint8(0))
+    return ((nibbles[0::2] << 4) | (nibbles[1::2] & 0xF)).astype(np.uint8).tobytes()
+
+
+# -----------------------------
+# nibbles ↔ (step, alter, octave) codes
+# -----------------------------
+def nibbles_to_notes(nibbles: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Vectorized nibble_to_note: returns (step codes, alters, octaves) arrays.
+    Step codes index into STEPS.
+    """
+    nibbles = np.asarray(nibbles, dtype=np.uint8)
+    if nibbles.size and nibbles.max() > 0xF:
+        raise ValueError("Nibble must be 0–15")
+    return STEP_TABLE[nibbles], ALTER_TABLE[nibbles], OCTAVE_TABLE[nibbles]
+
+
+def step_codes(steps) -> np.ndarray:
+    """Map step names ("C".."F") to codes; unknown steps become INVALID_STEP."""
+    return np.fromiter((STEP_MAP.get(s, INVALID_STEP) for s in steps), dtype=np.uint8)
+
+
+def notes_to_nibbles(steps: np.ndarray, alters: np.ndarray, octaves: np.ndarray) -> np.ndarray:
+    """
+    Vectorized note_to_nibble. `steps` are step codes (see step_codes); a
+    negative alter is flat, anything else sharp; octaves must be 4 or 5.
+    """
+    steps = np.asarray(steps, dtype=np.uint8)
+    alters = np.asarray(alters)
+    octaves = np.asarray(octaves)
+
+    bad = steps > 3
+    if bad.any():
+        raise ValueError(f"Unknown step code at index {int(np.argmax(bad))}")
+    bad = (octaves != 4) & (octaves != 5)
+    if bad.any():
+        raise ValueError(f"Octave must be 4 or 5 (got {int(octaves[np.argmax(bad)])})")
+
+    accidental_bits = (alters >= 0).astype(np.uint8)
+    octave_bits = (octaves - 4).astype(np.uint8)
+    return (octave_bits << 3) | (accidental_bits << 2) | steps
+
+
+def bytes_to_notes(data: BytesLike) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Encode bytes straight to (step codes, alters, octaves) arrays."""
+    return nibbles_to_notes(split_nibbles(data))
+
+
+def notes_to_bytes(steps: np.ndarray, alters: np.ndarray, octaves: np.ndarray) -> bytes:
+    """Decode (step codes, alters, octaves) arrays straight back to bytes."""
+    return join_nibbles(notes_to_nibbles(steps, alters, octaves))
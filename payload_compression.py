@@ -0,0 +1,110 @@
+import lzma
+import zlib
+from typing import Dict, Iterator, Optional
+
+try:
+    import zstandard
+except ImportError:  # optional dependency
+    zstandard = None
+
+# Header fields written to <identification>/<miscellaneous>
+HEADER_COMPRESSION = "msenc-compression"
+HEADER_LENGTH = "msenc-length"
+
+# Bytes compressed with every codec to pick one in "auto" mode
+AUTO_SAMPLE_SIZE = 1 << 20
+CHUNK_SIZE = 1 << 16
+
+
+def available_codecs() -> Dict[str, str]:
+    """Codec name → short description, for the codecs usable in this interpreter."""
+    codecs = {"zlib": "deflate, level 9", "lzma": "xz, preset 6"}
+    if zstandard is not None:
+        codecs["zstd"] = "zstandard, level 19"
+    return codecs
+
+
+def _compressor(codec: str):
+    if codec == "zlib":
+        return zlib.compressobj(9)
+    if codec == "lzma":
+        return lzma.LZMACompressor()
+    if codec == "zstd" and zstandard is not None:
+        return zstandard.ZstdCompressor(level=19).compressobj()
+    raise ValueError(f"Unknown or unavailable compression codec: {codec}")
+
+
+def _decompressor(codec: str):
+    if codec == "zlib":
+        return zlib.decompressobj()
+    if codec == "lzma":
+        return lzma.LZMADecompressor()
+    if codec == "zstd":
+        if zstandard is None:
+            raise ValueError("Score is zstd-compressed but the 'zstandard' package is not installed")
+        return zstandard.ZstdDecompressor().decompressobj()
+    raise ValueError(f"Unknown compression codec: {codec}")
+
+
+def iter_compressed(data, codec: str, chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    """
+    Compress bytes-like `data` (or an iterable of byte chunks) with `codec`,
+    yielding compressed chunks as the compressor produces them.
+    """
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        view = memoryview(data)
+        data = (view[i:i + chunk_size] for i in range(0, len(view), chunk_size))
+    comp = _compressor(codec)
+    for chunk in data:
+        out = comp.compress(chunk)
+        if out:
+            yield out
+    out = comp.flush()
+    if out:
+        yield out
+
+
+def choose_codec(data) -> Optional[str]:
+    """
+    Pick the codec giving the smallest output on the first AUTO_SAMPLE_SIZE
+    bytes of `data`, or None if none of them makes the sample smaller.
+    """
+    sample = bytes(memoryview(data)[:AUTO_SAMPLE_SIZE])
+    best, best_size = None, len(sample)
+    for codec in available_codecs():
+        size = sum(len(c) for c in iter_compressed(sample, codec))
+        if size < best_size:
+            best, best_size = codec, size
+    return best
+
+
+class DecompressingWriter:
+    """
+    Binary sink that decompresses what is written to it into `out` and checks
+    the final length against the one recorded by the encoder.
+    """
+
+    def __init__(self, out, codec: str, length: Optional[int] = None):
+        self.out = out
+        self.length = length
+        self.written = 0
+        self._decomp = _decompressor(codec)
+
+    def write(self, chunk: bytes) -> int:
+        data = self._decomp.decompress(chunk)
+        if data:
+            self.out.write(data)
+            self.written += len(data)
+        return len(chunk)
+
+    def close(self) -> int:
+        """Flush the decompressor and return the number of bytes written to `out`."""
+        flush = getattr(self._decomp, "flush", None)
+        data = flush() if flush is not None else b""
+        if data:
+            self.out.write(data)
+            self.written += len(data)
+        if self.length is not None and self.written != self.length:
+            raise ValueError(f"Decompressed {self.written} bytes, score header says {self.length}")
+        return self.written
+
@@ -0,0 +1,374 @@
+import argparse
+import mimetypes
+import os
+import shutil
+import zlib
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+import metrics
+
+# Attachment name → contents, or a path to read them from
+Attachments = Dict[str, Union[bytes, str, Path]]
+
+# Bytes at the end of the file searched for the startxref keyword
+TAIL_SIZE = 2048
+
+
+# -----------------------------
+# Incremental attach
+# -----------------------------
+def _startxref(f) -> int:
+    """Offset of the last cross-reference section, from the file trailer."""
+    f.seek(0, os.SEEK_END)
+    size = f.tell()
+    f.seek(max(0, size - TAIL_SIZE))
+    tail = f.read()
+    at = tail.rfind(b"startxref")
+    if at == -1:
+        raise ValueError("No startxref found at the end of the PDF")
+    return int(tail[at + len(b"startxref"):].split()[0])
+
+
+def _name_tree_items(node) -> List[Tuple[object, object]]:
+    """(key, value) pairs of a PDF name tree, in tree order."""
+    items = []
+    if "/Names" in node:
+        names = node.Names
+        items.extend((names[i], names[i + 1]) for i in range(0, len(names) - 1, 2))
+    for kid in node.get("/Kids", []):
+        items.extend(_name_tree_items(kid))
+    return items
+
+
+def _read_attachment_data(value) -> bytes:
+    return value if isinstance(value, (bytes, bytearray)) else Path(value).read_bytes()
+
+
+def attach_files(pdf_path: str,
+                 attachments: Attachments,
+                 out_path: Optional[str] = None,
+                 compress: bool = True) -> None:
+    """
+    Embed `attachments` in a PDF as an incremental update: the new objects,
+    an xref section and a trailer are appended, and the existing bytes of
+    the document are left as they are. Attachments with an existing name
+    are replaced.
+
+    Parameters:
+    - pdf_path: PDF to attach to; updated in place unless out_path is given
+    - attachments: Attachment name → contents (bytes) or path of a file
+    - out_path: Write the result here instead (the original is copied first)
+    - compress: If True, embedded streams are Flate-compressed
+    """
+    with metrics.stage("attach", len(attachments)):
+        _append_attachments(pdf_path, attachments, out_path, compress)
+
+
+def _append_attachments(pdf_path: str, attachments: Attachments, out_path: Optional[str],
+                        compress: bool) -> None:
+    from pikepdf import Array, Dictionary, Name, Pdf, String
+
+    with Pdf.open(pdf_path) as pdf:
+        if pdf.is_encrypted:
+            raise ValueError("Incremental attach does not support encrypted PDFs")
+        with open(pdf_path, "rb") as f:
+            prev = _startxref(f)
+
+        root = pdf.Root
+        names = root.get("/Names")
+        if names is None:
+            names = Dictionary()
+            root.Names = names
+        existing = {}
+        if "/EmbeddedFiles" in names:
+            existing = {str(key): value for key, value in _name_tree_items(names.EmbeddedFiles)}
+
+        # New indirect objects get object numbers from pikepdf; they are
+        # serialized below and never saved through pikepdf itself.
+        streams = []
+        for name, value in attachments.items():
+            data = _read_attachment_data(value)
+            params = Dictionary(Size=len(data))
+            stream_dict = Dictionary(Type=Name.EmbeddedFile, Params=params)
+            mime = mimetypes.guess_type(name)[0]
+            if mime:
+                stream_dict.Subtype = Name("/" + mime)
+            payload = data
+            # Zip containers such as .mxl scores are deflated already
+            if compress and not data.startswith(b"PK\x03\x04"):
+                payload = zlib.compress(data, 9)
+                stream_dict.Filter = Name.FlateDecode
+            stream_dict.Length = len(payload)
+            ref = pdf.make_indirect(Dictionary(stream_dict))
+            streams.append((ref, stream_dict, payload))
+            filespec = pdf.make_indirect(Dictionary(Type=Name.Filespec, F=String(name), UF=String(name),
+                                                    EF=Dictionary(F=ref, UF=ref)))
+            existing[name] = filespec
+
+        tree = pdf.make_indirect(Dictionary(Names=Array(
+            [item for key in sorted(existing) for item in (String(key), existing[key])])))
+        names.EmbeddedFiles = tree
+        # The object holding /Names changes: either the Names dict or the catalog
+        holder = names if names.is_indirect else root
+
+        objects = [(ref.objgen, stream_dict.unparse(resolved=True), payload)
+                   for ref, stream_dict, payload in streams]
+        for name in attachments:
+            objects.append((existing[name].objgen, existing[name].unparse(resolved=True), None))
+        objects.append((tree.objgen, tree.unparse(resolved=True), None))
+        objects.append((holder.objgen, holder.unparse(resolved=True), None))
+
+        trailer = Dictionary(Size=max(int(pdf.trailer.Size), max(n for (n, _), _, _ in objects) + 1),
+                             Root=root, Prev=prev)
+        for key in ("/Info", "/ID"):
+            if key in pdf.trailer:
+                trailer[key] = pdf.trailer[key]
+        trailer_bytes = trailer.unparse()
+
+    if out_path is not None and os.path.abspath(out_path) != os.path.abspath(pdf_path):
+        shutil.copyfile(pdf_path, out_path)
+        pdf_path = out_path
+
+    with open(pdf_path, "r+b") as f:
+        f.seek(-1, os.SEEK_END)
+        pieces = [] if f.read(1) in (b"\n", b"\r") else [b"\n"]
+        offset = f.tell() + sum(len(p) for p in pieces)
+        offsets = {}
+        for (number, generation), body, payload in objects:
+            offsets[number] = (offset, generation)
+            piece = b"%d %d obj\n" % (number, generation) + body
+            if payload is not None:
+                piece += b"\nstream\n" + payload + b"\nendstream"
+            piece += b"\nendobj\n"
+            pieces.append(piece)
+            offset += len(piece)
+
+        xref = [b"xref\n"]
+        numbers = sorted(offsets)
+        start = 0
+        while start < len(numbers):
+            end = start
+            while end + 1 < len(numbers) and numbers[end + 1] == numbers[end] + 1:
+                end += 1
+            xref.append(b"%d %d\n" % (numbers[start], end - start + 1))
+            for number in numbers[start:end + 1]:
+                xref.append(b"%010d %05d n \n" % offsets[number])
+            start = end + 1
+        pieces.extend(xref)
+        pieces.append(b"trailer\n" + trailer_bytes + b"\nstartxref\n%d\n%%%%EOF\n" % offset)
+        f.write(b"".join(pieces))
+
+
+def attach_files_rewrite(pdf_path: str, attachments: Attachments, out_path: str) -> None:
+    """Embed `attachments` by rewriting the whole document with pikepdf (compressed object streams)."""
+    from pikepdf import AttachedFileSpec, ObjectStreamMode, Pdf
+
+    with metrics.stage("attach", len(attachments)), \
+            Pdf.open(pdf_path, allow_overwriting_input=True) as pdf:
+        for name, value in attachments.items():
+            pdf.attachments[name] = AttachedFileSpec(pdf, _read_attachment_data(value), filename=name)
+        pdf.save(out_path, compress_streams=True, object_stream_mode=ObjectStreamMode.generate)
+
+
+# -----------------------------
+# Extraction
+# -----------------------------
+def list_attachments(pdf_path: str) -> List[str]:
+    """Names of the files attached to a PDF."""
+    from pikepdf import Pdf
+
+    with Pdf.open(pdf_path) as pdf:
+        return list(pdf.attachments)
+
+
+def read_attachment(pdf_path: str, name: Optional[str] = None) -> bytes:
+    """
+    Contents of one attachment, without writing anything. With no name the
+    PDF must have exactly one attachment.
+    """
+    from pikepdf import Pdf
+
+    with Pdf.open(pdf_path) as pdf:
+        return pick_attachment(pdf, name, pdf_path).get_file().read_bytes()
+
+
+def pick_attachment(pdf, name: Optional[str] = None, pdf_path: str = "PDF"):
+    """
+    The AttachedFileSpec called `name` in an open pikepdf.Pdf, or its only
+    attachment when no name is given.
+    """
+    attached = pdf.attachments
+    if name is None:
+        if len(attached) != 1:
+            raise ValueError(f"{pdf_path} has {len(attached)} attachments; pick one by name")
+        name = next(iter(attached))
+    if name not in attached:
+        raise ValueError(f"No attachment named '{name}' in {pdf_path}")
+    return attached[name]
+
+
+def extract_attachments(pdf_path: str, out_dir: str = ".", names: Optional[Iterable[str]] = None) -> List[Path]:
+    """
+    Write attachments of a PDF (all, or just `names`) to `out_dir` under
+    their own file names. The PDF itself is only read.
+
+    Returns the paths written.
+    """
+    from pikepdf import Pdf
+
+    written = []
+    with Pdf.open(pdf_path) as pdf:
+        attached = pdf.attachments
+        for name in (names if names is not None else list(attached)):
+            if name not in attached:
+                raise ValueError(f"No attachment named '{name}' in {pdf_path}")
+            target = Path(out_dir) / Path(name).name
+            target.parent.mkdir(parents=True, exist_ok=True)
+            target.write_bytes(attached[name].get_file().read_bytes())
+            written.append(target)
+    return written
+
+
+# -----------------------------
+# Batches
+# -----------------------------
+def attach_batch(jobs: Iterable[Tuple[str, Attachments, Optional[str]]],
+                 compress: bool = True) -> Dict[str, Optional[Exception]]:
+    """
+    Run attach_files for each (pdf_path, attachments, out_path) in this
+    process. Returns None or the exception raised, per PDF.
+    """
+    results = {}
+    for pdf_path, attachments, out_path in jobs:
+        try:
+            attach_files(pdf_path, attachments, out_path, compress=compress)
+            results[pdf_path] = None
+        except Exception as e:
+            results[pdf_path] = e
+    return results
+
+
+def extract_batch(pdf_paths: Iterable[str], out_dir: str,
+                  names: Optional[List[str]] = None) -> Dict[str, Union[List[Path], Exception]]:
+    """
+    Extract attachments from many PDFs in this process, each into
+    out_dir/<pdf stem>/. Returns the written paths or the exception, per PDF.
+    """
+    results = {}
+    for pdf_path in pdf_paths:
+        try:
+            results[pdf_path] = extract_attachments(pdf_path, str(Path(out_dir) / Path(pdf_path).stem), names)
+        except Exception as e:
+            results[pdf_path] = e
+    return results
+
+
+# -----------------------------
+# Command line
+# -----------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Attach files to PDFs and extract them again",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  python pdf_attachments.py attach output.pdf -f music.xml -o output2.pdf
+  python pdf_attachments.py attach scores/*.pdf --sibling .musicxml
+  python pdf_attachments.py list output2.pdf
+  python pdf_attachments.py extract output2.pdf -o output.xml
+  python pdf_attachments.py extract scores/*.pdf -d extracted/
+        """
+    )
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_attach = sub.add_parser("attach", help="Attach files to one or more PDFs (incremental update)")
+    p_attach.add_argument("pdfs", nargs="+", help="PDF file(s) to attach to")
+    p_attach.add_argument("-f", "--file", action="append", default=[],
+                          help="File to attach to every PDF (repeatable)")
+    p_attach.add_argument("--sibling", metavar="EXT",
+                          help="Attach <pdf stem><EXT> from next to each PDF, e.g. .musicxml")
+    p_attach.add_argument("-o", "--output", help="Output PDF (single PDF only; default: update in place)")
+    p_attach.add_argument("--no-compress", action="store_true", help="Store attachments uncompressed")
+    p_attach.add_argument("--rewrite", action="store_true",
+                          help="Rewrite the whole PDF with pikepdf instead of appending an update")
+
+    p_list = sub.add_parser("list", help="List the attachments of PDFs")
+    p_list.add_argument("pdfs", nargs="+", help="PDF file(s)")
+
+    p_extract = sub.add_parser("extract", help="Extract attachments without writing a PDF")
+    p_extract.add_argument("pdfs", nargs="+", help="PDF file(s) to read")
+    p_extract.add_argument("-n", "--name", action="append", help="Attachment name (repeatable; default: all)")
+    p_extract.add_argument("-o", "--output", help="Output file for the single attachment of a single PDF")
+    p_extract.add_argument("-d", "--dir", default=".", help="Output directory (default: current directory)")
+
+    args = parser.parse_args()
+
+    if args.command == "attach":
+        if args.output and len(args.pdfs) != 1:
+            parser.error("-o/--output needs a single PDF")
+        if not args.file and not args.sibling:
+            parser.error("nothing to attach; use -f/--file or --sibling")
+        jobs = []
+        for pdf_path in args.pdfs:
+            attachments = {Path(p).name: p for p in args.file}
+            if args.sibling:
+                sibling = Path(pdf_path).with_suffix(args.sibling)
+                attachments[sibling.name] = sibling
+            jobs.append((pdf_path, attachments, args.output))
+        if args.rewrite:
+            results = {}
+            for pdf_path, attachments, out_path in jobs:
+                try:
+                    attach_files_rewrite(pdf_path, attachments, out_path or pdf_path)
+                    results[pdf_path] = None
+                except Exception as e:
+                    results[pdf_path] = e
+        else:
+            results = attach_batch(jobs, compress=not args.no_compress)
+        failures = 0
+        for pdf_path, error in results.items():
+            if error is not None:
+                failures += 1
+                print(f"Error: {pdf_path}: {error}")
+            else:
+                print(f"Attached to {args.output or pdf_path}")
+        exit(1 if failures else 0)
+
+    if args.command == "list":
+        for pdf_path in args.pdfs:
+            try:
+                for name in list_attachments(pdf_path):
+                    print(f"{pdf_path}: {name}")
+            except Exception as e:
+                print(f"Error: {pdf_path}: {e}")
+                exit(1)
+        exit(0)
+
+    if args.output:
+        if len(args.pdfs) != 1:
+            parser.error("-o/--output needs a single PDF")
+        try:
+            name = args.name[0] if args.name else None
+            Path(args.output).write_bytes(read_attachment(args.pdfs[0], name))
+        except Exception as e:
+            print(f"Error: {e}")
+            exit(1)
+        print(f"Wrote {args.output}")
+    elif len(args.pdfs) == 1:
+        try:
+            for path in extract_attachments(args.pdfs[0], args.dir, args.name):
+                print(f"Wrote {path}")
+        except Exception as e:
+            print(f"Error: {e}")
+            exit(1)
+    else:
+        failures = 0
+        for pdf_path, result in extract_batch(args.pdfs, args.dir, args.name).items():
+            if isinstance(result, Exception):
+                failures += 1
+                print(f"Error: {pdf_path}: {result}")
+            else:
+                for path in result:
+                    print(f"Wrote {path}")
+        exit(1 if failures else 0)
@@ -0,0 +1,118 @@
+import argparse
+import io
+from pathlib import Path
+from typing import BinaryIO, Dict, Iterable, Optional, Union
+
+from musical_xml_to_bytes import musicxml_to_file
+from pdf_attachments import pick_attachment
+
+
+# -----------------------------
+# PDF attachment → bytes
+# -----------------------------
+def decode_pdf(pdf_path: str, out: BinaryIO, name: Optional[str] = None,
+               validate: bool = True, fast: bool = True) -> int:
+    """
+    Decode the MusicXML score attached to a PDF straight from the embedded
+    stream: the decoder reads the decompressed stream buffer in place, so
+    nothing is written to disk but the recovered bytes.
+
+    Parameters:
+    - pdf_path: PDF with the score attached
+    - out: Seekable binary stream receiving the decoded bytes
+    - name: Attachment name (default: the PDF's only attachment)
+    - validate: If True, prints warnings for unexpected note configurations
+    - fast: If True, use the streaming decoder (see musicxml_to_file)
+
+    Returns the number of bytes written.
+    """
+    from pikepdf import Pdf
+
+    with Pdf.open(pdf_path) as pdf:
+        stream = pick_attachment(pdf, name, pdf_path).get_file().obj
+        buffer = stream.get_stream_buffer()
+        return musicxml_to_file(memoryview(buffer), out, validate=validate, fast=fast)
+
+
+def pdf_to_bytes(pdf_path: str, name: Optional[str] = None, validate: bool = True,
+                 fast: bool = True) -> bytes:
+    """Decode the score attached to a PDF and return the original bytes (see decode_pdf)."""
+    buf = io.BytesIO()
+    decode_pdf(pdf_path, buf, name=name, validate=validate, fast=fast)
+    return buf.getvalue()
+
+
+def decode_pdf_batch(pdf_paths: Iterable[str], out_dir: str, suffix: str = ".bin",
+                     name: Optional[str] = None, validate: bool = True,
+                     fast: bool = True) -> Dict[str, Union[int, Exception]]:
+    """
+    Decode many PDFs in this process into out_dir/<pdf stem><suffix>.
+    Returns the number of bytes written or the exception, per PDF.
+    """
+    Path(out_dir).mkdir(parents=True, exist_ok=True)
+    results = {}
+    for pdf_path in pdf_paths:
+        target = Path(out_dir) / (Path(pdf_path).stem + suffix)
+        try:
+            with open(target, "wb") as f:
+                results[pdf_path] = decode_pdf(pdf_path, f, name=name, validate=validate, fast=fast)
+        except Exception as e:
+            target.unlink(missing_ok=True)
+            results[pdf_path] = e
+    return results
+
+
+# -----------------------------
+# Command line
+# -----------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        prog="decode-pdf",
+        description="Decode the MusicXML score attached to PDFs back to bytes, without temporary files",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  python pdf_to_bytes.py more_shit.pdf -o decoded.json
+  python pdf_to_bytes.py output2.pdf -n test_data/sample_music.musicxml -o decoded.json
+  python pdf_to_bytes.py archive/*.pdf -d decoded/ --suffix .json
+        """
+    )
+    parser.add_argument("pdfs", nargs="+", help="PDF file(s) with an attached score")
+    parser.add_argument("-n", "--name", help="Attachment name (default: the only attachment)")
+    parser.add_argument("-o", "--output", help="Output file (single PDF only; default: print hex)")
+    parser.add_argument("-d", "--dir", help="Output directory for <pdf stem><suffix> per PDF")
+    parser.add_argument("--suffix", default=".bin", help="Output suffix with --dir (default: .bin)")
+    parser.add_argument("--no-validate", action="store_true",
+                        help="Disable warnings for unexpected note configurations")
+    parser.add_argument("--no-fast", action="store_true",
+                        help="Always decode through partitura instead of the streaming decoder")
+
+    args = parser.parse_args()
+    options = dict(name=args.name, validate=not args.no_validate, fast=not args.no_fast)
+
+    if args.dir:
+        failures = 0
+        for pdf_path, result in decode_pdf_batch(args.pdfs, args.dir, args.suffix, **options).items():
+            if isinstance(result, Exception):
+                failures += 1
+                print(f"Error: {pdf_path}: {result}")
+            else:
+                print(f"Decoded {result} bytes from {pdf_path}")
+        exit(1 if failures else 0)
+
+    if len(args.pdfs) != 1:
+        parser.error("several PDFs need -d/--dir")
+    try:
+        if args.output:
+            with open(args.output, "wb") as f:
+                size = decode_pdf(args.pdfs[0], f, **options)
+            print(f"Decoded {size} bytes from {args.pdfs[0]}")
+            print(f"Wrote {args.output}")
+        else:
+            recovered_bytes = pdf_to_bytes(args.pdfs[0], **options)
+            print(f"Decoded {len(recovered_bytes)} bytes from {args.pdfs[0]}")
+            print(f"Decoded data (hex): {recovered_bytes.hex().upper()}")
+            print(f"Decoded data (ASCII): {recovered_bytes.decode('utf-8', errors='replace')}")
+    except Exception as e:
+        print(f"Error: {e}")
+        exit(1)
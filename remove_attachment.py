@@ -1,21 +1,27 @@
-from pikepdf import Pdf, AttachedFileSpec, Name, Dictionary, Array
-
+import argparse
 from pathlib import Path
 
-origin_pdf_file_name = 'output2.pdf'
-
-pdf = Pdf.open(origin_pdf_file_name)
-
-xml_file_path = 'test_data/sample_music.musicxml'
-
-filespec = AttachedFileSpec.from_filepath(pdf, Path(xml_file_path))
-
-dest_xml_file = pdf.attachments.get(xml_file_path, None)
-
-dest_pdf_file_name = 'check_shít.pdf'
-
-pdf.save(dest_pdf_file_name)
-
-dest_xml_file_name = 'output.xml'
-
-Path(dest_xml_file_name).write_bytes(dest_xml_file.get_file().read_bytes())
\ No newline at end of file
+from pdf_attachments import read_attachment
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Extract an attached file (e.g. the MusicXML score) from a PDF",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  python remove_attachment.py output2.pdf -o output.xml
+  python remove_attachment.py output2.pdf -n test_data/sample_music.musicxml -o output.xml
+        """
+    )
+    parser.add_argument("pdf", help="PDF to read")
+    parser.add_argument("-n", "--name", help="Attachment name (default: the only attachment)")
+    parser.add_argument("-o", "--output", default="output.xml", help="Output file (default: output.xml)")
+
+    args = parser.parse_args()
+
+    try:
+        Path(args.output).write_bytes(read_attachment(args.pdf, args.name))
+    except Exception as e:
+        print(f"Error: {e}")
+        exit(1)
+    print(f"Wrote {args.output}")
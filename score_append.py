@@ -0,0 +1,222 @@
+import os
+import re
+import xml.etree.ElementTree as ET
+from typing import TYPE_CHECKING, BinaryIO, Dict, List, Tuple
+
+import metrics
+from bytes_to_lilypond import LY_MUSIC_OPEN, event_tokens, iter_measures_ly
+from bytes_to_musical_xml import MEASURE_SEP, iter_measures_xml
+from codec_core import BytesLike
+from encoding_schemes import DEFAULT_SCHEME, HEADER_SCHEME, HEADER_SCHEME_VERSION, Scheme, get_scheme
+from musical_xml_to_bytes import (MEASURE_START, _PitchCollector, batch_nibbles, extend_measure_index,
+                                  read_header, read_measure_index)
+from mxl_container import is_mxl
+from payload_compression import HEADER_COMPRESSION
+
+if TYPE_CHECKING:
+    import numpy as np
+
+# Bytes read from the end of a score when looking for its last measure (doubled as needed)
+TAIL_SIZE = 1 << 16
+# Bytes read from the start of a score for its header and first measure
+HEAD_SIZE = 1 << 16
+
+XML_FOOTER = b"  </part>\n</score-partwise>\n"
+NOTE_ID = re.compile(rb'<note id="n(\d+)"')
+MEASURE_NUMBER = re.compile(rb'<measure number="(\d+)"')
+DIVISIONS = re.compile(rb"<divisions>(\d+)</divisions>")
+
+# The music block ends with this line, followed by the \score block
+LY_MUSIC_CLOSE = b"    }\n\n\\score {"
+LY_FIELD = re.compile(rb"^% (msenc-[\w-]+): (.*)$", re.MULTILINE)
+LY_MEASURE = re.compile(rb"^    (.*?) (?:\| )?% (\d+)\n$")
+# The time signature opening a measure of its own length (see time_signature)
+LY_TIME = re.compile(r"^\\time \d+/\d+ ")
+LY_TOKEN = re.compile(r"<[^>]*>\S*|[^\s|]+")
+
+
+def _check_payload(header: Dict[str, str]) -> Scheme:
+    if header.get(HEADER_COMPRESSION):
+        raise ValueError("A compressed payload cannot be extended; encode the whole input again")
+    return get_scheme(header.get(HEADER_SCHEME, DEFAULT_SCHEME),
+                      int(header.get(HEADER_SCHEME_VERSION, 1)))
+
+
+def _read_tail(f: BinaryIO, size: int, pattern) -> Tuple[int, bytes, "re.Match"]:
+    """Last match of `pattern` in the file, reading from the end until one turns up."""
+    length = TAIL_SIZE
+    while True:
+        start = max(0, size - length)
+        f.seek(start)
+        tail = f.read(size - start)
+        matches = list(pattern.finditer(tail))
+        if matches or not start:
+            return start, tail, matches[-1] if matches else None
+        length *= 2
+
+
+def _rewrite(f: BinaryIO, cut: int, chunks, closing: bytes) -> Tuple[int, int]:
+    """
+    Replace everything from byte `cut` to the end of `f` with the text
+    `chunks` followed by `closing`. Returns the new size of the file and
+    the number of chunks written.
+    """
+    f.seek(cut)
+    f.truncate()
+    count = 0
+    for chunk in metrics.timed_iter("note_construction", chunks):
+        f.write(chunk.encode("utf-8"))
+        count += 1
+    f.write(closing)
+    return f.tell(), count
+
+
+def _symbols(nibbles: "np.ndarray", bits: int) -> List[int]:
+    if bits == 4:
+        return nibbles.tolist()
+    return ((nibbles[0::2] << 4) | nibbles[1::2]).tolist()
+
+
+# -----------------------------
+# MusicXML
+# -----------------------------
+def append_musicxml(xml_path: str, data: BytesLike, notes_per_measure: int = 16) -> Dict[str, int]:
+    """
+    Extend a score written by write_musicxml with the encoding of `data`,
+    in place, as if the old payload and `data` had been encoded together.
+
+    Only the last measure is read back: if it is partial it is rewritten
+    with the new notes, continuing its measure number and note ids, and
+    new measures follow. The cost is proportional to `data`, not to the
+    score. A measure index next to the score (see write_measure_index) is
+    updated the same way if it was up to date.
+
+    Parameters:
+    - xml_path: Uncompressed MusicXML file to extend
+    - data: Bytes to append to the payload
+    - notes_per_measure: Events per measure the score was written with
+
+    Returns the number of measures rewritten (0 or 1), the number of
+    measures of the score and the new size of the file.
+    """
+    if notes_per_measure <= 0:
+        raise ValueError(f"notes_per_measure must be > 0 (got {notes_per_measure})")
+    if is_mxl(xml_path):
+        raise ValueError("Cannot append to a .mxl container in place; append to the .xml and compress it")
+    scheme = _check_payload(read_header(xml_path))
+    index = read_measure_index(xml_path)
+    if index is not None and index["measure_size_known"] and index["events_per_measure"] != notes_per_measure:
+        raise ValueError(f"The score's index records {index['events_per_measure']} notes per measure, "
+                         f"not {notes_per_measure}")
+    per_measure = notes_per_measure * scheme.notes_per_event
+
+    with open(xml_path, "r+b") as f:
+        size = os.fstat(f.fileno()).st_size
+        tail_start, tail, last = _read_tail(f, size, MEASURE_START)
+        if not tail.endswith(XML_FOOTER) or last is None:
+            raise ValueError(f"{xml_path} does not end in a measure written by the encoder; "
+                             f"an empty score has to be encoded again")
+        measure = tail[last.start():len(tail) - len(XML_FOOTER)]
+        ids = NOTE_ID.findall(measure)
+        if not ids or int(ids[0]) % per_measure or len(ids) > per_measure:
+            raise ValueError(f"The last measure does not fit {notes_per_measure} notes per measure")
+        number = int(ids[0]) // per_measure + 1
+        numbered = MEASURE_NUMBER.match(measure)
+        if numbered and int(numbered.group(1)) != number:
+            raise ValueError(f"The last measure is numbered {numbered.group(1)}, "
+                             f"but its notes belong to measure {number}")
+
+        # The notes of the last measure, and the divisions of the first one
+        collector = _PitchCollector(scheme)
+        parser = ET.XMLParser(target=collector)
+        parser.feed(b"<part>" + measure + b"</part>")
+        parser.close()
+        lead = _symbols(batch_nibbles(*collector.take(), scheme, validate=True), scheme.bits)
+        if len(lead) * scheme.notes_per_event != len(ids):
+            raise ValueError("The last measure holds notes the encoder cannot have written")
+        if number == 1:
+            divisions = DIVISIONS.search(measure)
+        else:
+            f.seek(0)
+            divisions = DIVISIONS.search(f.read(HEAD_SIZE))
+        if divisions is None:
+            raise ValueError("No <divisions> found in the first measure")
+
+        if len(lead) == notes_per_measure:
+            # Keep the last measure; new measures go before the closing tags
+            cut, lead, first = size - len(XML_FOOTER), [], number + 1
+        else:
+            line_start = tail.rfind(b"\n", 0, last.start()) + 1
+            cut, first = tail_start + line_start - len(MEASURE_SEP), number
+            f.seek(cut)
+            if f.read(len(MEASURE_SEP)) != MEASURE_SEP.encode():
+                raise ValueError("The last measure is not laid out like the encoder writes it")
+        measures = iter_measures_xml(data, int(divisions.group(1)), notes_per_measure,
+                                     bool(numbered), first, scheme.name, lead)
+        size, count = _rewrite(f, cut, measures, XML_FOOTER)
+
+    if index is not None:
+        extend_measure_index(xml_path, index, cut, first - 1, notes_per_measure)
+    return {"rewritten": int(first == number), "measures": first - 1 + count, "size": size}
+
+
+# -----------------------------
+# LilyPond
+# -----------------------------
+def _ly_symbols(line: bytes, inverse: Dict[str, int]) -> List[int]:
+    try:
+        return [inverse[token] for token in LY_TOKEN.findall(LY_TIME.sub("", line.decode("utf-8")))]
+    except KeyError as e:
+        raise ValueError(f"Unknown note {e} in the last measure")
+
+
+def append_lilypond(ly_path: str, data: BytesLike, notes_per_measure: int = 16) -> Dict[str, int]:
+    """
+    Extend a score written by write_lilypond with the encoding of `data`,
+    in place, like append_musicxml: the last measure line is rewritten if it
+    is partial, new measure lines follow, and the \\score block after the
+    music is kept as it is.
+
+    Parameters:
+    - ly_path: .ly file written by bytes_to_lilypond
+    - data: Bytes to append to the payload
+    - notes_per_measure: Events per measure the score was written with
+
+    Returns the number of measures rewritten (0 or 1), the number of
+    measures of the score and the new size of the file.
+    """
+    if notes_per_measure <= 0:
+        raise ValueError(f"notes_per_measure must be > 0 (got {notes_per_measure})")
+    with open(ly_path, "r+b") as f:
+        head = f.read(HEAD_SIZE)
+        scheme = _check_payload({name.decode(): value.decode().strip()
+                                 for name, value in LY_FIELD.findall(head)})
+        inverse = {token: symbol for symbol, token in enumerate(event_tokens(scheme))}
+
+        size = os.fstat(f.fileno()).st_size
+        tail_start, tail, close = _read_tail(f, size, re.compile(re.escape(LY_MUSIC_CLOSE)))
+        if close is None:
+            raise ValueError(f"{ly_path} was not written by bytes_to_lilypond")
+        line_start = tail.rfind(b"\n", 0, close.start() - 1) + 1
+        last = LY_MEASURE.match(tail[line_start:close.start()])
+        if last is None:
+            raise ValueError(f"{ly_path} does not end in a measure written by the encoder; "
+                             f"an empty score has to be encoded again")
+        number = int(last.group(2))
+        lead = _ly_symbols(last.group(1), inverse)
+        if len(lead) > notes_per_measure:
+            raise ValueError(f"The last measure does not fit {notes_per_measure} notes per measure")
+        if number > 1:
+            music = head.find(LY_MUSIC_OPEN.encode("utf-8"))
+            start = music + len(LY_MUSIC_OPEN.encode("utf-8"))
+            first_line = LY_MEASURE.match(head[start:head.find(b"\n", start) + 1]) if music >= 0 else None
+            if first_line is None or len(_ly_symbols(first_line.group(1), inverse)) != notes_per_measure:
+                raise ValueError(f"The first measure does not hold {notes_per_measure} notes")
+
+        if len(lead) == notes_per_measure:
+            cut, lead, first = tail_start + close.start(), [], number + 1
+        else:
+            cut, first = tail_start + line_start, number
+        measures = iter_measures_ly(data, notes_per_measure, scheme.name, first, lead)
+        size, count = _rewrite(f, cut, measures, tail[close.start():])
+    return {"rewritten": int(first == number), "measures": first - 1 + count, "size": size}
@@ -0,0 +1,192 @@
+import struct
+from typing import List, Sequence, Set, Tuple
+
+from bytes_to_midi import var_len
+from midi_to_bytes import DATA_BYTES
+
+# -----------------------------
+# PDF merging
+# -----------------------------
+# Page numbers stamped on a merged score, where LilyPond's default header
+# puts them: top outer corner, from the second page on
+MM = 72 / 25.4
+PAGE_NUMBER_SIZE = 11
+PAGE_NUMBER_TOP = 5 * MM + PAGE_NUMBER_SIZE
+PAGE_NUMBER_SIDE = 15 * MM
+PAGE_NUMBER_FONT = "/Times-Roman"
+PAGE_NUMBER_RESOURCE = "/MsencPageNumber"
+# Width of a digit in Times-Roman, in text space units per point
+DIGIT_WIDTH = 0.5
+
+
+def number_pages(pdf, first_page: int = 1) -> None:
+    """
+    Print page numbers on the pages of an open pikepdf.Pdf, starting at
+    `first_page`, the way LilyPond does: on the right of odd pages, on the
+    left of even ones, and not on the first page.
+    """
+    from pikepdf import Dictionary, Name, Page, Stream
+
+    font = pdf.make_indirect(Dictionary(Type=Name.Font, Subtype=Name.Type1,
+                                        BaseFont=Name(PAGE_NUMBER_FONT)))
+    for number, page in enumerate(pdf.pages, first_page):
+        if number == first_page:
+            continue
+        page = Page(page)
+        name = page.add_resource(font, Name.Font, Name(PAGE_NUMBER_RESOURCE))
+        x0, _, x1, y1 = (float(v) for v in page.mediabox)
+        text = str(number)
+        if number % 2:
+            x = x1 - PAGE_NUMBER_SIDE - DIGIT_WIDTH * PAGE_NUMBER_SIZE * len(text)
+        else:
+            x = x0 + PAGE_NUMBER_SIDE
+        # Wrap the page's own content so its graphics state cannot leak into ours
+        page.contents_add(Stream(pdf, b"q\n"), prepend=True)
+        page.contents_add(Stream(pdf, (
+            f"\nQ\nq BT {name} {PAGE_NUMBER_SIZE} Tf {x:.2f} {y1 - PAGE_NUMBER_TOP:.2f} Td "
+            f"({text}) Tj ET Q\n").encode("ascii")), prepend=False)
+
+
+def merge_pdfs(pdf_paths: Sequence[str], out_path: str, page_numbers: bool = True) -> int:
+    """
+    Concatenate the pages of `pdf_paths` in order into `out_path`, numbering
+    the pages of the whole document when `page_numbers` is True (see
+    number_pages). Returns the number of pages.
+    """
+    from pikepdf import Pdf
+
+    if not pdf_paths:
+        raise ValueError("No PDF files to merge")
+    sources = []
+    try:
+        with Pdf.new() as merged:
+            for path in pdf_paths:
+                source = Pdf.open(path)
+                sources.append(source)
+                merged.pages.extend(source.pages)
+            if page_numbers:
+                number_pages(merged)
+            merged.save(out_path)
+            return len(merged.pages)
+    finally:
+        for source in sources:
+            source.close()
+
+
+# -----------------------------
+# MIDI merging
+# -----------------------------
+END_OF_TRACK = b"\xff\x2f\x00"
+
+# (tick, event with its status byte) pairs of one track
+Events = List[Tuple[int, bytes]]
+
+
+def _read_var_len(data: bytes, i: int) -> Tuple[int, int]:
+    value = 0
+    while True:
+        if i >= len(data):
+            raise ValueError("Truncated MIDI track")
+        b = data[i]
+        i += 1
+        value = (value << 7) | (b & 0x7F)
+        if not b & 0x80:
+            return value, i
+
+
+def _track_events(track: bytes) -> Tuple[Events, int]:
+    """The events of one MTrk chunk with absolute ticks, and the tick its End of Track falls on."""
+    events: Events = []
+    tick = 0
+    status = 0
+    i = 0
+    while i < len(track):
+        delta, i = _read_var_len(track, i)
+        tick += delta
+        b = track[i]
+        if b == 0xFF:
+            size, data_start = _read_var_len(track, i + 2)
+            event = track[i:data_start + size]
+            if track[i + 1] == 0x2F:
+                return events, tick
+        elif b in (0xF0, 0xF7):
+            size, data_start = _read_var_len(track, i + 1)
+            event = track[i:data_start + size]
+        else:
+            if b & 0x80:
+                status = b
+                i += 1
+            elif not status:
+                raise ValueError("MIDI data byte without a status")
+            # Running status is spelled out, so events can be reordered and dropped
+            data_start, size = i, DATA_BYTES[status >> 4]
+            event = bytes([status]) + track[i:i + size]
+        i = data_start + size
+        events.append((tick, event))
+    return events, tick
+
+
+def read_midi_tracks(path: str) -> Tuple[int, int, List[Tuple[Events, int]]]:
+    """Format, division and the (events, end tick) of every track of a Standard MIDI File."""
+    with open(path, "rb") as f:
+        data = f.read()
+    if data[:4] != b"MThd":
+        raise ValueError(f"{path} is not a Standard MIDI File")
+    size, = struct.unpack(">I", data[4:8])
+    midi_format, _, division = struct.unpack(">HHH", data[8:14])
+    tracks = []
+    i = 8 + size
+    while i + 8 <= len(data):
+        kind, length = data[i:i + 4], struct.unpack(">I", data[i + 4:i + 8])[0]
+        if kind == b"MTrk":
+            tracks.append(_track_events(data[i + 8:i + 8 + length]))
+        i += 8 + length
+    return midi_format, division, tracks
+
+
+def _is_setup(event: bytes) -> bool:
+    """Meta events, controller and program changes: what every segment repeats at its start."""
+    return event[0] == 0xFF or event[0] >> 4 in (0xB, 0xC)
+
+
+def merge_midi(midi_paths: Sequence[str], out_path: str) -> int:
+    """
+    Join MIDI files rendered from consecutive segments of a score into one,
+    track by track: every segment starts where the longest track of the one
+    before ended. Setup events (tempo, time signature, track names, program
+    changes...) a later segment repeats at its start are dropped.
+
+    Returns the length of the merged file in ticks.
+    """
+    if not midi_paths:
+        raise ValueError("No MIDI files to merge")
+    merged: List[List[Tuple[int, bytes]]] = []
+    setup: List[Set[bytes]] = []
+    midi_format = division = None
+    offset = 0
+    for segment, path in enumerate(midi_paths):
+        fmt, div, tracks = read_midi_tracks(path)
+        if division is None:
+            midi_format, division = fmt, div
+        elif div != division:
+            raise ValueError(f"{path} counts {div} ticks per quarter, the first segment {division}")
+        for number, (events, _) in enumerate(tracks):
+            if number == len(merged):
+                merged.append([])
+                setup.append({event for tick, event in events if not tick and _is_setup(event)})
+            merged[number].extend((offset + tick, event) for tick, event in events
+                                  if tick or not segment or event not in setup[number])
+        offset += max((end for _, end in tracks), default=0)
+
+    with open(out_path, "wb") as f:
+        f.write(b"MThd" + struct.pack(">IHHH", 6, 1 if len(merged) > 1 else midi_format,
+                                      len(merged), division))
+        for events in merged:
+            body = bytearray()
+            last = 0
+            for tick, event in events:
+                body += var_len(tick - last) + event
+                last = tick
+            body += var_len(offset - last) + END_OF_TRACK
+            f.write(b"MTrk" + struct.pack(">I", len(body)) + bytes(body))
+    return offset
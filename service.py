@@ -0,0 +1,401 @@
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import AsyncIterator, Dict, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+import metrics
+from bytes_to_musical_xml import map_input, write_musicxml
+from encoding_schemes import DEFAULT_SCHEME, SCHEMES
+from musical_xml_to_bytes import musicxml_to_file
+from payload_compression import available_codecs
+
+DEFAULT_PORT = 8765
+# Requests accepted (running or waiting for a worker) before new ones get 429
+DEFAULT_MAX_PENDING = 16
+DEFAULT_MAX_BODY = 1 << 30
+IO_SIZE = 1 << 16
+MAX_HEADER_LINES = 100
+
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+           411: "Length Required", 413: "Payload Too Large", 429: "Too Many Requests",
+           500: "Internal Server Error", 503: "Service Unavailable"}
+CONTENT_TYPES = {"/encode": "application/vnd.recordare.musicxml+xml",
+                 "/decode": "application/octet-stream",
+                 "/render": "application/pdf"}
+
+
+class HTTPError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+# -----------------------------
+# Jobs (run in the worker processes)
+# -----------------------------
+# Each job reads its input from a spooled file, writes its result to another
+# and returns the stage metrics it recorded, merged into /metrics.
+def _encode_job(src: str, dst: str, options: Dict) -> Dict:
+    with metrics.collect() as m, map_input(src) as data, open(dst, "w", encoding="utf-8") as out:
+        write_musicxml(data, out, measure_numbers=True, **options)
+    return m.snapshot()
+
+
+def _decode_job(src: str, dst: str, options: Dict) -> Dict:
+    with metrics.collect() as m, open(dst, "wb") as out:
+        # Warnings would only end up in the service's log
+        musicxml_to_file(src, out, validate=False)
+    return m.snapshot()
+
+
+def _render_job(src: str, dst: str, options: Dict) -> Dict:
+    from main import run_pipeline
+
+    # The cache holds a lock, so it is opened here rather than sent over
+    cache_dir = options.pop("cache_dir", None)
+    if cache_dir:
+        from artifact_cache import ArtifactCache
+        options["cache"] = ArtifactCache(cache_dir)
+    with metrics.collect() as m:
+        run_pipeline(Path(src), Path(dst), **options)
+    return m.snapshot()
+
+
+def _ready() -> int:
+    return os.getpid()
+
+
+JOBS = {"/encode": _encode_job, "/decode": _decode_job, "/render": _render_job}
+
+
+def _encode_options(query: Dict[str, str]) -> Dict:
+    """Encoder options from the query string, checked before any work is queued."""
+    options = {"part_name": query.get("part_name", "Encoded Bytes")}
+    try:
+        options["notes_per_measure"] = int(query.get("notes_per_measure", 16))
+    except ValueError:
+        raise HTTPError(400, "notes_per_measure must be an integer")
+    if options["notes_per_measure"] <= 0:
+        raise HTTPError(400, "notes_per_measure must be > 0")
+    options["scheme"] = query.get("scheme", DEFAULT_SCHEME)
+    if options["scheme"] not in SCHEMES:
+        raise HTTPError(400, f"Unknown scheme: {options['scheme']}")
+    options["compression"] = query.get("compress", "none")
+    if options["compression"] not in ["none", "auto"] + sorted(available_codecs()):
+        raise HTTPError(400, f"Unknown compression codec: {options['compression']}")
+    return options
+
+
+# -----------------------------
+# HTTP
+# -----------------------------
+async def read_head(reader: asyncio.StreamReader) -> Tuple[str, str, Dict[str, str]]:
+    """Request line and headers (names lower-cased) of an HTTP/1.x request."""
+    line = await reader.readline()
+    if not line:
+        raise ConnectionResetError("Connection closed before the request")
+    try:
+        method, target, version = line.decode("latin-1").split()
+    except ValueError:
+        raise HTTPError(400, "Malformed request line")
+    if not version.startswith("HTTP/1."):
+        raise HTTPError(400, f"Unsupported protocol: {version}")
+    headers = {}
+    for _ in range(MAX_HEADER_LINES):
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            return method.upper(), target, headers
+        name, sep, value = line.decode("latin-1").partition(":")
+        if not sep:
+            raise HTTPError(400, "Malformed header line")
+        headers[name.strip().lower()] = value.strip()
+    raise HTTPError(400, "Too many header lines")
+
+
+async def iter_body(reader: asyncio.StreamReader, headers: Dict[str, str],
+                    max_body: int) -> AsyncIterator[bytes]:
+    """Yield the request body as it arrives, for Content-Length and chunked requests."""
+    total = 0
+    if "chunked" in headers.get("transfer-encoding", "").lower():
+        while True:
+            size_line = await reader.readline()
+            try:
+                size = int(size_line.split(b";")[0], 16)
+            except ValueError:
+                raise HTTPError(400, "Malformed chunk size")
+            if size == 0:
+                # Trailers end with an empty line
+                while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                    pass
+                return
+            total += size
+            if total > max_body:
+                raise HTTPError(413, f"Request body larger than {max_body} bytes")
+            while size:
+                chunk = await reader.read(min(size, IO_SIZE))
+                if not chunk:
+                    raise HTTPError(400, "Truncated chunked body")
+                size -= len(chunk)
+                yield chunk
+            await reader.readline()
+        return
+
+    if "content-length" not in headers:
+        raise HTTPError(411, "Content-Length or chunked Transfer-Encoding required")
+    try:
+        left = int(headers["content-length"])
+    except ValueError:
+        raise HTTPError(400, "Malformed Content-Length")
+    if left > max_body:
+        raise HTTPError(413, f"Request body larger than {max_body} bytes")
+    while left:
+        chunk = await reader.read(min(left, IO_SIZE))
+        if not chunk:
+            raise HTTPError(400, "Truncated request body")
+        left -= len(chunk)
+        yield chunk
+
+
+async def send_response(writer: asyncio.StreamWriter, status: int, body: bytes = b"",
+                        content_type: str = "text/plain; charset=utf-8", path: Optional[str] = None,
+                        headers: Optional[Dict[str, str]] = None) -> int:
+    """Send a complete response; with `path`, the file is streamed as the body. Returns the body size."""
+    size = os.path.getsize(path) if path else len(body)
+    head = [f"HTTP/1.1 {status} {REASONS.get(status, '')}",
+            f"Content-Type: {content_type}",
+            f"Content-Length: {size}",
+            "Connection: close"]
+    head += [f"{name}: {value}" for name, value in (headers or {}).items()]
+    writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1"))
+    if path:
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(IO_SIZE), b""):
+                writer.write(chunk)
+                await writer.drain()
+    else:
+        writer.write(body)
+    await writer.drain()
+    return size
+
+
+# -----------------------------
+# Service
+# -----------------------------
+class EncodeService:
+    """
+    HTTP front end of the encoder, decoder and LilyPond pipeline.
+
+    Request bodies are spooled to disk as they arrive, converted by a pool
+    of `jobs` worker processes and streamed back from disk, so neither side
+    holds a whole document in memory. At most `max_pending` requests are
+    accepted at a time (running or waiting for a worker); further requests
+    get 429 Too Many Requests before their body is read.
+
+    Endpoints:
+    - POST /encode: bytes → MusicXML. Query: part_name, notes_per_measure,
+      scheme, compress
+    - POST /decode: MusicXML → bytes
+    - POST /render: bytes → PDF with the MusicXML attached (needs LilyPond).
+      Query as for /encode
+    - GET /metrics: request counters, queue depth and per-stage metrics as JSON
+    - GET /health: "ok"
+    """
+
+    def __init__(self, jobs: int = 1, max_pending: int = DEFAULT_MAX_PENDING,
+                 max_body: int = DEFAULT_MAX_BODY, spool_dir: Optional[str] = None,
+                 lilypond_dir: Optional[str] = None, cache_dir: Optional[str] = None):
+        if jobs <= 0 or max_pending <= 0:
+            raise ValueError("jobs and max_pending must be > 0")
+        self.jobs = jobs
+        self.max_pending = max_pending
+        self.max_body = max_body
+        self.spool_dir = spool_dir
+        self.lilypond_dir = lilypond_dir
+        self.cache_dir = cache_dir
+        self.pool: Optional[ProcessPoolExecutor] = None
+        self.pending = 0
+        self.running = 0
+        self.started = time.time()
+        self.stages = metrics.Metrics()
+        self.counters = {"requests": {}, "responses": {}, "rejected": 0,
+                         "bytes_in": 0, "bytes_out": 0, "seconds": {}}
+
+    def start(self) -> None:
+        """
+        Start the worker processes. They are forked here, before the server
+        accepts connections: a worker forked while handling a request would
+        inherit the client's socket and keep it open after the response.
+        """
+        self.pool = ProcessPoolExecutor(max_workers=self.jobs)
+        for future in [self.pool.submit(_ready) for _ in range(self.jobs)]:
+            future.result()
+
+    def close(self) -> None:
+        if self.pool is not None:
+            self.pool.shutdown(wait=True, cancel_futures=True)
+            self.pool = None
+
+    def snapshot(self) -> Dict:
+        return {**self.counters,
+                "pending": self.pending,
+                "running": self.running,
+                "queued": self.pending - self.running,
+                "max_pending": self.max_pending,
+                "jobs": self.jobs,
+                "uptime": time.time() - self.started,
+                "stages": self.stages.snapshot()}
+
+    def _count(self, name: str, key: str, value: float = 1) -> None:
+        self.counters[name][key] = self.counters[name].get(key, 0) + value
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        start = time.perf_counter()
+        path = "?"
+        status = 500
+        try:
+            try:
+                method, target, headers = await read_head(reader)
+                path = urlsplit(target).path
+                query = {k: v[-1] for k, v in parse_qs(urlsplit(target).query).items()}
+                self._count("requests", path)
+                status, sent = await self._dispatch(method, path, query, headers, reader, writer)
+            except HTTPError as e:
+                status = e.status
+                extra = {"Retry-After": "1"} if status == 429 else None
+                sent = await send_response(writer, status, f"{e}\n".encode("utf-8"), headers=extra)
+            except (ConnectionError, asyncio.IncompleteReadError):
+                raise
+            except Exception as e:
+                status = 500
+                sent = await send_response(writer, status, f"{type(e).__name__}: {e}\n".encode("utf-8"))
+            self.counters["bytes_out"] += sent
+            self._count("responses", str(status))
+            self._count("seconds", path, time.perf_counter() - start)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def _dispatch(self, method: str, path: str, query: Dict[str, str], headers: Dict[str, str],
+                        reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> Tuple[int, int]:
+        if path == "/health":
+            return 200, await send_response(writer, 200, b"ok\n")
+        if path == "/metrics":
+            body = json.dumps(self.snapshot(), indent=2, sort_keys=True).encode("utf-8")
+            return 200, await send_response(writer, 200, body, "application/json")
+        if path not in JOBS:
+            raise HTTPError(404, f"No such endpoint: {path}")
+        if method != "POST":
+            raise HTTPError(405, f"{path} expects POST")
+
+        if path == "/decode":
+            options = {}
+        else:
+            options = _encode_options(query)
+        if path == "/render":
+            options.update(lilypond_dir=self.lilypond_dir, use_musicxml2ly=False, cache_dir=self.cache_dir)
+
+        if self.pending >= self.max_pending:
+            self.counters["rejected"] += 1
+            raise HTTPError(429, f"{self.pending} requests pending; try again later")
+        self.pending += 1
+        work = tempfile.mkdtemp(prefix="msenc-", dir=self.spool_dir)
+        try:
+            src = os.path.join(work, "input")
+            dst = os.path.join(work, "output.pdf" if path == "/render" else "output")
+            with open(src, "wb") as f:
+                async for chunk in iter_body(reader, headers, self.max_body):
+                    f.write(chunk)
+                    self.counters["bytes_in"] += len(chunk)
+            self.running += 1
+            try:
+                loop = asyncio.get_running_loop()
+                snapshot = await loop.run_in_executor(self.pool, JOBS[path], src, dst, options)
+            except FileNotFoundError as e:
+                raise HTTPError(503, str(e))
+            except (ValueError, RuntimeError, SyntaxError) as e:
+                # SyntaxError covers XML parse errors
+                raise HTTPError(400, str(e))
+            finally:
+                self.running -= 1
+            self.stages.merge(snapshot)
+            return 200, await send_response(writer, 200, content_type=CONTENT_TYPES[path], path=dst)
+        finally:
+            self.pending -= 1
+            shutil.rmtree(work, ignore_errors=True)
+
+
+async def start_server(service: EncodeService, host: str = "127.0.0.1", port: int = DEFAULT_PORT,
+                       unix_path: Optional[str] = None) -> asyncio.AbstractServer:
+    """Start `service` on a TCP port (0 picks a free one) or a Unix socket."""
+    service.start()
+    if unix_path:
+        return await asyncio.start_unix_server(service.handle, path=unix_path)
+    return await asyncio.start_server(service.handle, host, port)
+
+
+async def serve(service: EncodeService, host: str = "127.0.0.1", port: int = DEFAULT_PORT,
+                unix_path: Optional[str] = None) -> None:
+    server = await start_server(service, host, port, unix_path)
+    where = unix_path or ":".join(str(a) for a in server.sockets[0].getsockname()[:2])
+    print(f"Listening on {where} with {service.jobs} worker(s)")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        service.close()
+
+
+# -----------------------------
+# Command line
+# -----------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Serve the encoder, decoder and LilyPond pipeline over local HTTP",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  python service.py --jobs 4
+  curl --data-binary @input.json "http://127.0.0.1:8765/encode?scheme=byte" -o music.xml
+  curl --data-binary @music.xml http://127.0.0.1:8765/decode -o decoded.json
+  curl --data-binary @input.json http://127.0.0.1:8765/render -o more_shit.pdf
+  curl http://127.0.0.1:8765/metrics
+  python service.py --unix /tmp/msenc.sock
+        """
+    )
+    parser.add_argument("--host", default="127.0.0.1", help="Address to listen on (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help=f"TCP port (default: {DEFAULT_PORT})")
+    parser.add_argument("--unix", help="Listen on this Unix socket instead of TCP")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1,
+                        help="Worker processes (default: number of CPUs)")
+    parser.add_argument("--max-pending", type=int, default=DEFAULT_MAX_PENDING,
+                        help=f"Requests accepted at once before answering 429 (default: {DEFAULT_MAX_PENDING})")
+    parser.add_argument("--max-body", type=int, default=DEFAULT_MAX_BODY >> 20,
+                        help=f"Largest request body in MB (default: {DEFAULT_MAX_BODY >> 20})")
+    parser.add_argument("--spool-dir", help="Directory for request and response files (default: system temp)")
+    parser.add_argument("--lilypond-dir", help="Directory with lilypond for /render (default: $LILYPOND_DIR or PATH)")
+    parser.add_argument("--cache-dir", help="Artifact cache for /render")
+
+    args = parser.parse_args()
+
+    try:
+        service = EncodeService(jobs=args.jobs, max_pending=args.max_pending, max_body=args.max_body << 20,
+                                spool_dir=args.spool_dir, lilypond_dir=args.lilypond_dir,
+                                cache_dir=args.cache_dir)
+        asyncio.run(serve(service, args.host, args.port, args.unix))
+    except KeyboardInterrupt:
+        pass
+    except Exception as e:
+        print(f"Error: {e}")
+        exit(1)
@@ -0,0 +1,58 @@
+import os
+import tempfile
+from pathlib import Path
+
+import pytest
+
+from batch import run_batch
+
+
+# -----------------------------
+# Helpers
+# -----------------------------
+def write(path: Path, data: bytes) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(data)
+
+
+# -----------------------------
+# Tests
+# -----------------------------
+def test_round_trip_mirrors_the_tree():
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        files = {Path("data.json"): b"{}", Path("sub/deep/x.bin"): os.urandom(99)}
+        for rel, data in files.items():
+            write(tmp / "in" / rel, data)
+        summary = run_batch("encode", [str(tmp / "in")], str(tmp / "enc"))
+        assert (summary["processed"], summary["failed"]) == (2, 0)
+        assert (tmp / "enc" / "sub" / "deep" / "x.bin.musicxml").is_file()
+        summary = run_batch("decode", [str(tmp / "enc")], str(tmp / "dec"))
+        assert (summary["processed"], summary["failed"]) == (2, 0)
+        for rel, data in files.items():
+            assert (tmp / "dec" / rel).read_bytes() == data
+
+        # A second run finds everything up to date
+        summary = run_batch("encode", [str(tmp / "in")], str(tmp / "enc"))
+        assert (summary["processed"], summary["skipped"]) == (0, 2)
+
+
+def test_colliding_outputs_are_rejected():
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        write(tmp / "a" / "data.json", b"a")
+        write(tmp / "b" / "data.json", b"b")
+        with pytest.raises(ValueError, match="data.json.musicxml"):
+            run_batch("encode", [str(tmp / "a"), str(tmp / "b")], str(tmp / "out"))
+        assert not (tmp / "out").exists()
+
+        # x.musicxml and x.xml both decode to x
+        run_batch("encode", [str(tmp / "a" / "data.json")], str(tmp / "enc"))
+        (tmp / "enc" / "data.json.xml").write_bytes((tmp / "enc" / "data.json.musicxml").read_bytes())
+        with pytest.raises(ValueError, match="would both be written to"):
+            run_batch("decode", [str(tmp / "enc")], str(tmp / "dec"))
+        assert not (tmp / "dec").exists()
+
+        # The same file reached twice is still one input
+        summary = run_batch("encode", [str(tmp / "a"), str(tmp / "a" / "data.json")], str(tmp / "once"))
+        assert (summary["total"], summary["processed"]) == (1, 1)
@@ -0,0 +1,24 @@
+import os
+
+import main
+
+
+def test_batch_shares_render_jobs(monkeypatch, tmp_path):
+    calls = []
+    monkeypatch.setattr(os, "cpu_count", lambda: 8)
+    monkeypatch.setattr(main, "run_pipeline", lambda path, pdf, **options: calls.append(options) or {})
+    inputs = [tmp_path / f"{n}.bin" for n in range(3)]
+
+    # 2 scores at a time share the 8 CPUs: 4 lilypond processes each, 8 in all
+    main.run_batch(inputs, tmp_path / "out", jobs=2, segment_measures=10)
+    assert [options["render_jobs"] for options in calls] == [4, 4, 4]
+
+    calls.clear()
+    main.run_batch(inputs, tmp_path / "out", jobs=16)
+    assert [options["render_jobs"] for options in calls] == [1, 1, 1]
+
+    # An explicit value is kept
+    calls.clear()
+    main.run_batch(inputs, tmp_path / "out", jobs=2, render_jobs=3)
+    assert [options["render_jobs"] for options in calls] == [3, 3, 3]
+    assert main.default_render_jobs() == 8
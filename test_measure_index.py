@@ -0,0 +1,146 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+import numpy as np
+import pytest
+
+from bytes_to_musical_xml import write_musicxml
+from encoding_schemes import SCHEMES
+from musical_xml_to_bytes import (INDEX_SUFFIX, build_measure_index, decode_range, load_measure_index,
+                                  parse_range, read_measure_index, write_measure_index)
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+RNG = np.random.default_rng(21)
+SIZE = 301
+
+
+# -----------------------------
+# Helpers
+# -----------------------------
+def write_score(path: str, data: bytes, **options) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        write_musicxml(data, f, **options)
+
+
+def ranges(size: int, bytes_per_measure: float):
+    """Byte ranges on, just off and across measure boundaries, and past the end."""
+    yield from ((0, 0), (0, 1), (0, size), (size - 1, 1), (size - 3, 10), (size, 5), (size + 7, 1))
+    for k in range(1, 6):
+        boundary = int(k * bytes_per_measure)
+        for start in (boundary - 1, boundary, boundary + 1):
+            for length in (1, 2, int(bytes_per_measure), int(3 * bytes_per_measure) + 1):
+                yield start, length
+
+
+# -----------------------------
+# Tests
+# -----------------------------
+def test_decode_range_matches_full_decode():
+    data = RNG.bytes(SIZE)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "score.musicxml")
+        for scheme, codec in SCHEMES.items():
+            # 7 notes per measure: measures end mid-byte with the nibble scheme
+            for notes_per_measure in (16, 7):
+                write_score(path, data, notes_per_measure=notes_per_measure, scheme=scheme)
+                # A small stride, so most measures are found by scanning on from an indexed one
+                index = build_measure_index(path, stride=3)
+                assert index["events_per_measure"] == notes_per_measure
+                assert index["measure_size_known"]
+                per_measure = notes_per_measure * codec.bits / 8
+                assert index["measures"] == -(-SIZE // per_measure)
+                for start, length in ranges(SIZE, per_measure):
+                    got = decode_range(path, start, length, validate=False, index=index)
+                    assert got == data[start:start + length], (scheme, notes_per_measure, start, length)
+
+
+def test_single_measure():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "score.musicxml")
+        write_score(path, b"abc")
+        index = build_measure_index(path)
+        assert (index["measures"], index["events_per_measure"], index["measure_size_known"]) == (1, 6, False)
+        index = build_measure_index(path, events_per_measure=16)
+        assert (index["events_per_measure"], index["measure_size_known"]) == (16, True)
+        assert decode_range(path, 1, 5, index=index) == b"bc"
+        with pytest.raises(ValueError, match="holds 6 events"):
+            build_measure_index(path, events_per_measure=4)
+
+
+def test_sidecar():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "score.musicxml")
+        sidecar = path + INDEX_SUFFIX
+        data = RNG.bytes(SIZE)
+        write_score(path, data)
+
+        # Missing: built on first use and saved
+        assert read_measure_index(path) is None
+        assert decode_range(path, 100, 20) == data[100:120]
+        assert read_measure_index(path) == build_measure_index(path)
+
+        # Stale after the score changes size, or only its modification time
+        longer = data + RNG.bytes(50)
+        write_score(path, longer)
+        assert read_measure_index(path) is None
+        assert decode_range(path, SIZE, 50) == longer[SIZE:]
+        index = read_measure_index(path)
+        assert index["measures"] == -(-len(longer) // 8)
+        stat = os.stat(path)
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+        assert read_measure_index(path) is None
+
+        # Unreadable or from another version: ignored and rebuilt
+        for text in ("{not json", json.dumps(dict(index, version=1))):
+            with open(sidecar, "w", encoding="utf-8") as f:
+                f.write(text)
+            assert read_measure_index(path) is None
+            assert load_measure_index(path) == build_measure_index(path)
+
+        # Not saved when asked not to
+        os.unlink(sidecar)
+        load_measure_index(path, save=False)
+        assert not os.path.exists(sidecar)
+        write_measure_index(path, stride=5)
+        assert read_measure_index(path)["stride"] == 5
+
+
+def test_rejected_ranges():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "score.musicxml")
+        write_score(path, RNG.bytes(SIZE), compression="zlib")
+        with pytest.raises(ValueError, match="compressed"):
+            decode_range(path, 0, 10)
+        with pytest.raises(ValueError, match="negative"):
+            decode_range(path, -1, 10)
+
+
+def test_parse_range():
+    assert parse_range("1048576:100") == (1048576, 100)
+    assert parse_range("0:0") == (0, 0)
+    for text in ("", "10", "a:b", "1:2:3", "1.5:2", ":5"):
+        with pytest.raises(ValueError, match="START:LEN"):
+            parse_range(text)
+    for text in ("-1:5", "5:-1"):
+        with pytest.raises(ValueError, match="negative"):
+            parse_range(text)
+
+
+def test_cli_range():
+    data = RNG.bytes(SIZE)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "score.musicxml")
+        out = os.path.join(tmp, "range.bin")
+        write_score(path, data, scheme="byte")
+        script = os.path.join(REPO_DIR, "musical_xml_to_bytes.py")
+        subprocess.run([sys.executable, script, path, "--range", "123:45", "-o", out], check=True,
+                       stdout=subprocess.DEVNULL)
+        with open(out, "rb") as f:
+            assert f.read() == data[123:168]
+        assert os.path.exists(path + INDEX_SUFFIX)
+        result = subprocess.run([sys.executable, script, path, "--range", "12"],
+                                capture_output=True, text=True)
+        assert result.returncode == 1 and "START:LEN" in result.stdout
@@ -0,0 +1,86 @@
+import io
+import struct
+
+import numpy as np
+import pytest
+
+from bytes_to_midi import FLAT_VELOCITY, SHARP_VELOCITY, bytes_to_midi, var_len
+from encoding_schemes import HEADER_SCHEME, SCHEMES
+from midi_to_bytes import decode_midi, iter_midi_notes, midi_to_bytes
+
+RNG = np.random.default_rng(11)
+# Every byte value, plus enough random bytes that the reader crosses read blocks and note batches
+DATA = bytes(range(256)) + RNG.bytes(20000)
+
+
+# -----------------------------
+# Helpers
+# -----------------------------
+def smf(*events, division: int = 480) -> bytes:
+    """A format 0 file of one track holding the raw `events` (delta time included)."""
+    body = b"".join(events) + b"\x00\xff\x2f\x00"
+    return (b"MThd" + struct.pack(">IHHH", 6, 0, 1, division)
+            + b"MTrk" + struct.pack(">I", len(body)) + body)
+
+
+def note(key: int, velocity: int, length: int = 480) -> bytes:
+    return b"\x00" + bytes([0x90, key, velocity]) + var_len(length) + bytes([0x80, key, 0])
+
+
+def text(value: str) -> bytes:
+    """A text event at delta 0, like the header fields bytes_to_midi writes."""
+    return b"\x00\xff\x01" + var_len(len(value)) + value.encode("utf-8")
+
+
+def decode(midi: bytes) -> bytes:
+    out = io.BytesIO()
+    decode_midi(io.BytesIO(midi), out)
+    return out.getvalue()
+
+
+# -----------------------------
+# Tests
+# -----------------------------
+def test_round_trip():
+    for scheme in SCHEMES:
+        for data in (b"\x00", DATA[:7], DATA):
+            assert decode(bytes_to_midi(data, scheme=scheme)) == data, scheme
+        # A quarter_duration other than LilyPond's, and a compressed payload
+        midi = bytes_to_midi(DATA, quarter_duration=96, scheme=scheme, compression="zlib")
+        assert decode(midi) == DATA, scheme
+
+
+def test_round_trip_from_a_file(tmp_path):
+    path = tmp_path / "data.mid"
+    path.write_bytes(bytes_to_midi(DATA, scheme="byte"))
+    assert midi_to_bytes(str(path)) == DATA
+
+
+def test_accidental_in_velocity():
+    # Nibbles 0 and 4: C flat 4 and C sharp 4, keys 59 and 61
+    header = {}
+    notes = [n for batch in iter_midi_notes(io.BytesIO(bytes_to_midi(b"\x04")), header) for n in batch]
+    assert [(key, velocity) for _, key, velocity, _ in notes] == [(59, FLAT_VELOCITY), (61, SHARP_VELOCITY)]
+    assert HEADER_SCHEME not in header and header["division"] == "480"
+
+    # The velocity alone tells the spellings of one key apart: key 61 flat is D flat 4, nibble 1
+    assert decode(smf(note(59, FLAT_VELOCITY), note(61, SHARP_VELOCITY))) == b"\x04"
+    assert decode(smf(note(61, FLAT_VELOCITY), note(61, SHARP_VELOCITY))) == b"\x14"
+    with pytest.raises(ValueError, match="does not record an accidental"):
+        decode(smf(note(60, 64), note(61, SHARP_VELOCITY)))
+
+
+def test_malformed_input():
+    good = bytes_to_midi(DATA[:100])
+    cases = [
+        (b"RIFF" + good[4:], "Not a Standard MIDI File"),
+        (good[:len(good) // 2], "Truncated"),
+        (smf(b"\x00\x90\x3b\x50"), "never released"),
+        (smf(b"\x00\x3b\x50"), "without a status"),
+        (smf(note(59, FLAT_VELOCITY), division=0xE728), "SMPTE"),
+        (smf(b"\x00\xff\x03\x04Data"), "No notes found"),
+        (smf(text(f"{HEADER_SCHEME}=chord"), note(59, FLAT_VELOCITY)), "Incomplete event"),
+    ]
+    for midi, message in cases:
+        with pytest.raises(ValueError, match=message):
+            decode(midi)
@@ -0,0 +1,75 @@
+import io
+import os
+import subprocess
+import sys
+import tempfile
+
+import numpy as np
+
+from bytes_to_musical_xml import SHARD_SIZE, iter_measures_xml, iter_measures_xml_parallel, write_musicxml
+from encoding_schemes import SCHEMES
+from musical_xml_to_bytes import decode_musicxml, decode_musicxml_parallel, measure_ranges
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+RNG = np.random.default_rng(5)
+# Shards of a few measures, so small inputs are cut into many
+SMALL_SHARD = 100
+
+
+# -----------------------------
+# Helpers
+# -----------------------------
+def run(script: str, *args: str) -> None:
+    subprocess.run([sys.executable, os.path.join(REPO_DIR, script), *args], check=True,
+                   cwd=REPO_DIR, stdout=subprocess.DEVNULL)
+
+
+# -----------------------------
+# Tests
+# -----------------------------
+def test_sharded_encode_matches_serial():
+    for scheme in SCHEMES:
+        # Odd sizes end mid-shard and mid-measure; 7 notes per measure mid-byte
+        for notes_per_measure in (16, 7):
+            for size in (0, 1, SMALL_SHARD, 3 * SMALL_SHARD + 41):
+                data = RNG.bytes(size)
+                serial = "".join(iter_measures_xml(data, 480, notes_per_measure, True, scheme=scheme))
+                sharded = "".join(iter_measures_xml_parallel(data, 2, 480, notes_per_measure, True,
+                                                             shard_size=SMALL_SHARD, scheme=scheme))
+                assert sharded == serial, (scheme, notes_per_measure, size)
+
+
+def test_sharded_decode_matches_serial():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "score.musicxml")
+        for scheme in SCHEMES:
+            for notes_per_measure in (16, 7):
+                data = RNG.bytes(3 * SMALL_SHARD + 41)
+                with open(path, "w", encoding="utf-8") as f:
+                    write_musicxml(data, f, notes_per_measure=notes_per_measure, scheme=scheme)
+                serial, sharded = io.BytesIO(), io.BytesIO()
+                decode_musicxml(path, serial)
+                # Ranges of about ten measures, the last one shorter
+                shard_size = 10 * (os.path.getsize(path) // (3 * SMALL_SHARD))
+                assert len(measure_ranges(path, shard_size)) > 2
+                decode_musicxml_parallel(path, sharded, 2, shard_size=shard_size)
+                assert sharded.getvalue() == serial.getvalue() == data, (scheme, notes_per_measure)
+
+
+def test_cli_jobs_match_serial():
+    # Just over one default shard, so --jobs takes the parallel paths with a short last shard
+    data = RNG.bytes(SHARD_SIZE + 999)
+    with tempfile.TemporaryDirectory() as tmp:
+        src = os.path.join(tmp, "data.bin")
+        with open(src, "wb") as f:
+            f.write(data)
+        outputs = {}
+        for jobs in ("1", "2"):
+            xml = os.path.join(tmp, f"jobs{jobs}.musicxml")
+            run("bytes_to_musical_xml.py", src, "-o", xml, "-s", "byte", "--jobs", jobs)
+            decoded = os.path.join(tmp, f"jobs{jobs}.bin")
+            run("musical_xml_to_bytes.py", xml, "-o", decoded, "--jobs", jobs)
+            with open(xml, "rb") as f, open(decoded, "rb") as g:
+                outputs[jobs] = f.read(), g.read()
+        assert outputs["2"] == outputs["1"]
+        assert outputs["1"][1] == data
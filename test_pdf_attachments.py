@@ -0,0 +1,139 @@
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import zipfile
+
+import pikepdf
+
+from pdf_attachments import (attach_batch, attach_files, extract_attachments, extract_batch, list_attachments,
+                             read_attachment)
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+# A PDF engraved by LilyPond, as the pipeline attaches to
+ENGRAVED_PDF = os.path.join(REPO_DIR, "output.pdf")
+SCORE = b"<?xml version='1.0' encoding='UTF-8'?>\n<score-partwise/>\n" * 50
+
+
+# -----------------------------
+# Helpers
+# -----------------------------
+def blank_pdf(path: str, pages: int = 2) -> None:
+    with pikepdf.Pdf.new() as pdf:
+        for _ in range(pages):
+            pdf.add_blank_page()
+        pdf.save(path)
+
+
+def read(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def run(script: str, *args: str) -> None:
+    subprocess.run([sys.executable, os.path.join(REPO_DIR, script), *args], check=True,
+                   stdout=subprocess.DEVNULL)
+
+
+def assert_valid(path: str, attachments) -> None:
+    """pikepdf opens `path` without complaint and finds exactly `attachments`."""
+    with pikepdf.Pdf.open(path) as pdf:
+        assert pdf.check_pdf_syntax() == []
+        assert sorted(pdf.attachments) == sorted(attachments)
+        for name, data in attachments.items():
+            assert pdf.attachments[name].get_file().read_bytes() == data
+
+
+# -----------------------------
+# Tests
+# -----------------------------
+def test_incremental_attach():
+    with tempfile.TemporaryDirectory() as tmp:
+        for source in (None, ENGRAVED_PDF):
+            path = os.path.join(tmp, "score.pdf")
+            if source:
+                shutil.copyfile(source, path)
+            else:
+                blank_pdf(path)
+            original = read(path)
+
+            attach_files(path, {"score.xml": SCORE})
+            first = read(path)
+            assert first.startswith(original)
+            assert_valid(path, {"score.xml": SCORE})
+            # Compressed: the score's text is not stored as it is
+            assert SCORE[:100] not in first[len(original):]
+
+            # The same name again replaces the attachment; a new name is added
+            attach_files(path, {"score.xml": b"v2", "notes.txt": b"hello"})
+            assert read(path).startswith(first)
+            assert_valid(path, {"score.xml": b"v2", "notes.txt": b"hello"})
+            assert list_attachments(path) == ["notes.txt", "score.xml"]
+            assert read_attachment(path, "score.xml") == b"v2"
+
+            # With out_path the input is left alone
+            out = os.path.join(tmp, "copy.pdf")
+            before = read(path)
+            attach_files(path, {"raw.txt": b"stored as it is"}, out, compress=False)
+            assert read(path) == before
+            assert read(out).startswith(before) and b"stored as it is" in read(out)
+            assert_valid(out, {"score.xml": b"v2", "notes.txt": b"hello", "raw.txt": b"stored as it is"})
+
+
+def test_attach_paths_and_zip_containers():
+    with tempfile.TemporaryDirectory() as tmp:
+        pdf_path = os.path.join(tmp, "score.pdf")
+        mxl = os.path.join(tmp, "score.mxl")
+        blank_pdf(pdf_path)
+        with zipfile.ZipFile(mxl, "w", zipfile.ZIP_DEFLATED) as z:
+            z.writestr("score.xml", SCORE)
+        attach_files(pdf_path, {"score.mxl": mxl})
+        # Zip containers are stored as they are, not deflated again
+        assert read(mxl) in read(pdf_path)
+        assert_valid(pdf_path, {"score.mxl": read(mxl)})
+
+
+def test_extract_and_batches():
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = [os.path.join(tmp, f"{name}.pdf") for name in ("a", "b")]
+        for path in paths:
+            blank_pdf(path)
+        results = attach_batch([(path, {"data/score.xml": SCORE + path.encode()}, None) for path in paths]
+                               + [(os.path.join(tmp, "missing.pdf"), {"x": b"x"}, None)])
+        assert [results[path] for path in paths] == [None, None]
+        assert isinstance(results[os.path.join(tmp, "missing.pdf")], Exception)
+
+        before = read(paths[0])
+        written = extract_attachments(paths[0], os.path.join(tmp, "out"))
+        assert [p.name for p in written] == ["score.xml"] and read(str(written[0])) == SCORE + paths[0].encode()
+        # Extraction only reads the PDF
+        assert read(paths[0]) == before
+
+        extracted = extract_batch(paths, os.path.join(tmp, "batch"))
+        for path in paths:
+            assert read(str(extracted[path][0])) == SCORE + path.encode()
+
+
+def test_wrapper_scripts():
+    with tempfile.TemporaryDirectory() as tmp:
+        pdf_path, out, xml, back = (os.path.join(tmp, name)
+                                    for name in ("in.pdf", "out.pdf", "music.xml", "back.xml"))
+        blank_pdf(pdf_path)
+        with open(xml, "wb") as f:
+            f.write(SCORE)
+        original = read(pdf_path)
+
+        run("add_attachment.py", pdf_path, xml, "-o", out, "-n", "music.xml")
+        assert read(pdf_path) == original and read(out).startswith(original)
+        attached = read(out)
+        run("remove_attachment.py", out, "-o", back)
+        assert read(back) == SCORE
+        # remove_attachment.py only extracts; the PDF is not rewritten
+        assert read(out) == attached
+
+        # In place, then by name
+        run("add_attachment.py", pdf_path, xml, "-n", "music.xml")
+        assert read(pdf_path).startswith(original)
+        run("remove_attachment.py", pdf_path, "-n", "music.xml", "-o", back)
+        assert read(back) == SCORE
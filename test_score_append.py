@@ -0,0 +1,146 @@
+import os
+import subprocess
+import sys
+import tempfile
+
+import numpy as np
+import pytest
+
+from bytes_to_lilypond import write_lilypond
+from bytes_to_musical_xml import write_musicxml
+from encoding_schemes import SCHEMES
+from musical_xml_to_bytes import build_measure_index, musicxml_to_bytes, read_measure_index, write_measure_index
+from score_append import append_lilypond, append_musicxml
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+RNG = np.random.default_rng(24)
+
+# (old payload, appended) sizes: partial and full last measures, one measure and many
+SIZES = [(1, 1), (5, 9), (8, 8), (64, 3), (33, 200), (3, 0)]
+NOTES_PER_MEASURE = (16, 7, 1)
+
+
+# -----------------------------
+# Helpers
+# -----------------------------
+def encode_xml(path: str, data: bytes, **options) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        write_musicxml(data, f, **options)
+
+
+def encode_ly(path: str, data: bytes, **options) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        write_lilypond(data, f, **options)
+
+
+def read(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+
+# -----------------------------
+# Tests
+# -----------------------------
+def test_append_musicxml_matches_encoding_at_once():
+    with tempfile.TemporaryDirectory() as tmp:
+        path, whole = os.path.join(tmp, "score.xml"), os.path.join(tmp, "whole.xml")
+        for scheme in SCHEMES:
+            for notes_per_measure in NOTES_PER_MEASURE:
+                for old_size, new_size in SIZES:
+                    old, new = RNG.bytes(old_size), RNG.bytes(new_size)
+                    # Unnumbered measures, and a quarter_duration that only the first measure records
+                    for options in (dict(measure_numbers=True), dict(quarter_duration=96)):
+                        options.update(notes_per_measure=notes_per_measure, scheme=scheme)
+                        encode_xml(path, old, **options)
+                        encode_xml(whole, old + new, **options)
+                        append_musicxml(path, new, notes_per_measure)
+                        case = (scheme, notes_per_measure, old_size, new_size, options)
+                        assert read(path) == read(whole), case
+                        assert musicxml_to_bytes(path) == old + new, case
+
+
+def test_append_musicxml_extends_the_index():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "score.xml")
+        for scheme in SCHEMES:
+            for notes_per_measure in NOTES_PER_MEASURE:
+                for old_size, new_size in SIZES:
+                    encode_xml(path, RNG.bytes(old_size), notes_per_measure=notes_per_measure,
+                               measure_numbers=True, scheme=scheme)
+                    # A small stride, so the append adds and replaces indexed offsets
+                    write_measure_index(path, stride=2, events_per_measure=notes_per_measure)
+                    append_musicxml(path, RNG.bytes(new_size), notes_per_measure)
+                    index = read_measure_index(path)
+                    assert index is not None
+                    assert index == build_measure_index(path, stride=2, events_per_measure=notes_per_measure), \
+                        (scheme, notes_per_measure, old_size, new_size)
+
+
+def test_repeated_appends():
+    data = RNG.bytes(100)
+    with tempfile.TemporaryDirectory() as tmp:
+        path, whole = os.path.join(tmp, "score.xml"), os.path.join(tmp, "whole.xml")
+        ly, whole_ly = os.path.join(tmp, "score.ly"), os.path.join(tmp, "whole.ly")
+        encode_xml(path, data[:1], notes_per_measure=7, measure_numbers=True)
+        encode_ly(ly, data[:1], notes_per_measure=7)
+        write_measure_index(path, stride=3, events_per_measure=7)
+        for start, end in ((1, 4), (4, 5), (5, 37), (37, 100)):
+            append_musicxml(path, data[start:end], 7)
+            append_lilypond(ly, data[start:end], 7)
+        encode_xml(whole, data, notes_per_measure=7, measure_numbers=True)
+        encode_ly(whole_ly, data, notes_per_measure=7)
+        assert read(path) == read(whole)
+        assert read(ly) == read(whole_ly)
+        assert read_measure_index(path) == build_measure_index(path, stride=3, events_per_measure=7)
+
+
+def test_append_lilypond_matches_encoding_at_once():
+    with tempfile.TemporaryDirectory() as tmp:
+        path, whole = os.path.join(tmp, "score.ly"), os.path.join(tmp, "whole.ly")
+        for scheme in SCHEMES:
+            for notes_per_measure in NOTES_PER_MEASURE:
+                for old_size, new_size in SIZES:
+                    old, new = RNG.bytes(old_size), RNG.bytes(new_size)
+                    options = dict(notes_per_measure=notes_per_measure, scheme=scheme)
+                    encode_ly(path, old, **options)
+                    encode_ly(whole, old + new, **options)
+                    result = append_lilypond(path, new, notes_per_measure)
+                    assert read(path) == read(whole), (scheme, notes_per_measure, old_size, new_size)
+                    events = (old_size + new_size) * 8 // SCHEMES[scheme].bits
+                    assert result["measures"] == -(-events // notes_per_measure)
+
+
+def test_rejected_appends():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "score.xml")
+        encode_xml(path, RNG.bytes(20), measure_numbers=True)
+        write_measure_index(path, events_per_measure=16)
+        with pytest.raises(ValueError, match="index records 16"):
+            append_musicxml(path, b"x", 7)
+        os.unlink(path + ".index.json")
+        with pytest.raises(ValueError, match="7 notes per measure"):
+            append_musicxml(path, b"x", 7)
+
+        encode_xml(path, RNG.bytes(20), compression="zlib")
+        with pytest.raises(ValueError, match="compressed"):
+            append_musicxml(path, b"x")
+        ly = os.path.join(tmp, "score.ly")
+        encode_ly(ly, RNG.bytes(20), compression="zlib")
+        with pytest.raises(ValueError, match="compressed"):
+            append_lilypond(ly, b"x")
+
+
+def test_cli_append():
+    data = RNG.bytes(50)
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = [os.path.join(tmp, name) for name in ("old.bin", "new.bin", "score.xml", "whole.xml")]
+        for path, part in zip(paths, (data[:21], data[21:])):
+            with open(path, "wb") as f:
+                f.write(part)
+        encode_xml(paths[3], data, measure_numbers=True)
+        script = os.path.join(REPO_DIR, "bytes_to_musical_xml.py")
+        for source in paths[:2]:
+            subprocess.run([sys.executable, script, source, "-o", paths[2], "--append", "--index"],
+                           check=True, stdout=subprocess.DEVNULL)
+        assert read(paths[2]) == read(paths[3])
+        assert read_measure_index(paths[2]) == build_measure_index(paths[2], events_per_measure=16)
@@ -0,0 +1,101 @@
+import os
+import struct
+import tempfile
+
+import pikepdf
+
+from bytes_to_midi import var_len
+from score_merge import PAGE_NUMBER_RESOURCE, merge_midi, merge_pdfs, read_midi_tracks
+
+DIVISION = 480
+
+TEMPO = b"\xff\x51\x03\x07\xa1\x20"
+TIME_SIGNATURE = b"\xff\x58\x04\x04\x02\x18\x08"
+TRACK_NAME = b"\xff\x03\x04Data"
+PIANO = b"\xc0\x00"
+
+
+# -----------------------------
+# Helpers
+# -----------------------------
+def write_midi(path: str, tracks) -> None:
+    """Write a format 1 file of `tracks`: lists of (delta, raw event bytes), as lilypond does."""
+    with open(path, "wb") as f:
+        f.write(b"MThd" + struct.pack(">IHHH", 6, 1, len(tracks), DIVISION))
+        for events in tracks:
+            body = b"".join(var_len(delta) + event for delta, event in events) + b"\x00\xff\x2f\x00"
+            f.write(b"MTrk" + struct.pack(">I", len(body)) + body)
+
+
+def segment_midi(path: str, pitches, program: bytes = PIANO) -> None:
+    """Two quarter notes, with the setup every lilypond run repeats and running-status note-offs."""
+    first, second = pitches
+    write_midi(path, [
+        [(0, TEMPO), (0, TIME_SIGNATURE), (2 * DIVISION, b"\xff\x01\x00")],
+        [(0, TRACK_NAME), (0, program), (0, bytes([0x90, first, 80])),
+         (DIVISION, bytes([first, 0])), (0, bytes([0x90, second, 80])), (DIVISION, bytes([second, 0]))],
+    ])
+
+
+def write_pdf(path: str, pages: int) -> None:
+    with pikepdf.Pdf.new() as pdf:
+        for _ in range(pages):
+            pdf.add_blank_page()
+        pdf.save(path)
+
+
+def page_text(page) -> bytes:
+    page = pikepdf.Page(page)
+    page.contents_coalesce()
+    return page.obj.Contents.read_bytes()
+
+
+# -----------------------------
+# Tests
+# -----------------------------
+def test_merge_midi():
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = [os.path.join(tmp, f"seg-{n}.midi") for n in range(3)]
+        segment_midi(paths[0], (60, 62))
+        segment_midi(paths[1], (64, 65))
+        # A program change that differs from the first segment's is music, not setup
+        segment_midi(paths[2], (67, 69), program=b"\xc0\x13")
+        out = os.path.join(tmp, "merged.midi")
+        total = merge_midi(paths, out)
+        assert total == 3 * 2 * DIVISION
+
+        midi_format, division, tracks = read_midi_tracks(out)
+        assert (midi_format, division, len(tracks)) == (1, DIVISION, 2)
+        assert all(end == total for _, end in tracks)
+
+        # Setup is kept once, at the start
+        events = [event for _, event in tracks[0][0] + tracks[1][0]]
+        for event in (TEMPO, TIME_SIGNATURE, TRACK_NAME, PIANO):
+            assert events.count(event) == 1, event
+        assert (2 * 2 * DIVISION, b"\xc0\x13") in tracks[1][0]
+
+        # Each segment's notes start where the one before ended, and no tick goes backwards
+        notes = [(tick, event[1]) for tick, event in tracks[1][0] if event[0] == 0x90 and event[2]]
+        assert notes == [(n * DIVISION, pitch) for n, pitch in enumerate((60, 62, 64, 65, 67, 69))]
+        ticks = [tick for tick, _ in tracks[1][0]]
+        assert ticks == sorted(ticks)
+
+
+def test_merge_pdfs():
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = [os.path.join(tmp, f"seg-{n}.pdf") for n in range(2)]
+        write_pdf(paths[0], 2)
+        write_pdf(paths[1], 1)
+        out = os.path.join(tmp, "merged.pdf")
+        assert merge_pdfs(paths, out) == 3
+        with pikepdf.Pdf.open(out) as pdf:
+            assert len(pdf.pages) == 3
+            assert b"Tj" not in page_text(pdf.pages[0])
+            for number in (2, 3):
+                page = pdf.pages[number - 1]
+                assert f"({number}) Tj".encode() in page_text(page)
+                assert PAGE_NUMBER_RESOURCE in page.Resources.Font
+
+        assert merge_pdfs(paths, out, page_numbers=False) == 3
+        with pikepdf.Pdf.open(out) as pdf:
+            assert not any(b"Tj" in page_text(page) for page in pdf.pages)
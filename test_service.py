@@ -0,0 +1,112 @@
+import asyncio
+import json
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+from pdf_to_bytes import pdf_to_bytes
+from service import EncodeService, start_server
+
+# Seconds to wait for a response; a client that never sees EOF fails instead of hanging
+TIMEOUT = 60
+
+# Stand-in for lilypond: one blank page named after the -o base
+STUB_LILYPOND = """#!{python}
+import sys
+import pikepdf
+if sys.argv[1] == "--version":
+    print("GNU LilyPond 2.24.4 (stub)")
+    sys.exit(0)
+pdf = pikepdf.Pdf.new()
+pdf.add_blank_page()
+pdf.save(sys.argv[2] + ".pdf")
+"""
+
+
+# -----------------------------
+# Helpers
+# -----------------------------
+def start(service: EncodeService) -> int:
+    """Run `service` on an ephemeral localhost port in a background thread; returns the port."""
+    ready = []
+
+    def run():
+        async def main():
+            server = await start_server(service, port=0)
+            ready.append(server.sockets[0].getsockname()[1])
+            async with server:
+                await server.serve_forever()
+        asyncio.run(main())
+
+    threading.Thread(target=run, daemon=True).start()
+    while not ready:
+        time.sleep(0.05)
+    return ready[0]
+
+
+def request(port: int, method: str, path: str, body: bytes = b""):
+    """Send one request and read the response up to EOF, as a Connection: close client does."""
+    with socket.create_connection(("127.0.0.1", port), timeout=TIMEOUT) as s:
+        s.sendall(f"{method} {path} HTTP/1.1\r\nHost: localhost\r\n"
+                  f"Content-Length: {len(body)}\r\n\r\n".encode("latin-1") + body)
+        response = b""
+        while True:
+            chunk = s.recv(1 << 16)
+            if not chunk:
+                break
+            response += chunk
+    head, _, payload = response.partition(b"\r\n\r\n")
+    return int(head.split()[1]), payload
+
+
+# -----------------------------
+# Tests
+# -----------------------------
+def test_service():
+    data = os.urandom(5000)
+    with tempfile.TemporaryDirectory() as tmp:
+        stub = os.path.join(tmp, "lilypond")
+        with open(stub, "w") as f:
+            f.write(STUB_LILYPOND.format(python=sys.executable))
+        os.chmod(stub, 0o755)
+        cache_dir = os.path.join(tmp, "cache")
+        service = EncodeService(jobs=2, max_pending=1, lilypond_dir=tmp, cache_dir=cache_dir)
+        port = start(service)
+
+        # The first request is the one that used to wait for EOF forever
+        status, xml = request(port, "POST", "/encode?scheme=byte", data)
+        assert status == 200, xml
+        status, back = request(port, "POST", "/decode", xml)
+        assert status == 200 and back == data
+
+        # /render with a cache, twice: the second run is served from the cache
+        for _ in range(2):
+            status, pdf = request(port, "POST", "/render", data)
+            assert status == 200, pdf
+            pdf_path = os.path.join(tmp, "out.pdf")
+            with open(pdf_path, "wb") as f:
+                f.write(pdf)
+            assert pdf_to_bytes(pdf_path) == data
+        assert any(files for _, _, files in os.walk(cache_dir))
+
+        # A request whose body is still arriving holds the only pending slot
+        with socket.create_connection(("127.0.0.1", port), timeout=TIMEOUT) as slow:
+            slow.sendall(b"POST /encode HTTP/1.1\r\nContent-Length: 4\r\n\r\nab")
+            deadline = time.time() + TIMEOUT
+            while json.loads(request(port, "GET", "/metrics")[1])["pending"] < 1:
+                assert time.time() < deadline
+                time.sleep(0.05)
+            status, message = request(port, "POST", "/encode", b"x")
+            assert status == 429, (status, message)
+            slow.sendall(b"cd")
+            assert slow.recv(12).startswith(b"HTTP/1.1 200")
+
+        status, body = request(port, "GET", "/metrics")
+        snapshot = json.loads(body)
+        assert status == 200
+        assert snapshot["rejected"] == 1
+        assert snapshot["responses"]["200"] >= 5 and snapshot["responses"]["429"] == 1
+        assert snapshot["pending"] == 0
@@ -0,0 +1,89 @@
+import io
+import re
+import xml.etree.ElementTree as ET
+from fractions import Fraction
+
+import numpy as np
+
+from bytes_to_lilypond import iter_lilypond_segments, iter_measures_ly
+from bytes_to_musical_xml import write_musicxml
+from encoding_schemes import time_signature
+from musical_xml_to_bytes import decode_musicxml
+
+RNG = np.random.default_rng(7)
+DATA = RNG.bytes(1000)
+LY_DURATION = re.compile(r"(?:[a-g](?:is|es|s)?[',]*|<[^>]*>)(\d+)")
+LY_LINE = re.compile(r"^    \\time (\d+)/(\d+) (.*) \| % (\d+)$")
+
+
+# -----------------------------
+# Helpers
+# -----------------------------
+def encode_xml(data: bytes, **options) -> str:
+    out = io.StringIO()
+    write_musicxml(data, out, **options)
+    return out.getvalue()
+
+
+def xml_measures(xml: str):
+    """(declared length, length of the notes) of every measure, in quarter notes."""
+    part = ET.fromstring(xml.encode("utf-8")).find("part")
+    divisions, time, lengths = None, None, []
+    for measure in part.iter("measure"):
+        divisions = int(measure.findtext("attributes/divisions") or divisions)
+        if measure.find("attributes/time") is not None:
+            time = Fraction(4 * int(measure.findtext("attributes/time/beats")),
+                            int(measure.findtext("attributes/time/beat-type")))
+        notes = sum(int(note.findtext("duration")) for note in measure.iter("note") if note.find("chord") is None)
+        lengths.append((time, Fraction(notes, divisions)))
+    return lengths
+
+
+# -----------------------------
+# Tests
+# -----------------------------
+def test_time_signature():
+    assert time_signature(16) == (4, 4)
+    assert time_signature(64) == (16, 4)
+    assert time_signature(30) == (15, 8)
+    assert time_signature(33) == (33, 16)
+
+
+def test_byte_measures_fill_their_time():
+    # 7 notes per measure and an odd size leave a partial last measure
+    for notes_per_measure, size in ((16, len(DATA)), (7, 101)):
+        xml = encode_xml(DATA[:size], notes_per_measure=notes_per_measure, scheme="byte",
+                         measure_numbers=True, quarter_duration=96)
+        measures = xml_measures(xml)
+        assert len(measures) > 1
+        for number, (time, notes) in enumerate(measures, 1):
+            assert time == notes, (notes_per_measure, number)
+        out = io.BytesIO()
+        decode_musicxml(io.StringIO(xml), out)
+        assert out.getvalue() == DATA[:size]
+
+
+def test_fixed_length_schemes_keep_4_4():
+    for scheme in ("nibble", "chord"):
+        xml = encode_xml(DATA[:100], scheme=scheme)
+        assert xml.count("<time>") == 1 and "<beats>4</beats>" in xml
+        # 4 quarter notes a measure fill 4/4
+        for time, notes in xml_measures(encode_xml(DATA[:100], scheme=scheme, notes_per_measure=4)):
+            assert time == notes == 4
+
+
+def test_byte_lilypond_bars_match_musicxml():
+    lines = [line.rstrip("\n") for line in iter_measures_ly(DATA[:101], 7, "byte")]
+    times = [time for time, _ in xml_measures(encode_xml(DATA[:101], notes_per_measure=7, scheme="byte"))]
+    assert len(lines) == len(times)
+    for line, time in zip(lines, times):
+        beats, beat_type, notes, _ = LY_LINE.match(line).groups()
+        assert Fraction(4 * int(beats), int(beat_type)) == time
+        assert sum(Fraction(4, int(d)) for d in LY_DURATION.findall(notes)) == time
+
+    # Each measure is a bar, so segments hold exactly the measures asked for
+    segments = list(iter_lilypond_segments(DATA, 5, scheme="byte"))
+    measures = [len(re.findall(r"^    \\time ", segment, re.M)) for segment in segments]
+    assert measures[:-1] == [5] * (len(segments) - 1) and sum(measures) == len(DATA) // 16 + 1
+    assert "\\set Score.currentBarNumber = #6\n" in segments[1]
+    assert "\\omit Staff.TimeSignature" not in "".join(segments)
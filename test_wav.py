@@ -0,0 +1,75 @@
+import io
+import wave
+
+import numpy as np
+
+from bytes_to_wav import SAMPLE_RATE, bytes_to_wav, samples_per_note
+from wav_to_bytes import wav_to_bytes
+
+# Every byte value (so every nibble, sharp and flat) plus random bytes
+RNG = np.random.default_rng(23)
+DATA = bytes(range(256)) + RNG.integers(0, 256, 256, dtype=np.uint8).tobytes()
+
+# (notes per second, octaves up) settings the README promises
+SETTINGS = [(10, 0), (100, 3)]
+# The demodulator must be exact at and above this signal-to-noise ratio
+MIN_SNR_DB = 0
+
+
+# -----------------------------
+# Helpers
+# -----------------------------
+def read_samples(wav_bytes: bytes) -> np.ndarray:
+    with wave.open(io.BytesIO(wav_bytes)) as w:
+        return np.frombuffer(w.readframes(w.getnframes()), "<i2").astype(np.float64)
+
+
+def write_samples(samples: np.ndarray, channels: int = 1) -> bytes:
+    samples = np.clip(np.rint(samples), -32768, 32767).astype("<i2")
+    if channels > 1:
+        samples = np.repeat(samples, channels)
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as w:
+        w.setnchannels(channels)
+        w.setsampwidth(2)
+        w.setframerate(SAMPLE_RATE)
+        w.writeframes(samples.tobytes())
+    return buf.getvalue()
+
+
+def add_noise(samples: np.ndarray, snr_db: float, gain: float = 1.0) -> np.ndarray:
+    """Scale `samples` by `gain` and add white Gaussian noise at `snr_db` below the scaled signal."""
+    signal = gain * samples
+    power = np.mean(signal ** 2)
+    return signal + RNG.normal(0, np.sqrt(power / 10 ** (snr_db / 10)), signal.size)
+
+
+# -----------------------------
+# Tests
+# -----------------------------
+def test_clean_round_trip():
+    for rate, transpose in SETTINGS:
+        for data in (b"", b"\x00", DATA[:7], DATA):
+            wav = bytes_to_wav(data, rate=rate, transpose=transpose)
+            assert wav_to_bytes(io.BytesIO(wav), rate=rate, transpose=transpose) == data, (rate, transpose)
+
+
+def test_noise():
+    for rate, transpose in SETTINGS:
+        samples = read_samples(bytes_to_wav(DATA, rate=rate, transpose=transpose))
+        for snr_db in (30, 10, MIN_SNR_DB):
+            # Quieter recordings too, and a stereo copy that gets mixed down
+            for gain, channels in ((1.0, 1), (0.3, 1), (0.3, 2)):
+                wav = write_samples(add_noise(samples, snr_db, gain), channels)
+                got = wav_to_bytes(io.BytesIO(wav), rate=rate, transpose=transpose, validate=False)
+                assert got == DATA, (rate, transpose, snr_db, gain, channels)
+
+
+def test_silence_is_skipped():
+    rate = 10
+    size = samples_per_note(SAMPLE_RATE, rate)
+    samples = read_samples(bytes_to_wav(DATA[:16], rate=rate))
+    # Two notes of near-silence (hiss at 1% of full level) between the 4th and 5th byte
+    hiss = RNG.normal(0, 0.01 * 32767 / np.sqrt(2), 2 * size)
+    gapped = np.concatenate((samples[:8 * size], hiss, samples[8 * size:]))
+    assert wav_to_bytes(io.BytesIO(write_samples(gapped)), rate=rate, validate=False) == DATA[:16]
@@ -0,0 +1,189 @@
+import argparse
+import io
+import wave
+from typing import BinaryIO, Iterator, Tuple
+
+import numpy as np
+
+from bytes_to_midi import midi_key
+from bytes_to_wav import (DEFAULT_RATE, FUNDAMENTAL_LEVEL, MARKER_HARMONIC, check_band,
+                          key_frequency, samples_per_note)
+from codec_core import nibble_to_note
+from musical_xml_to_bytes import write_nibble_batches
+
+# Notes analysed per FFT batch
+BATCH_NOTES = 1 << 10
+# A note is sharp if its marker harmonic is at least this fraction of the
+# fundamental (written at MARKER_LEVEL / FUNDAMENTAL_LEVEL = 0.5)
+MARKER_THRESHOLD = 0.25
+# Notes whose fundamental is below this fraction of a full-level note are silence
+SILENCE_THRESHOLD = 0.05
+# PCM sample width → (dtype, offset of zero)
+SAMPLE_TYPES = {1: ("u1", 128), 2: ("<i2", 0), 4: ("<i4", 0)}
+
+
+# -----------------------------
+# Pitch tables
+# -----------------------------
+def demodulation_tables(transpose: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Frequencies of the distinct pitches the modulator uses (12: the four
+    enharmonic pairs share a key), and a (pitch, sharp marker) → nibble
+    lookup table. Pitches with a single spelling map to their nibble
+    whatever the marker says.
+    """
+    notes = [nibble_to_note(n) for n in range(16)]
+    keys = sorted({midi_key(*note) for note in notes})
+    frequencies = np.array([key_frequency(key, transpose) for key in keys])
+    lookup = np.full((len(keys), 2), -1, dtype=np.int16)
+    for nibble, note in enumerate(notes):
+        lookup[keys.index(midi_key(*note)), int(note[1] > 0)] = nibble
+    for row in lookup:
+        row[row < 0] = row.max()
+    return frequencies, lookup.astype(np.uint8)
+
+
+# -----------------------------
+# WAV → nibbles (block FFT)
+# -----------------------------
+def demodulate(notes: np.ndarray, sample_rate: int, frequencies: np.ndarray,
+               lookup: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Recover the nibbles of a (notes, samples per note) array of samples
+    (full scale = 1), one zero-padded FFT per row: the strongest of the
+    pitch frequencies picks the note, the level of its third harmonic the
+    accidental.
+
+    Returns the nibbles and a mask of the rows that held a note (not silence).
+    """
+    size = notes.shape[1]
+    # Zero padding samples the spectrum finer than one bin per note length
+    nfft = 1 << (4 * size - 1).bit_length()
+    spectrum = np.abs(np.fft.rfft(notes, nfft, axis=1))
+    bins = np.rint(frequencies * nfft / sample_rate).astype(np.int64)
+    marker_bins = np.rint(MARKER_HARMONIC * frequencies * nfft / sample_rate).astype(np.int64)
+
+    levels = spectrum[:, bins]
+    pitch = levels.argmax(axis=1)
+    rows = np.arange(notes.shape[0])
+    level = levels[rows, pitch]
+    sharp = spectrum[rows, marker_bins[pitch]] >= MARKER_THRESHOLD * level
+    # A full-level sine of n samples peaks at about level * n / 2 (less the fades)
+    sounding = level >= SILENCE_THRESHOLD * FUNDAMENTAL_LEVEL * size / 2
+    return lookup[pitch, sharp.astype(np.int64)], sounding
+
+
+def iter_wav_nibble_batches(source, rate: float = DEFAULT_RATE, transpose: int = 0,
+                            validate: bool = True) -> Iterator[np.ndarray]:
+    """
+    Read a PCM WAV file BATCH_NOTES notes at a time and yield the nibbles of
+    each batch. Several channels are mixed down; silent notes are dropped,
+    and so is a trailing fragment shorter than half a note.
+
+    Parameters:
+    - source: Path or binary file object of a WAV file
+    - rate: Notes per second the audio was written with
+    - transpose: Octaves the notes were shifted up by
+    - validate: If True, prints a warning for dropped silent notes
+    """
+    frequencies, lookup = demodulation_tables(transpose)
+    with wave.open(source, "rb") as wav:
+        if wav.getcomptype() != "NONE":
+            raise ValueError(f"Compressed WAV files are not supported ({wav.getcompname()})")
+        width, channels, sample_rate = wav.getsampwidth(), wav.getnchannels(), wav.getframerate()
+        if width not in SAMPLE_TYPES:
+            raise ValueError(f"{8 * width}-bit WAV files are not supported")
+        dtype, zero = SAMPLE_TYPES[width]
+        full_scale = float(1 << (8 * width - 1))
+        check_band(sample_rate, transpose)
+        size = samples_per_note(sample_rate, rate)
+
+        silent = 0
+        while True:
+            raw = wav.readframes(BATCH_NOTES * size)
+            if not raw:
+                break
+            # Full scale = 1, whatever the sample width, as SILENCE_THRESHOLD assumes
+            samples = (np.frombuffer(raw, dtype=dtype).astype(np.float64) - zero) / full_scale
+            samples = samples.reshape(-1, channels).mean(axis=1)
+            tail = samples.size % size
+            if tail:
+                keep = samples.size - tail
+                samples = samples[:keep] if tail < size // 2 else np.concatenate(
+                    (samples, np.zeros(size - tail)))
+            if not samples.size:
+                break
+            nibbles, sounding = demodulate(samples.reshape(-1, size), sample_rate, frequencies, lookup)
+            silent += int(sounding.size - sounding.sum())
+            yield nibbles[sounding]
+
+    if silent and validate:
+        print(f"[WARN] Skipped {silent} silent notes")
+
+
+def decode_wav(source, out: BinaryIO, rate: float = DEFAULT_RATE, transpose: int = 0,
+               validate: bool = True) -> int:
+    """
+    Decode a WAV file written by bytes_to_wav, writing the recovered bytes
+    to `out` as they are produced. Returns the number of bytes written.
+    """
+    return write_nibble_batches(iter_wav_nibble_batches(source, rate, transpose, validate),
+                                out, validate=validate)
+
+
+def wav_to_bytes(source, rate: float = DEFAULT_RATE, transpose: int = 0,
+                 validate: bool = True) -> bytes:
+    """
+    Decode a WAV file written by bytes_to_wav back to the original bytes.
+
+    Parameters:
+    - source: Path to the .wav file (or a binary file object)
+    - rate: Notes per second the audio was written with
+    - transpose: Octaves the notes were shifted up by
+    - validate: If True, prints warnings for dropped notes and odd nibble counts
+    """
+    buf = io.BytesIO()
+    decode_wav(source, buf, rate=rate, transpose=transpose, validate=validate)
+    return buf.getvalue()
+
+
+# -----------------------------
+# Example usage
+# -----------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Recover bytes from a WAV file written by bytes_to_wav",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  python wav_to_bytes.py output.wav
+  python wav_to_bytes.py output.wav -o decoded.json
+  python wav_to_bytes.py output.wav -o decoded.json --rate 100 --transpose 3
+        """
+    )
+    parser.add_argument("input_file", help="Input WAV file to decode")
+    parser.add_argument("-o", "--output", help="Output binary file path (default: print hex to stdout)")
+    parser.add_argument("-r", "--rate", type=float, default=DEFAULT_RATE,
+                        help=f"Notes per second the audio was written with (default: {DEFAULT_RATE})")
+    parser.add_argument("-t", "--transpose", type=int, default=0,
+                        help="Octaves the notes were shifted up by (default: 0)")
+    parser.add_argument("--no-validate", action="store_true",
+                        help="Disable warnings for dropped notes")
+
+    args = parser.parse_args()
+    options = dict(rate=args.rate, transpose=args.transpose, validate=not args.no_validate)
+
+    try:
+        if args.output:
+            with open(args.output, "wb") as f:
+                size = decode_wav(args.input_file, f, **options)
+            print(f"Decoded {size} bytes from {args.input_file}")
+            print(f"Wrote {args.output}")
+        else:
+            recovered_bytes = wav_to_bytes(args.input_file, **options)
+            print(f"Decoded {len(recovered_bytes)} bytes from {args.input_file}")
+            print(f"Decoded data (hex): {recovered_bytes.hex().upper()}")
+            print(f"Decoded data (ASCII): {recovered_bytes.decode('utf-8', errors='replace')}")
+    except Exception as e:
+        print(f"Error: {e}")
+        exit(1)